@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'projectk.settings')
+# Use the async quiz views (quiz/async_views.py) under an ASGI server such as
+# uvicorn or daphne: uvicorn projectk.asgi:application --workers 4
+os.environ.setdefault('QUIZ_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
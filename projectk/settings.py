@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'quiz.metrics.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,7 +56,8 @@ ROOT_URLCONF = 'projectk.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates plus render timing for the metrics middleware
+        'BACKEND': 'quiz.metrics.DjangoTemplates',
         'DIRS': [BASE_DIR / "templates"],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -82,6 +85,35 @@ DATABASES = {
     }
 }
 
+# QUIZ_DB_PROFILE=production tunes SQLite for many concurrent students (see
+# quiz/database.py): WAL and the pragmas below on every connection,
+# IMMEDIATE transactions with a busy timeout, connections kept open between
+# requests, and a read-only 'replica' alias for the practice pages, topic
+# listings and reporting. QUIZ_REPLICA_DB names a separate replica file.
+# benchmark_journey measures the difference; see quiz/benchmarks/README.md.
+QUIZ_DB_PROFILE = os.environ.get('QUIZ_DB_PROFILE', 'development')
+QUIZ_SQLITE_PRAGMAS = {}
+if QUIZ_DB_PROFILE == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': int(os.environ.get('QUIZ_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+    })
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('QUIZ_REPLICA_DB') or f"file:{DATABASES['default']['NAME']}?mode=ro",
+        'OPTIONS': {'timeout': 20},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['quiz.database.ReplicaRouter']
+    QUIZ_SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,  # 64 MB
+        'mmap_size': 268435456,  # 256 MB
+        'temp_store': 'MEMORY',
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -126,6 +158,83 @@ STATIC_URL = '/static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = "quiz.User"
+
+# Cache
+# Question payloads live in the cache, so every worker process must share
+# it. The default is the database cache; its table is created by the quiz
+# migrations (or `manage.py createcachetable`). Use Redis in production: it
+# takes the load off the database, and its add and incr are atomic, so
+# autosaves are buffered there (on other caches they are written straight
+# to the database). 'locmem' is local to one process and only suits a
+# single-process development server (see quiz/caching.py).
+CACHE_BACKENDS = {
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'quiz_cache',
+        # Past this many entries the table is culled; keep it well above the working set
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('QUIZ_CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+    },
+    'memcached': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': os.environ.get('QUIZ_CACHE_LOCATION', '127.0.0.1:11211'),
+    },
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10_000},
+    },
+}
+CACHES = {'default': CACHE_BACKENDS[os.environ.get('QUIZ_CACHE_BACKEND', 'db')]}
+
+# Sessions
+# The quiz keeps only attempt ids in the session, so any backend works. The
+# default stores sessions in the django_session table; run the prune_sessions
+# command from cron to delete expired rows. 'cached_db' reads through the
+# cache, 'cache' skips the table entirely (needs a shared cache such as
+# Memcached or Redis), and 'signed_cookies' keeps the session client-side.
+SESSION_BACKENDS = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_BACKENDS[os.environ.get('QUIZ_SESSION_BACKEND', 'db')]
+
+# Serve the quiz API and results page from the async views in
+# quiz/async_views.py. projectk/asgi.py turns this on; under WSGI the sync
+# views are cheaper. Compare the two with the load_test_quiz command.
+QUIZ_ASYNC_VIEWS = os.environ.get('QUIZ_ASYNC_VIEWS', '0') == '1'
+
+# Autosaved answers are buffered in the (shared) cache and written to the
+# database in bulk at most this often (seconds), and always when the quiz is
+# submitted. The quiz page also saves changed answers straight to the
+# database every QUIZ_ANSWER_SAVE_INTERVAL seconds, so the buffer only
+# absorbs bursts of typing and losing an entry costs at most that much.
+QUIZ_AUTOSAVE_FLUSH_INTERVAL = int(os.environ.get('QUIZ_AUTOSAVE_FLUSH_INTERVAL', '10'))
+QUIZ_ANSWER_SAVE_INTERVAL = int(os.environ.get('QUIZ_ANSWER_SAVE_INTERVAL', '30'))
+
+# Request metrics (quiz/metrics.py). /metrics requires "Authorization: Bearer
+# <QUIZ_METRICS_TOKEN>" when a token is set; otherwise it is open to staff
+# users, and to INTERNAL_IPS while DEBUG is on. Set a token for the scraper
+# in production.
+QUIZ_METRICS_TOKEN = os.environ.get('QUIZ_METRICS_TOKEN', '')
+INTERNAL_IPS = ['127.0.0.1']
+# Log requests slower than this many milliseconds with their queries (0 = off)
+QUIZ_SLOW_REQUEST_MS = int(os.environ.get('QUIZ_SLOW_REQUEST_MS', '0'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'quiz.slow_requests': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
 LOGIN_REDIRECT_URL = 'home'
 LOGIN_REDIRECT_URL = "/redirect-after-login/"
 
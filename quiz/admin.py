@@ -1,9 +1,46 @@
 from django.contrib import admin
-from .models import User, Topic, Question, Choice, Test, Attempt, Answer, Bookmark
+from .forms import QuestionForm
+from .models import User, Topic, Question, Choice, Test, Attempt, Answer, Bookmark, QuestionStats
+
+
+class QuestionAdmin(admin.ModelAdmin):
+    # Same validation as the site's form, including the near-duplicate check
+    form = QuestionForm
+    # Item statistics come precomputed from QuestionStats (rebuild_item_stats)
+    list_display = ['__str__', 'topic', 'question_type', 'difficulty',
+                    'responses', 'percent_correct', 'discrimination', 'suggested_difficulty']
+    list_filter = ['question_type', 'difficulty']
+    list_select_related = ['topic', 'item_stats']
+
+    def _stats(self, obj):
+        try:
+            return obj.item_stats
+        except QuestionStats.DoesNotExist:
+            return None
+
+    @admin.display(ordering='item_stats__responses')
+    def responses(self, obj):
+        stats = self._stats(obj)
+        return stats.responses if stats else 0
+
+    @admin.display(description='% correct', ordering='item_stats__difficulty_index')
+    def percent_correct(self, obj):
+        stats = self._stats(obj)
+        return f"{stats.percent_correct:.0f}%" if stats else None
+
+    @admin.display(ordering='item_stats__discrimination')
+    def discrimination(self, obj):
+        stats = self._stats(obj)
+        return f"{stats.discrimination:.2f}" if stats and stats.discrimination is not None else None
+
+    @admin.display(description='Answers suggest')
+    def suggested_difficulty(self, obj):
+        stats = self._stats(obj)
+        return stats.get_suggested_difficulty_display() if stats else None
 
 admin.site.register(User)
 admin.site.register(Topic)
-admin.site.register(Question)
+admin.site.register(Question, QuestionAdmin)
 admin.site.register(Choice)
 admin.site.register(Test)
 admin.site.register(Attempt)
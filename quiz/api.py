@@ -0,0 +1,144 @@
+# quiz/api.py
+"""
+JSON API behind the quiz page.
+
+The page loads the whole quiz once (GET attempt_detail), navigates between
+questions in the browser and syncs changed answers in batches
+(POST attempt_answers), so a quiz costs a handful of requests instead of a
+POST, redirect and full render for every Next/Prev click. While the student
+types, answers go to POST attempt_autosave, which only buffers them in the
+cache (see autosave.py); every QUIZ_ANSWER_SAVE_INTERVAL seconds the page
+also writes them through attempt_answers. Submitting (POST attempt_submit) grades the attempt
+exactly as the form does.
+
+Answers, solutions and correct options are never sent.
+
+quiz/async_views.py serves the same endpoints with the async ORM and cache;
+settings.QUIZ_ASYNC_VIEWS picks which ones the URLs use.
+"""
+import json
+
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_GET, require_POST
+
+from . import autosave
+from .engine import (
+    ANSWER_MAX_LENGTH, RESULTS_SESSION_KEY, SESSION_KEY, get_saved_answers, save_answers, submit_attempt,
+)
+from .models import Attempt
+from .payloads import quiz_document
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def error_response(exc):
+    return JsonResponse({"error": str(exc)}, status=exc.status)
+
+
+def open_attempts(user, attempt_id):
+    return Attempt.objects.select_related('topic', 'test').filter(pk=attempt_id, user=user, finished_at__isnull=True)
+
+
+def check_open(attempt):
+    """Raise ApiError unless the attempt exists and its test (if any) is running"""
+    if attempt is None:
+        raise ApiError("No open attempt.", 404)
+    if attempt.test and not attempt.test.start_time <= timezone.now() < attempt.test.end_time:
+        raise ApiError(f"{attempt.test.name} is closed.", 403)
+    return attempt
+
+
+def attempt_summary(attempt, questions, answers):
+    source = attempt.test or attempt.topic
+    return {
+        "attempt": attempt.pk,
+        "title": source.name if source else "",
+        "ends_at": attempt.test.end_time.isoformat() if attempt.test else None,
+        "questions": questions,
+        "answers": {str(pk): answer for pk, answer in answers.items()},
+    }
+
+
+def _open_attempt(request, attempt_id):
+    """The user's unfinished attempt, raising ApiError when it can't be answered"""
+    if not request.user.is_authenticated:
+        raise ApiError("Login required.", 401)
+    return check_open(open_attempts(request.user, attempt_id).first())
+
+
+def posted_answers(request, attempt):
+    """{question id: answer} from the JSON body, keeping only questions of this attempt"""
+    try:
+        body = json.loads(request.body or b"{}")
+        answers = body.get("answers") or {}
+        allowed = set(attempt.question_ids)
+        answers = {
+            int(pk): str(answer).strip()
+            for pk, answer in answers.items() if int(pk) in allowed
+        }
+    except (ValueError, TypeError, AttributeError):
+        raise ApiError("Expected {\"answers\": {question id: answer}}.")
+    if any(len(answer) > ANSWER_MAX_LENGTH for answer in answers.values()):
+        raise ApiError(f"Answers are limited to {ANSWER_MAX_LENGTH} characters.")
+    return answers
+
+
+@require_GET
+def attempt_detail(request, attempt_id):
+    """Every question of the attempt (from the cached quiz document) and the answers saved so far"""
+    try:
+        attempt = _open_attempt(request, attempt_id)
+    except ApiError as exc:
+        return error_response(exc)
+    return JsonResponse(attempt_summary(attempt, quiz_document(attempt.question_ids), get_saved_answers(attempt)))
+
+
+@require_POST
+def attempt_answers(request, attempt_id):
+    """Save a batch of changed answers in one upsert"""
+    try:
+        attempt = _open_attempt(request, attempt_id)
+        answers = posted_answers(request, attempt)
+    except ApiError as exc:
+        return error_response(exc)
+    save_answers(attempt, answers)
+    return JsonResponse({"saved": len(answers)})
+
+
+@require_POST
+def attempt_autosave(request, attempt_id):
+    """Buffer answers in the cache; the database write happens at the next flush"""
+    try:
+        attempt = _open_attempt(request, attempt_id)
+        answers = posted_answers(request, attempt)
+    except ApiError as exc:
+        return error_response(exc)
+    if not autosave.enabled():
+        save_answers(attempt, answers)
+        return JsonResponse({"saved": len(answers)})
+    if autosave.save(attempt.pk, answers):
+        autosave.flush()
+    return JsonResponse({"buffered": len(answers)})
+
+
+@require_POST
+def attempt_submit(request, attempt_id):
+    """Save any last answers, grade the attempt and point the browser at the results page"""
+    try:
+        attempt = _open_attempt(request, attempt_id)
+        answers = posted_answers(request, attempt)
+    except ApiError as exc:
+        return error_response(exc)
+    save_answers(attempt, answers)
+    submit_attempt(attempt)
+
+    if request.session.get(SESSION_KEY) == attempt.pk:
+        del request.session[SESSION_KEY]
+    request.session[RESULTS_SESSION_KEY] = attempt.pk
+    return JsonResponse({"redirect": reverse('quiz_results')})
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class QuizConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'quiz'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import caching, signals  # noqa: F401
+        from .database import apply_pragmas
+        from .metrics import install_sql_wrapper
+        connection_created.connect(install_sql_wrapper)
+        connection_created.connect(apply_pragmas)
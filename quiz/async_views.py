@@ -0,0 +1,97 @@
+# quiz/async_views.py
+"""
+Async versions of the quiz API and results page, for ASGI deployments.
+
+They use the async ORM, cache and session calls, so a worker waiting on the
+database or cache keeps serving other students instead of blocking a
+thread. Grading still runs synchronously in a transaction (through
+asubmit_attempt), as does template rendering, which may load the user.
+
+Under WSGI every async view needs its own event loop, so the URLs only use
+these when settings.QUIZ_ASYNC_VIEWS is on; projectk/asgi.py turns it on.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.http import JsonResponse
+from django.shortcuts import redirect, render
+from django.urls import reverse
+from django.views.decorators.http import require_GET, require_POST
+
+from . import autosave
+from .api import ApiError, attempt_summary, check_open, error_response, open_attempts, posted_answers
+from .engine import (
+    RESULTS_SESSION_KEY, SESSION_KEY, aattempt_results, aget_saved_answers, asave_answers, asubmit_attempt,
+)
+from .payloads import aquiz_document
+
+
+async def _open_attempt(request, attempt_id):
+    user = await request.auser()
+    if not user.is_authenticated:
+        raise ApiError("Login required.", 401)
+    return check_open(await open_attempts(user, attempt_id).afirst())
+
+
+@require_GET
+async def attempt_detail(request, attempt_id):
+    try:
+        attempt = await _open_attempt(request, attempt_id)
+    except ApiError as exc:
+        return error_response(exc)
+    questions = await aquiz_document(attempt.question_ids)
+    return JsonResponse(attempt_summary(attempt, questions, await aget_saved_answers(attempt)))
+
+
+@require_POST
+async def attempt_answers(request, attempt_id):
+    try:
+        attempt = await _open_attempt(request, attempt_id)
+        answers = posted_answers(request, attempt)
+    except ApiError as exc:
+        return error_response(exc)
+    await asave_answers(attempt, answers)
+    return JsonResponse({"saved": len(answers)})
+
+
+@require_POST
+async def attempt_autosave(request, attempt_id):
+    try:
+        attempt = await _open_attempt(request, attempt_id)
+        answers = posted_answers(request, attempt)
+    except ApiError as exc:
+        return error_response(exc)
+    if not autosave.enabled():
+        await asave_answers(attempt, answers)
+        return JsonResponse({"saved": len(answers)})
+    if await autosave.asave(attempt.pk, answers):
+        await sync_to_async(autosave.flush)()
+    return JsonResponse({"buffered": len(answers)})
+
+
+@require_POST
+async def attempt_submit(request, attempt_id):
+    try:
+        attempt = await _open_attempt(request, attempt_id)
+        answers = posted_answers(request, attempt)
+    except ApiError as exc:
+        return error_response(exc)
+    await asave_answers(attempt, answers)
+    await asubmit_attempt(attempt)
+
+    if await request.session.aget(SESSION_KEY) == attempt.pk:
+        await request.session.apop(SESSION_KEY)
+    await request.session.aset(RESULTS_SESSION_KEY, attempt.pk)
+    return JsonResponse({"redirect": reverse('quiz_results')})
+
+
+async def quiz_results(request):
+    await request.session.apop("quiz_results", None)
+
+    attempt_id = await request.session.aget(RESULTS_SESSION_KEY)
+    user = await request.auser()
+    results_data = await aattempt_results(attempt_id, user) if attempt_id and user.is_authenticated else None
+    if not results_data:
+        await sync_to_async(messages.error)(request, "No quiz results found.")
+        return redirect('select_topic')
+
+    return await sync_to_async(render)(request, "quiz_results.html", {"results": results_data})
@@ -0,0 +1,163 @@
+# quiz/autosave.py
+"""
+Buffered autosave of quiz answers.
+
+The quiz page autosaves as a student types. Each save only writes the cache:
+the latest answer goes under its own (attempt, question) key. The first save
+of a pair since the last flush also appends the pair to a log. A log slot is
+numbered by an atomic counter and claimed through a "queued" marker added
+with cache.add(). flush() reads the new log slots, drops their markers,
+re-reads the latest answers and upserts them all in one bulk statement. So
+the database sees one write per changed question per flush interval, however
+many keystrokes there were.
+
+Dropping the markers before reading the answers means an answer saved during
+a flush queues its pair again rather than getting lost. Submitting grades
+the buffered answers together with the saved ones and writes them all, so a
+submitted attempt never depends on a flush. Answers saved directly (the form,
+the answers endpoint) discard the buffered ones for those questions.
+
+flush() runs from an autosave request once QUIZ_AUTOSAVE_FLUSH_INTERVAL
+seconds have passed since the last one, or from the flush_autosaves command.
+
+The buffer only works in a cache shared by every worker whose add and incr
+are atomic: Redis or Memcached (settings.CACHES). A per-process cache can't
+be flushed by another process. On the database cache each buffered save
+costs more queries and writes than saving the answer, and two processes
+racing through add/incr can lose a log slot, leaving that answer unflushed
+until submit. On any other cache enabled() is False and the autosave
+endpoint writes answers straight to the database instead. Even with Redis,
+the quiz page saves changed answers to the database every
+QUIZ_ANSWER_SAVE_INTERVAL seconds, which bounds what an eviction can lose.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .caching import has_atomic_counters
+from .models import Answer, Attempt
+
+BUFFER_TIMEOUT = 6 * 60 * 60
+LOCK_TIMEOUT = 60
+FLUSH_BATCH = 1000
+
+SEQ_KEY = 'quiz:autosave:seq'
+CURSOR_KEY = 'quiz:autosave:flushed'
+GAP_KEY = 'quiz:autosave:gap'
+LOCK_KEY = 'quiz:autosave:lock'
+DUE_KEY = 'quiz:autosave:due'
+
+
+def _value_key(attempt_id, question_id):
+    return f'quiz:autosave:{attempt_id}:{question_id}'
+
+
+def _queued_key(attempt_id, question_id):
+    return f'quiz:autosave:queued:{attempt_id}:{question_id}'
+
+
+def _slot_key(n):
+    return f'quiz:autosave:slot:{n}'
+
+
+def enabled():
+    """Whether answers may be buffered: only in a shared cache with atomic counters"""
+    return has_atomic_counters()
+
+
+def flush_interval():
+    return settings.QUIZ_AUTOSAVE_FLUSH_INTERVAL
+
+
+def save(attempt_id, answers):
+    """Buffer a {question id: answer} batch; returns True when a flush is due"""
+    cache.set_many({_value_key(attempt_id, pk): answer for pk, answer in answers.items()}, BUFFER_TIMEOUT)
+    for pk in answers:
+        if cache.add(_queued_key(attempt_id, pk), 1, BUFFER_TIMEOUT):
+            cache.add(SEQ_KEY, 0, None)
+            cache.set(_slot_key(cache.incr(SEQ_KEY)), (attempt_id, pk), BUFFER_TIMEOUT)
+    return cache.add(DUE_KEY, 1, flush_interval())
+
+
+async def asave(attempt_id, answers):
+    await cache.aset_many({_value_key(attempt_id, pk): answer for pk, answer in answers.items()}, BUFFER_TIMEOUT)
+    for pk in answers:
+        if await cache.aadd(_queued_key(attempt_id, pk), 1, BUFFER_TIMEOUT):
+            await cache.aadd(SEQ_KEY, 0, None)
+            await cache.aset(_slot_key(await cache.aincr(SEQ_KEY)), (attempt_id, pk), BUFFER_TIMEOUT)
+    return await cache.aadd(DUE_KEY, 1, flush_interval())
+
+
+def buffered(attempt):
+    """{question id: answer} saved since the last flush"""
+    found = cache.get_many([_value_key(attempt.pk, pk) for pk in attempt.question_ids])
+    return {pk: found[_value_key(attempt.pk, pk)] for pk in attempt.question_ids if _value_key(attempt.pk, pk) in found}
+
+
+async def abuffered(attempt):
+    found = await cache.aget_many([_value_key(attempt.pk, pk) for pk in attempt.question_ids])
+    return {pk: found[_value_key(attempt.pk, pk)] for pk in attempt.question_ids if _value_key(attempt.pk, pk) in found}
+
+
+def discard(attempt_id, question_ids):
+    """Forget buffered answers that are being written another way"""
+    cache.delete_many([_value_key(attempt_id, pk) for pk in question_ids])
+
+
+async def adiscard(attempt_id, question_ids):
+    await cache.adelete_many([_value_key(attempt_id, pk) for pk in question_ids])
+
+
+def _pending_slots():
+    """
+    (slot numbers, (attempt, question) pairs) logged since the last flush. A
+    slot that is numbered but not yet written is waited for once, then
+    skipped (it was evicted).
+    """
+    start, end = cache.get(CURSOR_KEY, 0), cache.get(SEQ_KEY, 0)
+    numbers = list(range(start + 1, min(end, start + FLUSH_BATCH) + 1))
+    found = cache.get_many([_slot_key(n) for n in numbers])
+    taken, pairs = [], set()
+    for n in numbers:
+        slot = found.get(_slot_key(n))
+        if slot is None and cache.get(GAP_KEY) != n:
+            cache.set(GAP_KEY, n, BUFFER_TIMEOUT)
+            break
+        taken.append(n)
+        if slot is not None:
+            pairs.add(tuple(slot))
+    return taken, pairs
+
+
+def flush():
+    """Write buffered answers to Answer rows in bulk; returns the number written"""
+    if not cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+        return 0  # Another worker is flushing
+    try:
+        written = 0
+        while True:
+            taken, pairs = _pending_slots()
+            if not taken:
+                return written
+            cache.delete_many([_queued_key(*pair) for pair in pairs])
+            values = cache.get_many([_value_key(*pair) for pair in pairs])
+            # Submitted attempts have written their answers already
+            open_attempts = set(
+                Attempt.objects.filter(pk__in={attempt_id for attempt_id, _ in pairs}, finished_at__isnull=True)
+                .values_list('pk', flat=True)
+            )
+            rows = [
+                Answer(attempt_id=attempt_id, question_id=question_id, typed_answer=values[_value_key(attempt_id, question_id)])
+                for attempt_id, question_id in pairs
+                if attempt_id in open_attempts and _value_key(attempt_id, question_id) in values
+            ]
+            Answer.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['attempt', 'question'],
+                update_fields=['typed_answer'],
+            )
+            written += len(rows)
+            cache.set(CURSOR_KEY, taken[-1], None)
+            cache.delete_many([_slot_key(n) for n in taken])
+    finally:
+        cache.delete(LOCK_KEY)
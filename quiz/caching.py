@@ -0,0 +1,42 @@
+# quiz/caching.py
+"""
+Whether the cache is shared between worker processes, and what it can do.
+
+Cached question payloads are only right when every worker sees the same
+cache. LocMemCache and the dummy cache belong to a single process. On
+those, cached questions expire after a few minutes
+(payloads.LOCAL_PAYLOAD_TIMEOUT) because an edit only clears them in one
+process, and warm_tests refuses to run.
+
+The autosave buffer also needs atomic add and incr, which Redis and
+Memcached have. On any other cache, the database cache included, autosave
+writes answers straight to the database: buffering there costs more writes
+than it saves, and racing processes can lose a log slot.
+"""
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+
+
+def is_shared(alias='default'):
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def has_atomic_counters(alias='default'):
+    """Whether add() and incr() are atomic across processes"""
+    return isinstance(caches[alias], (RedisCache, BaseMemcachedCache))
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if is_shared():
+        return []
+    return [checks.Warning(
+        "The default cache is local to each process.",
+        hint="Set QUIZ_CACHE_BACKEND to db, redis or memcached when running more than one worker; "
+             "until then edited questions can show for a few minutes.",
+        id='quiz.W001',
+    )]
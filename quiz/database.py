@@ -0,0 +1,83 @@
+# quiz/database.py
+"""
+The production database profile (QUIZ_DB_PROFILE=production in settings).
+
+apply_pragmas() runs settings.QUIZ_SQLITE_PRAGMAS on every new SQLite
+connection. The profile turns on WAL, so readers no longer wait for a
+writer, and relaxes fsyncs to once per checkpoint. The primary also begins
+its transactions IMMEDIATE. A transaction that read first and then wrote
+would otherwise fail at once with "database is locked" under load, without
+waiting out the busy timeout.
+
+ReplicaRouter sends reads to the 'replica' alias, but only inside
+read_replica(). That marks the read-only, staleness-tolerant work: the
+practice pages, the topic listings and reporting. Everything else reads
+from the primary, including sessions and users, so a fresh login or a
+just-submitted quiz is seen at once. All writes go to the primary. On a
+single SQLite server the replica is the same file opened read-only;
+QUIZ_REPLICA_DB points it at a real replica (e.g. one kept by LiteFS or
+Litestream) instead.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+# Apps whose rows must be read from the primary: logins, sessions and the
+# database cache (whose stand-in model has no _meta.label)
+PRIMARY_ONLY_APPS = {'auth', 'sessions', 'contenttypes', 'admin', 'django_cache'}
+
+_use_replica = ContextVar('quiz_use_replica', default=False)
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """connection_created receiver (connected in QuizConfig.ready)"""
+    if connection.vendor != 'sqlite' or not settings.QUIZ_SQLITE_PRAGMAS:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.QUIZ_SQLITE_PRAGMAS.items():
+            # The journal mode is a property of the file, set through the primary
+            if name == 'journal_mode' and connection.alias != DEFAULT_DB_ALIAS:
+                continue
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def read_replica():
+    """Read from the replica (when there is one) inside this block, or view when used as a decorator"""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def read_alias():
+    """The alias for reads that may be a little stale, such as a streamed export"""
+    return REPLICA if REPLICA in settings.DATABASES else DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            _use_replica.get()
+            and model._meta.app_label not in PRIMARY_ONLY_APPS
+            and model._meta.label != settings.AUTH_USER_MODEL
+            # Inside a transaction, read what it has written
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Even for objects that were read from the replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA} or None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db == REPLICA else None
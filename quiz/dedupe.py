@@ -0,0 +1,176 @@
+# quiz/dedupe.py
+"""
+Near-duplicate question detection with MinHash and locality-sensitive hashing.
+
+Question text is normalized (lower-cased, LaTeX delimiters dropped, commands
+reduced to their names, every number replaced by 0) so that variants
+differing only in numbers or formatting look the same, then cut into
+overlapping word shingles. A MinHash signature of NUM_PERM values estimates
+the Jaccard similarity of two shingle sets, and its BANDS bands of ROWS
+values are hashed into QuestionBucket rows. Questions sharing any bucket are
+candidates. A lookup reads the buckets through an index and compares only
+the candidates' signatures, so its cost does not grow with the bank.
+
+With 16 bands of 4 rows, a pair with similarity 0.7 shares a bucket with
+probability ~0.99 and a pair at 0.3 with probability ~0.12.
+"""
+import random
+import re
+from array import array
+from hashlib import blake2b
+
+from django.db import connection, transaction
+
+from .models import QuestionBucket, QuestionFingerprint
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+SIMILARITY_THRESHOLD = 0.7
+BATCH_SIZE = 1000
+# Ids per IN (...) lookup, well under SQLite's bound-parameter limit
+QUERY_CHUNK = 5000
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240611)
+PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+MATH_DELIMITERS = re.compile(r'\$|\\[()\[\]]')
+LATEX_COMMAND = re.compile(r'\\([a-zA-Z]+)')
+NUMBER = re.compile(r'\d+(?:[.,]\d+)?')
+TOKEN = re.compile(r'[^\W\d_]+|0|[+\-*/=^<>]')
+
+
+def normalize(text):
+    """Tokens of text with LaTeX canonicalized and numbers blanked out"""
+    text = MATH_DELIMITERS.sub(' ', (text or '').lower())
+    text = LATEX_COMMAND.sub(r' \1 ', text)
+    text = NUMBER.sub(' 0 ', text)
+    return TOKEN.findall(text)
+
+
+def shingles(tokens):
+    if len(tokens) <= SHINGLE_SIZE:
+        return {' '.join(tokens)} if tokens else set()
+    return {' '.join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def _hash64(data):
+    return int.from_bytes(blake2b(data, digest_size=8).digest(), 'little')
+
+
+def signature(text):
+    """MinHash signature of the text, or None when it has no words to compare"""
+    hashes = [_hash64(shingle.encode()) for shingle in shingles(normalize(text))]
+    if not hashes:
+        return None
+    return array('q', (min((a * x + b) % _PRIME for x in hashes) for a, b in PERMUTATIONS))
+
+
+def band_keys(sig):
+    """One signed 64-bit bucket per band; the band number is part of the hash"""
+    return [
+        int.from_bytes(
+            blake2b(sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8, salt=bytes([band])).digest(),
+            'little', signed=True,
+        )
+        for band in range(BANDS)
+    ]
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERM
+
+
+def unpack(data):
+    sig = array('q')
+    sig.frombytes(bytes(data))
+    return sig
+
+
+@transaction.atomic
+def index_signatures(signatures, replace=True):
+    """
+    Store {question id: signature or None} in the fingerprint and bucket
+    tables. Pass replace=False when the questions have no entries yet (e.g.
+    after clear_index()) to skip removing the old ones.
+    """
+    present = {pk: sig for pk, sig in signatures.items() if sig is not None}
+    fingerprints = [QuestionFingerprint(question_id=pk, signature=sig.tobytes()) for pk, sig in present.items()]
+    if replace:
+        QuestionBucket.objects.filter(question_id__in=list(signatures)).delete()
+        QuestionFingerprint.objects.filter(
+            question_id__in=[pk for pk, sig in signatures.items() if sig is None]
+        ).delete()
+        QuestionFingerprint.objects.bulk_create(
+            fingerprints,
+            update_conflicts=True,
+            unique_fields=['question'],
+            update_fields=['signature'],
+        )
+    else:
+        QuestionFingerprint.objects.bulk_create(fingerprints, batch_size=BATCH_SIZE)
+    # BANDS rows per question: a plain executemany is several times faster than bulk_create here
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {QuestionBucket._meta.db_table} (question_id, bucket) VALUES (%s, %s)",
+            [(pk, key) for pk, sig in present.items() for key in band_keys(sig)],
+        )
+
+
+def clear_index():
+    QuestionBucket.objects.all().delete()
+    QuestionFingerprint.objects.all().delete()
+
+
+def index_questions(questions):
+    index_signatures({question.pk: signature(question.text) for question in questions})
+
+
+def _chunks(values, size=QUERY_CHUNK):
+    values = list(values)
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+def find_matches(signatures, threshold=SIMILARITY_THRESHOLD):
+    """
+    {key: [(question id, similarity), ...]} for a {key: signature} mapping,
+    most similar first. Looks up all the signatures' buckets together, so a
+    batch costs a few queries rather than a few per question.
+    """
+    wanted = {key: band_keys(sig) for key, sig in signatures.items() if sig is not None}
+    buckets = {}
+    for chunk in _chunks({bucket for keys in wanted.values() for bucket in keys}):
+        for bucket, question_id in QuestionBucket.objects.filter(bucket__in=chunk).values_list('bucket', 'question_id'):
+            buckets.setdefault(bucket, set()).add(question_id)
+
+    candidates = {
+        key: set().union(*(buckets.get(bucket, ()) for bucket in keys))
+        for key, keys in wanted.items()
+    }
+    stored = {}
+    for chunk in _chunks(set().union(*candidates.values())):
+        for pk, data in QuestionFingerprint.objects.filter(question_id__in=chunk).values_list('question_id', 'signature'):
+            stored[pk] = unpack(data)
+
+    matches = {}
+    for key, question_ids in candidates.items():
+        scored = [
+            (pk, similarity(signatures[key], stored[pk]))
+            for pk in question_ids if pk in stored
+        ]
+        matches[key] = sorted(
+            [(pk, score) for pk, score in scored if score >= threshold],
+            key=lambda match: -match[1],
+        )
+    return matches
+
+
+def find_similar(text, exclude=None, threshold=SIMILARITY_THRESHOLD):
+    """[(question id, similarity)] of indexed questions resembling text, excluding the `exclude` id"""
+    sig = signature(text)
+    if sig is None:
+        return []
+    return [(pk, score) for pk, score in find_matches({0: sig}, threshold)[0] if pk != exclude]
@@ -0,0 +1,229 @@
+# quiz/engine.py
+"""
+Attempt-backed quiz engine.
+
+A quiz is an Attempt holding the ids of the questions it serves. Navigation
+upserts the single Answer row that changed (or, from the quiz API, a batch
+of them in one statement), and submit grades every answer
+and writes them back in one transaction, so nothing but the attempt id
+lives in the session.
+
+Autosaved answers wait in the cache (see autosave.py); reads merge them in
+and submit writes them along with everything else.
+
+The a-prefixed functions are the async ORM versions the async views use.
+Submitting stays synchronous (it runs in a transaction) and is wrapped.
+"""
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import timezone
+
+from . import autosave, leaderboard, mastery, sampling, scheduler
+from .grading import grade_answer
+from .models import Answer, Attempt, Question
+
+SESSION_KEY = 'quiz_attempt_id'
+# The last submitted attempt, for the results page
+RESULTS_SESSION_KEY = 'quiz_results_attempt_id'
+ANSWER_MAX_LENGTH = Answer._meta.get_field('typed_answer').max_length
+
+
+def start_attempt(request, topic=None, test=None):
+    """
+    Create an attempt and remember it in the session. A topic quiz gets a
+    fresh random stratified question set; a scheduled test gets the user's
+    pre-built variant.
+    """
+    if test is not None:
+        seed, question_ids = scheduler.question_set_for(test, request.user)
+    else:
+        seed = sampling.new_seed()
+        question_ids = sampling.draw(topic.pk, seed)
+    attempt = Attempt.objects.create(
+        user=request.user, topic=topic, test=test, question_ids=question_ids, seed=seed
+    )
+    request.session[SESSION_KEY] = attempt.pk
+    return attempt
+
+
+def get_active_attempt(request, topic=None, test=None):
+    """Return the user's unfinished attempt for this topic or test, or None"""
+    attempt_id = request.session.get(SESSION_KEY)
+    if attempt_id is None:
+        return None
+    return Attempt.objects.filter(
+        pk=attempt_id, user=request.user, topic=topic, test=test, finished_at__isnull=True
+    ).first()
+
+
+def get_saved_answers(attempt):
+    """Map question id -> typed answer for everything answered so far, autosaves included"""
+    answers = dict(attempt.answers.values_list('question_id', 'typed_answer'))
+    answers.update(autosave.buffered(attempt))
+    return answers
+
+
+async def aget_saved_answers(attempt):
+    answers = {pk: answer async for pk, answer in attempt.answers.values_list('question_id', 'typed_answer')}
+    answers.update(await autosave.abuffered(attempt))
+    return answers
+
+
+def save_answer(attempt, question_id, answer):
+    """Insert or update the one Answer row for this question (a single upsert)"""
+    save_answers(attempt, {question_id: answer})
+
+
+def save_answers(attempt, answers):
+    """Upsert a {question id: answer} batch in one statement, as the quiz API syncs them"""
+    if not answers:
+        return
+    Answer.objects.bulk_create(
+        _answer_rows(attempt, answers),
+        update_conflicts=True,
+        unique_fields=['attempt', 'question'],
+        update_fields=['typed_answer'],
+    )
+    autosave.discard(attempt.pk, answers)
+
+
+def _answer_rows(attempt, answers):
+    return [Answer(attempt=attempt, question_id=pk, typed_answer=answer) for pk, answer in answers.items()]
+
+
+async def asave_answers(attempt, answers):
+    if not answers:
+        return
+    await Answer.objects.abulk_create(
+        _answer_rows(attempt, answers),
+        update_conflicts=True,
+        unique_fields=['attempt', 'question'],
+        update_fields=['typed_answer'],
+    )
+    await autosave.adiscard(attempt.pk, answers)
+
+
+@transaction.atomic
+def submit_attempt(attempt):
+    """
+    Grade the attempt and write every Answer row in one statement, autosaved
+    answers included. Returns the questions in display order along with
+    their graded answers.
+
+    The attempt is claimed first by setting finished_at only where it is
+    still unset. Of two concurrent submits (a double click, a retried POST)
+    one claims it and grades; the other waits for that transaction's row
+    lock, updates nothing, and returns what was graded.
+    """
+    finished_at = timezone.now()
+    claimed = Attempt.objects.filter(pk=attempt.pk, finished_at__isnull=True).update(finished_at=finished_at)
+    if not claimed:
+        attempt.refresh_from_db(fields=['score', 'finished_at'])
+        return graded_answers(attempt)
+    attempt.finished_at = finished_at
+
+    # The answer key comes from the database, never the payload cache: an
+    # edit the cache missed (a bulk update, an import) must not change marks
+    questions = Question.objects.in_bulk(attempt.question_ids)
+    saved = get_saved_answers(attempt)
+
+    graded = []
+    score = 0
+    for question_id in attempt.question_ids:
+        question = questions.get(question_id)
+        if question is None:  # Deleted since the quiz started
+            continue
+        answer = grade_answer(Answer(
+            attempt=attempt,
+            question=question,
+            typed_answer=(saved.get(question_id) or "").strip(),
+        ), question)
+        score += answer.marks_awarded
+        graded.append((question, answer))
+
+    Answer.objects.bulk_create(
+        [answer for _, answer in graded],
+        update_conflicts=True,
+        unique_fields=['attempt', 'question'],
+        update_fields=['typed_answer', 'is_correct', 'marks_awarded'],
+    )
+
+    attempt.score = score
+    attempt.save(update_fields=['score'])
+    transaction.on_commit(lambda: autosave.discard(attempt.pk, attempt.question_ids))
+    # Additive, so safe only behind the claim above
+    mastery.record_attempt(attempt, graded)
+    leaderboard.record_attempt(attempt)
+    return graded
+
+
+asubmit_attempt = sync_to_async(submit_attempt)
+
+
+def graded_answers(attempt):
+    """(question, answer) pairs of a submitted attempt in display order, as submit_attempt() returns them"""
+    answers = Answer.objects.filter(attempt=attempt).select_related('question')
+    position = {pk: index for index, pk in enumerate(attempt.question_ids)}
+    return sorted(
+        ((answer.question, answer) for answer in answers),
+        key=lambda pair: position.get(pair[0].pk, len(position)),
+    )
+
+
+def attempt_results(attempt_id, user):
+    """
+    The results page data for a finished attempt of this user, read from its
+    Answer rows with the questions, attempt and topic/test joined in one query.
+    Returns None if there is no such attempt.
+    """
+    return _results_data(list(_results_query(attempt_id, user)))
+
+
+async def aattempt_results(attempt_id, user):
+    return _results_data([answer async for answer in _results_query(attempt_id, user)])
+
+
+def _results_query(attempt_id, user):
+    return (
+        Answer.objects.filter(attempt_id=attempt_id, attempt__user=user, attempt__finished_at__isnull=False)
+        .select_related('question', 'attempt__topic', 'attempt__test')
+    )
+
+
+def _results_data(answers):
+    if not answers:
+        return None
+
+    attempt = answers[0].attempt
+    position = {pk: index for index, pk in enumerate(attempt.question_ids)}
+    answers.sort(key=lambda answer: position.get(answer.question_id, len(position)))
+
+    results = []
+    for answer in answers:
+        q = answer.question
+        results.append({
+            "question_text": q.text,
+            "user_answer": answer.typed_answer or "No answer",
+            "correct_answer": (q.correct_option or "").strip(),
+            "is_correct": answer.is_correct,
+            "question_type": q.question_type,
+            "options": {
+                "A": q.option_a,
+                "B": q.option_b,
+                "C": q.option_c,
+                "D": q.option_d
+            } if q.question_type == "MCQ" else None
+        })
+
+    score = sum(1 for answer in answers if answer.is_correct)
+    total = len(attempt.question_ids)
+    source = attempt.test or attempt.topic
+    return {
+        "topic_id": attempt.topic_id,
+        "test_id": attempt.test_id,
+        "topic_name": source.name if source else "",
+        "score": score,
+        "total": total,
+        "percentage": round(score / total * 100, 1) if total else 0,
+        "results": results,
+    }
@@ -0,0 +1,80 @@
+# quiz/exporter.py
+"""
+Streaming export of the question bank as CSV or JSONL.
+
+Rows are read with QuerySet.iterator() and encoded one at a time, so an
+export of any size runs in constant memory and can be sent straight to a
+StreamingHttpResponse. Question exports use the importer's columns, so a
+file can be imported again as-is.
+"""
+import csv
+import json
+
+from .importer import COLUMNS, FORMATS
+from .models import Question, Topic
+
+CHUNK_SIZE = 2000
+KINDS = ('questions', 'topics')
+TOPIC_COLUMNS = ['id', 'name', 'note']
+CONTENT_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+def question_columns(include_rendered=False):
+    columns = ['id'] + COLUMNS
+    if include_rendered:
+        columns.append('solution_html')
+    return columns
+
+
+def question_rows(include_rendered=False, chunk_size=CHUNK_SIZE, using=None):
+    fields = ['id', 'topic__name', 'text', 'question_type', 'difficulty',
+              'option_a', 'option_b', 'option_c', 'option_d', 'correct_option', 'solution']
+    if include_rendered:
+        fields.append('rendered')
+    questions = Question.objects.using(using).order_by('pk').values_list(*fields)
+
+    for values in questions.iterator(chunk_size=chunk_size):
+        row = dict(zip(['id'] + COLUMNS, values))
+        if include_rendered:
+            row['solution_html'] = (values[-1] or {}).get('solution')
+        yield row
+
+
+def topic_rows(chunk_size=CHUNK_SIZE, using=None):
+    topics = Topic.objects.using(using).order_by('pk').values_list('id', 'name', 'note__content')
+    for values in topics.iterator(chunk_size=chunk_size):
+        yield dict(zip(TOPIC_COLUMNS, values))
+
+
+class _Echo:
+    """File-like object whose write() hands back the line for streaming"""
+    def write(self, value):
+        return value
+
+
+def encode_csv(rows, columns):
+    writer = csv.DictWriter(_Echo(), fieldnames=columns)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def encode_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def export_lines(fmt, kind='questions', include_rendered=False, chunk_size=CHUNK_SIZE, using=None):
+    """Yield the export as lines of text, read from the given database alias (default: the router's choice)"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format {fmt!r}; use one of {', '.join(FORMATS)}.")
+    if kind == 'questions':
+        rows, columns = question_rows(include_rendered, chunk_size, using), question_columns(include_rendered)
+    elif kind == 'topics':
+        rows, columns = topic_rows(chunk_size, using), TOPIC_COLUMNS
+    else:
+        raise ValueError(f"Unsupported export {kind!r}; use one of {', '.join(KINDS)}.")
+
+    if fmt == 'csv':
+        return encode_csv(rows, columns)
+    return encode_jsonl(rows)
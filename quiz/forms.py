@@ -1,5 +1,6 @@
 # quiz/forms.py
 from django import forms
+from .dedupe import find_similar
 from .models import Question, Topic
 
 class TopicForm(forms.ModelForm):
@@ -8,6 +9,10 @@ class TopicForm(forms.ModelForm):
         fields = ['name',]
 
 class QuestionForm(forms.ModelForm):
+    allow_duplicate = forms.BooleanField(
+        required=False, label="Save anyway; this is not a duplicate of the similar questions"
+    )
+
     class Meta:
         model = Question
         fields = [
@@ -35,38 +40,59 @@ class QuestionForm(forms.ModelForm):
         self.fields['option_c'].required = False
         self.fields['option_d'].required = False
         self.fields['correct_option'].required = False
+        self.similar_questions = []
 
     def clean(self):
         cleaned_data = super().clean()
-        question_type = cleaned_data.get('question_type')
-        
-        # Validate based on question type
-        if question_type == 'MCQ':
-            # For MCQ, all options should be filled
-            required_fields = ['option_a', 'option_b', 'option_c', 'option_d']
-            for field in required_fields:
-                if not cleaned_data.get(field):
-                    self.add_error(field, f'This field is required for MCQ questions.')
-            
-            # Validate correct option for MCQ
-            correct_option = cleaned_data.get('correct_option')
-            if correct_option not in ['A', 'B', 'C', 'D']:
-                self.add_error('correct_option', 'For MCQ questions, correct option must be A, B, C, or D.')
-        
-        elif question_type == 'TF':  # True/False
-            # For True/False, options are not needed
-            correct_option = cleaned_data.get('correct_option')
-            if correct_option not in ['True', 'False']:
-                self.add_error('correct_option', 'For True/False questions, correct option must be True or False.')
-        
-        elif question_type == 'NUM':  # Numeric
-            # For Numeric, correct_option should contain the numeric answer
-            correct_option = cleaned_data.get('correct_option')
-            if not correct_option:
-                self.add_error('correct_option', 'Please provide the correct numeric answer.')
-        
+        for field, message in question_type_errors(cleaned_data):
+            self.add_error(field, message)
+
+        text = cleaned_data.get('text')
+        if text and not cleaned_data.get('allow_duplicate'):
+            matches = find_similar(text, exclude=self.instance.pk)
+            if matches:
+                found = Question.objects.select_related('topic').in_bulk([pk for pk, _ in matches])
+                self.similar_questions = [
+                    (found[pk], round(score * 100)) for pk, score in matches[:5] if pk in found
+                ]
+                self.add_error('text', "This looks like a duplicate of an existing question. "
+                                       "Check the similar questions below, or tick \"Save anyway\".")
         return cleaned_data
 
+
+def question_type_errors(data):
+    """
+    Type-specific rules for a question, shared by QuestionForm and the bulk
+    importer. Returns a list of (field, message) pairs.
+    """
+    errors = []
+    question_type = data.get('question_type')
+    correct_option = data.get('correct_option')
+
+    # Validate based on question type
+    if question_type == 'MCQ':
+        # For MCQ, all options should be filled
+        required_fields = ['option_a', 'option_b', 'option_c', 'option_d']
+        for field in required_fields:
+            if not data.get(field):
+                errors.append((field, 'This field is required for MCQ questions.'))
+
+        # Validate correct option for MCQ
+        if correct_option not in ['A', 'B', 'C', 'D']:
+            errors.append(('correct_option', 'For MCQ questions, correct option must be A, B, C, or D.'))
+
+    elif question_type == 'TF':  # True/False
+        # For True/False, options are not needed
+        if correct_option not in ['True', 'False']:
+            errors.append(('correct_option', 'For True/False questions, correct option must be True or False.'))
+
+    elif question_type == 'NUM':  # Numeric
+        # For Numeric, correct_option should contain the numeric answer
+        if not correct_option:
+            errors.append(('correct_option', 'Please provide the correct numeric answer.'))
+
+    return errors
+
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model
 from django import forms
@@ -87,3 +113,9 @@ class SignUpForm(UserCreationForm):
         if commit:
             user.save()
         return user
+
+
+class QuestionImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV or JSONL with columns: topic, text, question_type, difficulty, "
+                                     "option_a-option_d, correct_option, solution")
+    create_topics = forms.BooleanField(required=False, help_text="Create topics that don't exist yet")
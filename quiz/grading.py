@@ -0,0 +1,76 @@
+# quiz/grading.py
+"""
+Answer grading.
+
+The comparison rule lives in is_correct() and is shared by quiz submission
+and grade_attempts(), which regrades any number of attempts at once: the
+answer keys for the whole set are read in a single joined query and the
+results are written back with bulk updates.
+"""
+from collections import Counter
+
+from django.db import transaction
+
+from . import leaderboard, mastery
+from .models import Answer, Attempt
+
+BATCH_SIZE = 2000
+
+
+def is_correct(question_type, correct_option, answer):
+    """MCQ and True/False compare case-insensitively, Numeric compares exactly"""
+    answer = (answer or "").strip()
+    if not answer:
+        return False
+    correct = (correct_option or "").strip()
+    if question_type in ["MCQ", "TF"]:
+        return answer.upper() == correct.upper()
+    return answer == correct
+
+
+def grade_answer(answer, question):
+    """Set is_correct and marks_awarded on an (unsaved) Answer"""
+    answer.is_correct = is_correct(question.question_type, question.correct_option, answer.typed_answer)
+    answer.marks_awarded = question.marks if answer.is_correct else 0.0
+    return answer
+
+
+@transaction.atomic
+def grade_attempts(attempts, batch_size=BATCH_SIZE):
+    """
+    Regrade every answer of the given Attempt queryset and store the scores.
+    Only answers whose result changed are written. Returns {attempt_id: score}.
+    """
+    scores = {}
+    boards = set()
+    for pk, test_id, topic_id in attempts.values_list('pk', 'test_id', 'topic_id'):
+        scores[pk] = 0.0
+        boards.update((kind, object_id) for kind, object_id in (('test', test_id), ('topic', topic_id)) if object_id)
+    rows = Answer.objects.filter(attempt__in=attempts).values_list(
+        'pk', 'attempt_id', 'typed_answer', 'is_correct', 'marks_awarded',
+        'question__question_type', 'question__correct_option', 'question__marks',
+        'attempt__user_id', 'attempt__finished_at', 'question__topic_id', 'question__difficulty',
+    )
+
+    changed = []
+    mastery_deltas = Counter()
+    for (pk, attempt_id, typed, was_correct, old_marks, question_type, key, marks,
+         user_id, finished_at, topic_id, difficulty) in rows:
+        correct = is_correct(question_type, key, typed)
+        awarded = marks if correct else 0.0
+        scores[attempt_id] += awarded
+        if correct != was_correct or awarded != old_marks:
+            changed.append(Answer(pk=pk, is_correct=correct, marks_awarded=awarded))
+            # Only finished attempts have been counted in the mastery rollup
+            if finished_at is not None and correct != was_correct:
+                mastery_deltas[(user_id, topic_id, difficulty)] += 1 if correct else -1
+
+    Answer.objects.bulk_update(changed, ['is_correct', 'marks_awarded'], batch_size=batch_size)
+    Attempt.objects.bulk_update(
+        [Attempt(pk=pk, score=score) for pk, score in scores.items()],
+        ['score'],
+        batch_size=batch_size,
+    )
+    mastery.adjust_correct(mastery_deltas)
+    leaderboard.rebuild_boards(boards)
+    return scores
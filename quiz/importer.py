@@ -0,0 +1,257 @@
+# quiz/importer.py
+"""
+Streaming bulk import of questions from CSV or JSONL.
+
+Rows are read one at a time, checked with the same rules as QuestionForm
+and inserted with bulk_create in batches, each batch in its own
+transaction. Only the current batch is held in memory, so memory use does
+not grow with the size of the file.
+
+A row that can't be read is rejected like an invalid one and the import
+goes on: bytes that aren't UTF-8, malformed CSV and invalid JSON.
+"""
+import csv
+import io
+import json
+import re
+import time
+from collections import Counter
+
+from django.db import transaction
+
+from . import dedupe, pagecache, search
+from .forms import question_type_errors
+from .models import Question, Topic
+from .rendering import render_question
+from .stats import apply_deltas, stats_key
+
+BATCH_SIZE = 1000
+FORMATS = ('csv', 'jsonl')
+COLUMNS = [
+    'topic', 'text', 'question_type', 'difficulty',
+    'option_a', 'option_b', 'option_c', 'option_d',
+    'correct_option', 'solution',
+]
+MCQ_OPTIONS = ['option_a', 'option_b', 'option_c', 'option_d']
+# Checked per row: SQLite ignores them, but other databases reject the whole batch
+MAX_LENGTHS = {
+    column: Question._meta.get_field(column).max_length
+    for column in COLUMNS if column != 'topic' and Question._meta.get_field(column).max_length
+}
+
+# Errors kept on the result for display; the rest are only counted
+MAX_KEPT_ERRORS = 100
+
+# Bytes that aren't UTF-8 decode to lone surrogates (errors='surrogateescape')
+UNDECODABLE = re.compile('[\udc80-\udcff]')
+NOT_UTF8 = "Not UTF-8 text; save the file as UTF-8 (\"CSV UTF-8\" in Excel)."
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.error_count = 0
+        self.errors = []  # (line number, message), capped at MAX_KEPT_ERRORS
+        self.duplicate_count = 0
+        self.duplicates = []  # (line number, new question id, similar question id, similarity)
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return (self.created + self.error_count) / self.elapsed if self.elapsed else 0.0
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_KEPT_ERRORS:
+            self.errors.append((line, message))
+
+    def add_duplicate(self, line, question_id, similar_id, score):
+        self.duplicate_count += 1
+        if len(self.duplicates) < MAX_KEPT_ERRORS:
+            self.duplicates.append((line, question_id, similar_id, score))
+
+
+def detect_format(filename):
+    name = filename.lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+
+def _undecodable(values):
+    return any(isinstance(value, str) and UNDECODABLE.search(value) for value in values)
+
+
+def iter_rows(stream, fmt):
+    """
+    Yield (line number, row dict) from a binary or text stream. A row that
+    can't be read comes as (line number, ValueError) instead.
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='surrogateescape', newline='')
+
+    if fmt == 'csv':
+        yield from _csv_rows(stream)
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            if UNDECODABLE.search(line):
+                yield line_number, ValueError(NOT_UTF8)
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, ValueError(f"Invalid JSON: {e}")
+                continue
+            yield line_number, row
+    else:
+        raise ValueError(f"Unsupported format {fmt!r}; use one of {', '.join(FORMATS)}.")
+
+
+def _csv_rows(stream):
+    reader = csv.DictReader(stream)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # The reader starts afresh on the next line
+            yield reader.line_num, ValueError(f"Malformed CSV: {e}")
+            continue
+        if _undecodable(row.keys()) or _undecodable(row.values()):
+            yield reader.line_num, ValueError(NOT_UTF8)
+            continue
+        yield reader.line_num, row
+
+
+class QuestionImporter:
+    def __init__(self, batch_size=BATCH_SIZE, create_topics=False, created_by=None, on_error=None,
+                 render=True, check_duplicates=True):
+        self.batch_size = batch_size
+        self.create_topics = create_topics
+        self.render = render
+        self.check_duplicates = check_duplicates
+        self.created_by = created_by
+        self.on_error = on_error
+        # Topics are few; resolve names and ids from memory
+        self.topics = {name.lower(): pk for pk, name in Topic.objects.values_list('pk', 'name')}
+        self.topic_ids = set(self.topics.values())
+
+    def resolve_topic(self, value):
+        value = str(value or '').strip()
+        if not value:
+            raise ValueError("topic is required.")
+        if value.isdigit() and int(value) in self.topic_ids:
+            return int(value)
+        pk = self.topics.get(value.lower())
+        if pk is None:
+            if not self.create_topics:
+                raise ValueError(f"Unknown topic {value!r}.")
+            limit = Topic._meta.get_field('name').max_length
+            if len(value) > limit:
+                raise ValueError(f"topic is longer than {limit} characters.")
+            pk = Topic.objects.create(name=value).pk
+            self.topics[value.lower()] = pk
+            self.topic_ids.add(pk)
+        return pk
+
+    def build_question(self, row):
+        """Validate a row and return an unsaved Question (raises ValueError)"""
+        if not isinstance(row, dict):
+            raise ValueError("Row is not an object.")
+        data = {column: row.get(column) for column in COLUMNS}
+        for column, value in data.items():
+            if isinstance(value, str):
+                data[column] = value.strip() or None
+            elif value is not None and column != 'difficulty':
+                data[column] = str(value)
+
+        if not data['text']:
+            raise ValueError("text is required.")
+        if data['question_type'] not in dict(Question.QUESTION_TYPES):
+            raise ValueError(f"question_type must be one of {', '.join(dict(Question.QUESTION_TYPES))}.")
+        try:
+            data['difficulty'] = int(data['difficulty'] or 1)
+        except (TypeError, ValueError):
+            raise ValueError("difficulty must be 1, 2 or 3.")
+        if data['difficulty'] not in dict(Question.DIFFICULTY_LEVELS):
+            raise ValueError("difficulty must be 1, 2 or 3.")
+
+        for column, limit in MAX_LENGTHS.items():
+            if data[column] and len(data[column]) > limit:
+                raise ValueError(f"{column} is longer than {limit} characters.")
+
+        errors = question_type_errors(data)
+        if errors:
+            raise ValueError(" ".join(f"{field}: {message}" for field, message in errors))
+
+        data['topic_id'] = self.resolve_topic(data.pop('topic'))
+        # Clear MCQ options if not MCQ type, as question_create does
+        if data['question_type'] != 'MCQ':
+            for field in MCQ_OPTIONS:
+                data[field] = None
+
+        question = Question(created_by=self.created_by, **data)
+        if self.render:
+            render_question(question)
+        return question
+
+    def run(self, rows):
+        """Import (line number, row) pairs and return an ImportResult"""
+        result = ImportResult()
+        batch = []
+        for line_number, row in rows:
+            try:
+                if isinstance(row, ValueError):
+                    raise row
+                batch.append((line_number, self.build_question(row)))
+            except ValueError as e:
+                result.add_error(line_number, str(e))
+                if self.on_error:
+                    self.on_error(line_number, str(e))
+                continue
+            if len(batch) >= self.batch_size:
+                self.flush(batch, result)
+                batch = []
+        if batch:
+            self.flush(batch, result)
+        result.elapsed = time.perf_counter() - result.started
+        return result
+
+    @transaction.atomic
+    def flush(self, batch, result):
+        questions = [question for _, question in batch]
+        Question.objects.bulk_create(questions)
+        # bulk_create skips the save signals, so do their work here
+        apply_deltas(Counter(stats_key(question) for question in questions))
+        topic_ids = {question.topic_id for question in questions}
+        pagecache.bump(*topic_ids)
+        search.index_questions(questions)
+        if self.check_duplicates:
+            self.flag_duplicates(batch, result)
+        result.created += len(batch)
+
+    def flag_duplicates(self, batch, result):
+        """
+        Index the batch for near-duplicate detection and flag each question
+        that resembles an earlier one, in the bank or earlier in the file.
+        The rows are imported either way.
+        """
+        signatures = {question.pk: dedupe.signature(question.text) for _, question in batch}
+        dedupe.index_signatures(signatures)
+        matches = dedupe.find_matches(signatures)
+        for line_number, question in batch:
+            earlier = [(pk, score) for pk, score in matches.get(question.pk, []) if pk < question.pk]
+            if earlier:
+                result.add_duplicate(line_number, question.pk, *earlier[0])
+
+
+def import_questions(stream, fmt, **options):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format {fmt!r}; use one of {', '.join(FORMATS)}.")
+    return QuestionImporter(**options).run(iter_rows(stream, fmt))
@@ -0,0 +1,181 @@
+# quiz/item_stats.py
+"""
+Classical item statistics for the question bank, stored in QuestionStats.
+
+rebuild_item_stats() streams the answers of every finished attempt in
+chunks of CHUNK_SIZE rows into NumPy arrays. Per question it adds up the
+response count, the correct count, the sums behind a correlation, and the
+number of picks of each MCQ option, all with np.bincount over the chunk's
+questions numbered with np.unique. Nothing is grouped row by row in Python,
+and memory depends on the number of questions answered, not on answers or
+question ids. The database maps each MCQ answer to an option
+index, so only numbers cross over.
+
+- difficulty_index: the share of responses that were correct.
+- discrimination: the point-biserial correlation between answering the
+  question correctly and the marks earned on the rest of the attempt.
+  Questions that strong students miss come out low or negative.
+- option_*_count: how often each option was chosen. Distractors that nobody
+  picks, or that draw more picks than the key, stand out.
+
+question_list and the admin read the table as it is. Rerun the command
+after a batch of quizzes or a regrade to refresh it.
+"""
+import itertools
+import math
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import Trim, Upper
+from django.utils import timezone
+
+from .database import read_alias
+from .models import Answer, Question, QuestionStats
+
+try:
+    import numpy as np
+except ImportError:  # Only the batch job needs NumPy; the pages read its table
+    np = None
+
+CHUNK_SIZE = 50_000
+BATCH_SIZE = 2000
+OPTIONS = 'ABCD'
+
+# Columns fetched per answer, in order
+QUESTION, CORRECT, MARKS, SCORE, OPTION = range(5)
+# Per-question sums, in order: responses, x, y, x*y, y*y where x is 1 for a
+# correct answer and y is the attempt's score without this answer
+SUMS = 5
+# QuestionStats columns, in the order rebuild_item_stats() writes them
+FIELDS = [
+    'question', 'responses', 'difficulty_index', 'discrimination',
+    'option_a_count', 'option_b_count', 'option_c_count', 'option_d_count', 'updated_at',
+]
+
+
+def answer_rows(using=None):
+    """(question_id, is_correct, marks_awarded, attempt score, option index) per graded answer"""
+    option = Case(
+        *[
+            When(question__question_type='MCQ', choice=letter, then=Value(index))
+            for index, letter in enumerate(OPTIONS)
+        ],
+        default=Value(len(OPTIONS)),
+        output_field=IntegerField(),
+    )
+    return (
+        Answer.objects.using(using)
+        .filter(attempt__finished_at__isnull=False)
+        .alias(choice=Upper(Trim('typed_answer')))
+        .values_list('question_id', 'is_correct', 'marks_awarded', 'attempt__score', option)
+    )
+
+
+def chunks(rows, size=CHUNK_SIZE):
+    """The rows as float arrays of shape (n, columns), at most size rows each"""
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        width = len(chunk[0])
+        flat = itertools.chain.from_iterable(chunk)
+        yield np.fromiter(flat, dtype=np.float64, count=len(chunk) * width).reshape(-1, width)
+
+
+class Accumulator:
+    """Running per-question sums for the questions seen so far, in question id order"""
+
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros((SUMS, 0))
+        self.options = np.zeros((len(OPTIONS) + 1, 0), dtype=np.int64)
+
+    def _slots(self, ids):
+        """Columns of the (sorted, unique) ids, adding columns for new ones"""
+        merged = np.union1d(self.ids, ids)
+        if len(merged) > len(self.ids):
+            moved = np.searchsorted(merged, self.ids)
+            sums = np.zeros((SUMS, len(merged)))
+            options = np.zeros((len(OPTIONS) + 1, len(merged)), dtype=np.int64)
+            sums[:, moved] = self.sums
+            options[:, moved] = self.options
+            self.ids, self.sums, self.options = merged, sums, options
+        return np.searchsorted(self.ids, ids)
+
+    def add(self, data):
+        # Number the chunk's questions 0..n-1, so the arrays grow with the
+        # questions answered, not with the largest question id
+        ids, question = np.unique(data[:, QUESTION].astype(np.int64), return_inverse=True)
+        size = len(ids)
+        slots = self._slots(ids)
+
+        x = data[:, CORRECT]
+        y = data[:, SCORE] - data[:, MARKS]
+        for row, weights in enumerate([None, x, y, x * y, y * y]):
+            self.sums[row, slots] += np.bincount(question, weights=weights, minlength=size)
+
+        width = len(OPTIONS) + 1
+        picks = np.bincount(question * width + data[:, OPTION].astype(np.intp), minlength=size * width)
+        self.options[:, slots] += picks.reshape(size, width).T
+
+    def results(self):
+        """(question ids, responses, difficulty index, discrimination, option counts) for answered questions"""
+        n, sx, sy, sxy, syy = self.sums
+        difficulty = sx / n
+
+        # Pearson's r with a 0/1 x, where the sum of x squared is sx
+        covariance = n * sxy - sx * sy
+        spread = (n * sx - sx * sx) * (n * syy - sy * sy)
+        discrimination = np.full(len(self.ids), np.nan)
+        # Undefined when everyone (or no one) got it right, or every rest score was equal
+        defined = spread > 1e-9
+        discrimination[defined] = covariance[defined] / np.sqrt(spread[defined])
+        np.clip(discrimination, -1.0, 1.0, out=discrimination)
+
+        return self.ids, n, difficulty, discrimination, self.options[:len(OPTIONS)]
+
+
+def compute_item_stats(using=None, chunk_size=CHUNK_SIZE):
+    if np is None:
+        raise ImproperlyConfigured("Item statistics need NumPy (pip install numpy)")
+    totals = Accumulator()
+    for data in chunks(answer_rows(using).iterator(chunk_size=chunk_size), chunk_size):
+        totals.add(data)
+    return totals.results()
+
+
+def rebuild_item_stats(chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE):
+    """
+    Recompute QuestionStats from every finished attempt; returns the number
+    of questions with responses. Answers are read from the replica when
+    there is one, and the table is replaced in a single transaction.
+    """
+    questions, responses, difficulty, discrimination, options = compute_item_stats(read_alias(), chunk_size)
+    updated_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    # Plain tuples with executemany: building 100k model instances for
+    # bulk_create took most of the run
+    rows = list(zip(
+        questions.tolist(),
+        responses.astype(np.int64).tolist(),
+        difficulty.tolist(),
+        [None if math.isnan(value) else value for value in discrimination.tolist()],
+        *options.tolist(),
+        itertools.repeat(updated_at),
+    ))
+
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(QuestionStats._meta.get_field(name).column) for name in FIELDS)
+    sql = (
+        f"INSERT INTO {quote(QuestionStats._meta.db_table)} ({columns}) "
+        f"VALUES ({', '.join(['%s'] * len(FIELDS))})"
+    )
+    with transaction.atomic():
+        QuestionStats.objects.all().delete()
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                cursor.executemany(sql, rows[start:start + batch_size])
+        # Questions deleted since their answers were read (foreign keys are checked at commit)
+        QuestionStats.objects.exclude(question__in=Question.objects.values('pk')).delete()
+    return len(rows)
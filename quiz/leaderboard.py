@@ -0,0 +1,137 @@
+# quiz/leaderboard.py
+"""
+Leaderboards for tests and topics.
+
+LeaderboardEntry holds each student's best finished attempt per board, and
+an index keeps every board in rank order (score descending, then finish
+time). LeaderboardScore counts the students at each best score. Finishing
+an attempt updates the student's one entry and moves them between two
+score counts inside the submit transaction, so an update is a few indexed
+statements however big the board is, and there is no cached copy to lock
+or go stale. "Top N" reads N rows off the entry index. "My rank" adds up
+the counts of the scores above the student's: its cost grows with the
+number of distinct scores (at most one per mark), not with the rank.
+rebuild() recomputes a board from Attempt, e.g. after a regrade.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+
+from .models import Attempt, LeaderboardEntry, LeaderboardScore
+
+KINDS = ('test', 'topic')
+TOP_N = 20
+BATCH_SIZE = 2000
+
+
+class Leaderboard:
+    """Read access to one board; every method is a query over its index range"""
+
+    def __init__(self, kind, object_id):
+        self.entries = LeaderboardEntry.objects.filter(**_board(kind, object_id))
+        self.scores = LeaderboardScore.objects.filter(**_board(kind, object_id))
+
+    def __len__(self):
+        return self.scores.aggregate(students=Sum('students'))['students'] or 0
+
+    def _rank_of(self, score):
+        # Students with equal scores share a rank
+        return (self.scores.filter(score__gt=score).aggregate(ahead=Sum('students'))['ahead'] or 0) + 1
+
+    def rank(self, user_id):
+        """(rank, score) of the user, or None if they have no finished attempt"""
+        score = self.entries.filter(user_id=user_id).values_list('score', flat=True).first()
+        if score is None:
+            return None
+        return self._rank_of(score), score
+
+    def top(self, n=TOP_N):
+        leaders = []
+        rows = self.entries.order_by('-score', 'finished_at', 'pk').values_list('user_id', 'user__username', 'score')
+        for position, (user_id, username, score) in enumerate(rows[:n], 1):
+            # Everyone with a higher score is further up this list
+            rank = leaders[-1]['rank'] if leaders and leaders[-1]['score'] == score else position
+            leaders.append({'rank': rank, 'user_id': user_id, 'username': username, 'score': score})
+        return leaders
+
+
+def _board(kind, object_id):
+    """Field lookups selecting one board"""
+    return {f'{kind}_id': object_id}
+
+
+def get_board(kind, object_id):
+    if kind not in KINDS:
+        raise ValueError(f"Unknown leaderboard {kind!r}; use one of {', '.join(KINDS)}.")
+    return Leaderboard(kind, object_id)
+
+
+def boards_for(attempt):
+    return [
+        (kind, object_id)
+        for kind, object_id in (('test', attempt.test_id), ('topic', attempt.topic_id))
+        if object_id
+    ]
+
+
+def _count(kind, object_id, score, change):
+    """Add change to the number of students whose best score on the board is score"""
+    scores = LeaderboardScore.objects.filter(**_board(kind, object_id), score=score)
+    if not scores.update(students=F('students') + change):
+        LeaderboardScore.objects.get_or_create(**_board(kind, object_id), score=score)
+        scores.update(students=F('students') + change)
+
+
+def record_attempt(attempt):
+    """Make a finished attempt the user's entry on its boards if it is their best"""
+    for kind, object_id in boards_for(attempt):
+        entry = LeaderboardEntry.objects.filter(**_board(kind, object_id), user_id=attempt.user_id)
+        old_score = entry.values_list('score', flat=True).first()
+        if old_score is None:
+            _, created = LeaderboardEntry.objects.get_or_create(
+                **_board(kind, object_id), user_id=attempt.user_id,
+                defaults={'score': attempt.score, 'finished_at': attempt.finished_at},
+            )
+            if created:
+                _count(kind, object_id, attempt.score, 1)
+                continue
+            old_score = entry.values_list('score', flat=True).get()
+
+        better = Q(score__lt=attempt.score) | Q(score=attempt.score, finished_at__gt=attempt.finished_at)
+        # Only the update that replaced old_score moves the student between the counts
+        if entry.filter(better, score=old_score).update(score=attempt.score, finished_at=attempt.finished_at):
+            if old_score != attempt.score:
+                _count(kind, object_id, old_score, -1)
+                _count(kind, object_id, attempt.score, 1)
+
+
+@transaction.atomic
+def rebuild(kind, object_id, batch_size=BATCH_SIZE):
+    """Recompute a board from its finished attempts; returns the number of students"""
+    rows = (
+        Attempt.objects.filter(**_board(kind, object_id), finished_at__isnull=False)
+        .order_by('user_id', '-score', 'finished_at')
+        .values_list('user_id', 'score', 'finished_at')
+    )
+    best = {}
+    for user_id, score, finished_at in rows.iterator(chunk_size=batch_size):
+        best.setdefault(user_id, (score, finished_at))
+
+    LeaderboardEntry.objects.filter(**_board(kind, object_id)).delete()
+    LeaderboardEntry.objects.bulk_create([
+        LeaderboardEntry(**_board(kind, object_id), user_id=user_id, score=score, finished_at=finished_at)
+        for user_id, (score, finished_at) in best.items()
+    ], batch_size=batch_size)
+    LeaderboardScore.objects.filter(**_board(kind, object_id)).delete()
+    LeaderboardScore.objects.bulk_create([
+        LeaderboardScore(**_board(kind, object_id), score=score, students=students)
+        for score, students in Counter(score for score, _ in best.values()).items()
+    ], batch_size=batch_size)
+    return len(best)
+
+
+def rebuild_boards(boards):
+    """Recompute (kind, id) boards whose scores changed, e.g. after a regrade"""
+    for kind, object_id in boards:
+        rebuild(kind, object_id)
@@ -0,0 +1,282 @@
+import json
+import random
+import re
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from quiz import synthetic
+from quiz.models import Attempt, Question, Test, Topic, TopicNote, User
+
+BASELINES = Path(__file__).resolve().parents[2] / 'benchmarks'
+PASSWORD = 'benchmark'
+# Options that must match the baseline's for the runs to be comparable
+RUN_OPTIONS = ('students', 'journeys', 'topics', 'questions', 'history', 'seed')
+ATTEMPT_ID = re.compile(rb'/api/attempts/(\d+)/')
+# Views with fewer requests per run (one login per student, one results page
+# per quiz) have a p95 that is one of their two or three slowest requests,
+# which on a busy single CPU varied by 1.5-2x between identical runs
+MIN_SAMPLES = 100
+
+
+class Abandoned(Exception):
+    """A request failed, so the student gives up on the quiz"""
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of a sorted list"""
+    return ordered[max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the student journey in a throwaway database: concurrent students "
+        "log in, open home and select_topic, take a quiz through the form, submit it "
+        "and read their results. Reports p50/p95/p99 latency and queries per request "
+        "for each view plus the throughput, and fails if they regress past the "
+        "stored baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=16, help="Concurrent students")
+        parser.add_argument('--journeys', type=int, default=3, help="Quizzes each student takes")
+        parser.add_argument('--topics', type=int, default=40)
+        parser.add_argument('--questions', type=int, default=20000)
+        parser.add_argument('--history', type=int, default=5000, help="Finished attempts seeded beforehand")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--baseline', help="Baseline JSON file (default: the one for settings.QUIZ_DB_PROFILE)")
+        parser.add_argument('--save-baseline', action='store_true', help="Store this run as the baseline")
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help="Allowed fractional rise in p95 latency (and drop in throughput)")
+        parser.add_argument('--query-slack', type=float, default=0.5,
+                            help="Allowed rise in mean queries per request")
+
+    def handle(self, *args, **options):
+        self.seed_value = options['seed']
+        old_name = connection.settings_dict['NAME']
+        with tempfile.TemporaryDirectory() as directory:
+            if connection.vendor == 'sqlite':
+                # Student threads need their own connections, which an in-memory database can't share
+                connection.settings_dict['TEST']['NAME'] = str(Path(directory) / 'benchmark_journey.sqlite3')
+            # A private cache, so cached questions and pages of the real database are never mixed in;
+            # a fast hasher, so the run measures the views rather than key stretching at login
+            with override_settings(
+                ALLOWED_HOSTS=['testserver'], DEBUG=False,
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                    'LOCATION': 'benchmark-journey'}},
+                PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+            ):
+                connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                # Aliases that mirror the primary (the production profile's replica) read the same database
+                mirrors = {
+                    alias: connections[alias].settings_dict['NAME'] for alias in connections
+                    if connections[alias].settings_dict['TEST'].get('MIRROR') == connection.alias
+                }
+                for alias in mirrors:
+                    connections[alias].close()
+                    connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+                try:
+                    started = time.perf_counter()
+                    self.seed(options)
+                    self.stdout.write(f"Seeded in {time.perf_counter() - started:.1f}s\n")
+                    result = self.run(options)
+                finally:
+                    for alias, name in mirrors.items():
+                        connections[alias].close()
+                        connections[alias].settings_dict['NAME'] = name
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.report(result)
+        baseline = Path(options['baseline'] or BASELINES / f'journey_{settings.QUIZ_DB_PROFILE}.json')
+        if options['save_baseline']:
+            if not result['quizzes'] or result['errors']:
+                raise CommandError(
+                    f"Not saving a baseline from a failing run ({result['errors']} errors, "
+                    f"{result['quizzes']} quizzes completed)"
+                )
+            baseline.parent.mkdir(parents=True, exist_ok=True)
+            baseline.write_text(json.dumps(result, indent=2, sort_keys=True) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Saved the baseline to {baseline}"))
+        elif baseline.exists():
+            self.compare(result, json.loads(baseline.read_text()), options)
+        else:
+            self.stdout.write(self.style.WARNING(f"No baseline at {baseline}; run with --save-baseline to store one"))
+
+    def seed(self, options):
+        # Students first, then the history of earlier quizzes, so results and history
+        # queries meet realistic table sizes
+        synthetic.generate(
+            topics=options['topics'], users=options['students'], questions=options['questions'],
+            attempts=options['history'], bookmarks=0, seed=options['seed'], password=make_password(PASSWORD),
+        )
+        topics = list(Topic.objects.values_list('pk', 'stats__question_count'))
+        TopicNote.objects.bulk_create([
+            TopicNote(topic_id=topic_id, content=f"Revision notes for topic {topic_id}.") for topic_id, _ in topics[::2]
+        ])
+        now = timezone.now()
+        Test.objects.create(name="Upcoming test", start_time=now + timedelta(days=1), end_time=now + timedelta(days=1, hours=1))
+
+        # Students pick topics as often as the bank is weighted towards them
+        self.topic_ids = [topic_id for topic_id, _ in topics]
+        self.topic_weights = [count or 0 for _, count in topics]
+        self.usernames = list(User.objects.order_by('pk').values_list('username', flat=True))
+        self.questions = {
+            pk: (kind, correct, difficulty)
+            for pk, kind, correct, difficulty in Question.objects.values_list('pk', 'question_type', 'correct_option', 'difficulty')
+        }
+
+    def answer(self, rng, number, question_id):
+        kind, correct, difficulty = self.questions[question_id]
+        chance = synthetic.ability(number) * synthetic.DIFFICULTY_FACTOR[difficulty]
+        return synthetic.student_answer(rng, kind, correct, chance)
+
+    def student(self, number, journeys, timings, errors):
+        rng = random.Random(f"{self.seed_value}-{number}")
+        client = Client()
+
+        def request(method, url, data=None):
+            # Every alias, so reads sent to the replica are counted too
+            with ExitStack() as stack:
+                captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+                started = time.perf_counter()
+                try:
+                    response = client.post(url, data) if method == 'POST' else client.get(url)
+                except Exception as exc:
+                    errors.append(f"{method} {url}: {exc!r}")
+                    raise Abandoned
+                elapsed = (time.perf_counter() - started) * 1000
+            match = response.resolver_match
+            view = f"{method} {match.url_name if match else url}"
+            timings.append((view, elapsed, sum(len(queries) for queries in captured)))
+            if response.status_code >= 400:
+                errors.append(f"{view}: HTTP {response.status_code}")
+                raise Abandoned
+            return response
+
+        try:
+            request('GET', '/login/')
+            username = self.usernames[number]
+            if request('POST', '/login/', {'username': username, 'password': PASSWORD}).status_code != 302:
+                errors.append(f"{username}: login refused")
+                raise Abandoned
+            request('GET', '/')
+            for _ in range(journeys):
+                try:
+                    self.take_quiz(rng, number, request)
+                except Abandoned:
+                    pass
+        except Abandoned:
+            pass
+        finally:
+            connections.close_all()
+
+    def take_quiz(self, rng, number, request):
+        """One quiz through the form, as a student without JavaScript takes it"""
+        request('GET', '/select-topic/')
+        quiz_url = f'/quiz/{rng.choices(self.topic_ids, weights=self.topic_weights)[0]}/'
+        found = ATTEMPT_ID.search(request('GET', quiz_url).content)
+        if not found:
+            raise Abandoned
+        question_ids = Attempt.objects.values_list('question_ids', flat=True).get(pk=int(found[1]))
+        for index, question_id in enumerate(question_ids):
+            last = index == len(question_ids) - 1
+            request('POST', f'{quiz_url}?q={index}',
+                    {'answer': self.answer(rng, number, question_id), 'action': 'submit' if last else 'next'})
+            if not last:
+                request('GET', f'{quiz_url}?q={index + 1}')
+        request('GET', '/quiz/results/')
+
+    def run(self, options):
+        timings, errors = [], []
+        students = [
+            threading.Thread(target=self.student, args=(number, options['journeys'], timings, errors))
+            for number in range(options['students'])
+        ]
+        started = time.perf_counter()
+        for student in students:
+            student.start()
+        for student in students:
+            student.join()
+        elapsed = time.perf_counter() - started
+
+        views = {}
+        for view, ms, queries in timings:
+            views.setdefault(view, []).append((ms, queries))
+        result = {
+            'options': {name: options[name] for name in RUN_OPTIONS},
+            'profile': settings.QUIZ_DB_PROFILE,
+            'requests': len(timings),
+            'errors': len(errors),
+            'throughput': round(len(timings) / elapsed, 1),
+            # Quizzes that reached their results page
+            'quizzes': len(views.get('GET quiz_results', ())),
+            'quizzes_per_second': round(len(views.get('GET quiz_results', ())) / elapsed, 2),
+            'views': {},
+        }
+        for view, samples in sorted(views.items()):
+            latencies = sorted(ms for ms, _ in samples)
+            result['views'][view] = {
+                'requests': len(samples),
+                'p50': round(percentile(latencies, 50), 2),
+                'p95': round(percentile(latencies, 95), 2),
+                'p99': round(percentile(latencies, 99), 2),
+                'queries': round(statistics.mean(queries for _, queries in samples), 2),
+            }
+        for error in errors[:20]:
+            self.stderr.write(error)
+        return result
+
+    def report(self, result):
+        self.stdout.write(f"{'view':<28} {'requests':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+        for view, stats in result['views'].items():
+            self.stdout.write(
+                f"{view:<28} {stats['requests']:>9} {stats['p50']:>8.1f} {stats['p95']:>8.1f} "
+                f"{stats['p99']:>8.1f} {stats['queries']:>8.1f}"
+            )
+        self.stdout.write(
+            f"\n{result['requests']} requests, {result['errors']} errors: {result['throughput']:.1f} req/s, "
+            f"{result['quizzes']} quizzes completed, {result['quizzes_per_second']:.2f} quizzes/s\n"
+        )
+
+    def compare(self, result, baseline, options):
+        if baseline['options'] != result['options']:
+            raise CommandError(
+                f"The baseline was recorded with {baseline['options']}; rerun with the same options "
+                f"or store a new baseline with --save-baseline"
+            )
+        tolerance = options['tolerance']
+        regressions = []
+        if not result['quizzes']:
+            # Whatever the baseline says, a run in which no student finishes a quiz has failed
+            regressions.append("no quiz was completed")
+        if result['errors'] > baseline['errors'] * (1 + tolerance):
+            regressions.append(f"{result['errors']} failed requests (baseline {baseline['errors']})")
+        if result['throughput'] < baseline['throughput'] * (1 - tolerance):
+            regressions.append(f"throughput {result['throughput']:.1f} req/s (baseline {baseline['throughput']:.1f})")
+        if result['quizzes_per_second'] < baseline['quizzes_per_second'] * (1 - tolerance):
+            regressions.append(
+                f"{result['quizzes_per_second']:.2f} quizzes/s (baseline {baseline['quizzes_per_second']:.2f})"
+            )
+        for view, stats in result['views'].items():
+            before = baseline['views'].get(view)
+            if before is None:
+                continue
+            if stats['requests'] >= MIN_SAMPLES and stats['p95'] > before['p95'] * (1 + tolerance):
+                regressions.append(f"{view}: p95 {stats['p95']:.1f} ms (baseline {before['p95']:.1f})")
+            if stats['queries'] > before['queries'] + options['query_slack']:
+                regressions.append(f"{view}: {stats['queries']:.1f} queries (baseline {before['queries']:.1f})")
+        if regressions:
+            raise CommandError("Regressed past the baseline:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("Within the baseline"))
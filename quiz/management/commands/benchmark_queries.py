@@ -0,0 +1,176 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from quiz.models import Answer, Attempt, Question, Test, Topic, User
+from quiz.pagination import QUESTION_ORDERING, seek_filter
+from quiz.queries import topic_summaries
+from quiz.search import rebuild_index, search_questions
+from quiz.stats import rebuild_topic_stats
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and print EXPLAIN QUERY PLAN output and "
+        "timings for the queries the quiz views issue"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--topics', type=int, default=200)
+        parser.add_argument('--questions', type=int, default=200000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--attempts', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per query; the median is reported")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            started = time.perf_counter()
+            self.seed(options)
+            self.stdout.write(f"Seeded in {time.perf_counter() - started:.1f}s\n")
+            for name, build in self.cases():
+                self.report(name, build(), options['repeat'])
+            self.report_search(options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+
+        Topic.objects.bulk_create([Topic(name=f"Topic {i}") for i in range(options['topics'])])
+        topic_ids = list(Topic.objects.values_list('pk', flat=True))
+
+        User.objects.bulk_create(
+            [User(username=f"student{i}", password='!') for i in range(options['users'])],
+            batch_size=BATCH_SIZE,
+        )
+        user_ids = list(User.objects.values_list('pk', flat=True))
+
+        now = timezone.now()
+        test = Test.objects.create(name="Benchmark", start_time=now, end_time=now + timedelta(hours=1))
+
+        # A vocabulary so that search terms have realistic selectivity
+        vocabulary = [f"term{n}" for n in range(5000)]
+        batch = []
+        for i in range(options['questions']):
+            batch.append(Question(
+                topic_id=rng.choice(topic_ids),
+                text=f"Benchmark question {i}: what is $x^{i % 7}$? {' '.join(rng.choices(vocabulary, k=8))}",
+                question_type=rng.choice(["MCQ", "NUM", "TF"]),
+                difficulty=rng.randint(1, 3),
+                correct_option="A",
+            ))
+            if len(batch) == BATCH_SIZE:
+                Question.objects.bulk_create(batch)
+                batch = []
+        Question.objects.bulk_create(batch)
+        rebuild_topic_stats()
+        rebuild_index()
+
+        question_ids = list(Question.objects.values_list('pk', flat=True))
+        Attempt.objects.bulk_create([
+            Attempt(
+                user_id=rng.choice(user_ids),
+                test=test if i % 2 else None,
+                topic_id=rng.choice(topic_ids),
+                question_ids=rng.sample(question_ids, 10),
+                score=rng.randint(0, 10),
+                finished_at=now,
+            )
+            for i in range(options['attempts'])
+        ], batch_size=BATCH_SIZE)
+
+        batch = []
+        for attempt_id, ids in Attempt.objects.values_list('pk', 'question_ids').iterator():
+            for question_id in ids:
+                batch.append(Answer(attempt_id=attempt_id, question_id=question_id, typed_answer=rng.choice("ABCD")))
+            if len(batch) >= BATCH_SIZE:
+                Answer.objects.bulk_create(batch)
+                batch = []
+        Answer.objects.bulk_create(batch)
+
+    def cases(self):
+        """(name, queryset factory) for every query the views run"""
+        topic = Topic.objects.order_by('-stats__question_count').first()
+        attempt = Attempt.objects.order_by('pk').first()
+        middle = Question.objects.order_by(*QUESTION_ORDERING)[Question.objects.count() // 2]
+        deep_key = [getattr(middle, field) for field in QUESTION_ORDERING]
+
+        return [
+            ("home/topic_list: topic summaries", lambda: topic_summaries()),
+            ("practice_select_topic", lambda: topic_summaries().filter(question_count__gt=0)),
+            ("question_list: first page", lambda: (
+                Question.objects.select_related('topic').order_by(*QUESTION_ORDERING)[:26]
+            )),
+            ("question_list: deep page", lambda: (
+                Question.objects.select_related('topic')
+                .filter(seek_filter(QUESTION_ORDERING, deep_key, 'gt'))
+                .order_by(*QUESTION_ORDERING)[:26]
+            )),
+            ("practice_questions: first page", lambda: (
+                Question.objects.filter(topic=topic).order_by(*QUESTION_ORDERING)[:6]
+            )),
+            ("practice_questions: difficulty filter", lambda: (
+                Question.objects.filter(topic=topic, difficulty=3).order_by(*QUESTION_ORDERING)[:6]
+            )),
+            ("practice_question_detail: related", lambda: (
+                Question.objects.filter(topic=topic).exclude(pk=middle.pk)[:5]
+            )),
+            ("take_quiz: choose questions", lambda: (
+                Question.objects.filter(topic=topic).values_list('pk', flat=True)[:10]
+            )),
+            ("take_quiz: saved answers", lambda: (
+                attempt.answers.values_list('question_id', 'typed_answer')
+            )),
+            ("take_quiz: one answer", lambda: (
+                Answer.objects.filter(attempt=attempt, question_id=attempt.question_ids[0])
+            )),
+            ("attempts by user", lambda: (
+                Attempt.objects.filter(user_id=attempt.user_id).order_by('-started_at')[:20]
+            )),
+            ("attempts by test score", lambda: (
+                Attempt.objects.filter(test_id=attempt.test_id or Test.objects.first().pk).order_by('-score')[:50]
+            )),
+        ]
+
+    def report_search(self, repeat):
+        """Time ranked full-text searches, which run raw SQL and so have no queryset to explain"""
+        topic = Topic.objects.order_by('-stats__question_count').first()
+        searches = [
+            ("search: term", "term17", {}),
+            ("search: two terms", "term17 term42", {}),
+            ("search: term, topic facet", "term17", {'topic': str(topic.pk)}),
+            ("search: term in every question", "question", {}),
+            ("search: deep page", "term17", {'difficulty': '2'}),
+        ]
+        for name, query, filters in searches:
+            page = 5 if name.endswith("deep page") else 1
+            timings = []
+            for _ in range(max(1, repeat)):
+                started = time.perf_counter()
+                results = search_questions(query, filters, page=page)
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{name}: {statistics.median(timings):.2f} ms ({results.total} matches)"
+            ))
+        self.stdout.write("")
+
+    def report(self, name, queryset, repeat):
+        timings = []
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - started) * 1000)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{name}: {statistics.median(timings):.2f} ms"))
+        self.stdout.write(queryset.explain())
+        self.stdout.write("")
@@ -0,0 +1,154 @@
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from quiz.dedupe import SIMILARITY_THRESHOLD, clear_index, index_signatures, signature, similarity, unpack
+from quiz.models import Question, QuestionBucket, QuestionFingerprint
+
+# Buckets shared by more questions than this are compared against their first member only
+MAX_GROUP = 200
+
+
+def signature_chunk(chunk):
+    """Worker: MinHash signatures for a list of (pk, text) pairs"""
+    return [(pk, signature(text)) for pk, text in chunk]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fingerprint every question for near-duplicate detection, using all CPU cores, "
+        "and report clusters of near-duplicates"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Number of fingerprinting processes")
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="Questions loaded and indexed per batch")
+        parser.add_argument('--threshold', type=float, default=SIMILARITY_THRESHOLD,
+                            help="Minimum estimated similarity for two questions to be clustered")
+        parser.add_argument('--skip-index', action='store_true',
+                            help="Cluster from the existing fingerprints instead of recomputing them")
+        parser.add_argument('--output', help="Write the clusters to this CSV file")
+
+    def handle(self, *args, **options):
+        if not 0 < options['threshold'] <= 1:
+            raise CommandError("--threshold must be between 0 and 1.")
+
+        if not options['skip_index']:
+            total = self.fingerprint(max(1, options['workers']), max(1, options['batch_size']))
+            self.stdout.write(f"Fingerprinted {total} questions.")
+
+        clusters = self.cluster(options['threshold'])
+        clusters.sort(key=len, reverse=True)
+
+        if options['output']:
+            self.write_csv(options['output'], clusters)
+        for number, members in enumerate(clusters[:20], start=1):
+            self.stdout.write(f"  cluster {number}: {len(members)} questions ({', '.join(map(str, members[:10]))}"
+                              f"{', ...' if len(members) > 10 else ''})")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Found {len(clusters)} clusters covering {sum(len(c) for c in clusters)} questions."
+        ))
+
+    def fingerprint(self, workers, batch_size):
+        chunk_size = max(1, batch_size // (workers * 4))
+        rows = Question.objects.order_by('pk').values_list('pk', 'text')
+        total = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Fork the workers before the transaction opens, so they inherit no connection
+            connections.close_all()
+            pool.submit(int).result()
+            # Clear and rebuild together: duplicate checks keep seeing the
+            # old index until the new one is complete
+            with transaction.atomic():
+                clear_index()
+                batch = []
+                for row in rows.iterator(chunk_size=batch_size):
+                    batch.append(row)
+                    if len(batch) == batch_size:
+                        total += self.fingerprint_batch(pool, batch, chunk_size)
+                        batch = []
+                if batch:
+                    total += self.fingerprint_batch(pool, batch, chunk_size)
+        return total
+
+    def fingerprint_batch(self, pool, batch, chunk_size):
+        chunks = [batch[i:i + chunk_size] for i in range(0, len(batch), chunk_size)]
+        signatures = {}
+        for result in pool.map(signature_chunk, chunks):
+            signatures.update(result)
+        index_signatures(signatures, replace=False)
+        return len(batch)
+
+    def candidate_pairs(self):
+        """Pairs of question ids that share at least one LSH bucket"""
+        pairs = set()
+        rows = QuestionBucket.objects.order_by('bucket', 'question_id').values_list('bucket', 'question_id')
+
+        def add_group(members):
+            if len(members) > MAX_GROUP:
+                pairs.update((members[0], other) for other in members[1:])
+            else:
+                pairs.update(
+                    (a, b) for i, a in enumerate(members) for b in members[i + 1:]
+                )
+
+        current, members = None, []
+        for bucket, question_id in rows.iterator(chunk_size=10000):
+            if bucket != current:
+                if len(members) > 1:
+                    add_group(members)
+                current, members = bucket, []
+            members.append(question_id)
+        if len(members) > 1:
+            add_group(members)
+        return pairs
+
+    def cluster(self, threshold):
+        pairs = self.candidate_pairs()
+        involved = sorted({pk for pair in pairs for pk in pair})
+        signatures = {}
+        for start in range(0, len(involved), 5000):
+            chunk = involved[start:start + 5000]
+            for pk, data in QuestionFingerprint.objects.filter(question_id__in=chunk).values_list(
+                'question_id', 'signature'
+            ):
+                signatures[pk] = unpack(data)
+
+        # Union-find over the pairs whose signatures really are similar
+        parent = {}
+
+        def find(pk):
+            parent.setdefault(pk, pk)
+            while parent[pk] != pk:
+                parent[pk] = parent[parent[pk]]
+                pk = parent[pk]
+            return pk
+
+        for a, b in pairs:
+            if a in signatures and b in signatures and similarity(signatures[a], signatures[b]) >= threshold:
+                root_a, root_b = find(a), find(b)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        clusters = {}
+        for pk in parent:
+            clusters.setdefault(find(pk), []).append(pk)
+        return [sorted(members) for members in clusters.values() if len(members) > 1]
+
+    def write_csv(self, path, clusters):
+        texts = {}
+        ids = [pk for members in clusters for pk in members]
+        for start in range(0, len(ids), 5000):
+            texts.update(Question.objects.filter(pk__in=ids[start:start + 5000]).values_list('pk', 'text'))
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['cluster', 'question_id', 'text'])
+            for number, members in enumerate(clusters, start=1):
+                for pk in members:
+                    writer.writerow([number, pk, texts.get(pk, '')])
@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.database import read_alias
+from quiz.exporter import CHUNK_SIZE, KINDS, export_lines
+from quiz.importer import FORMATS, detect_format
+
+
+class Command(BaseCommand):
+    help = "Stream the question bank (or topics with their notes) to a CSV or JSONL file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, or - for stdout")
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension")
+        parser.add_argument('--kind', choices=KINDS, default='questions')
+        parser.add_argument('--rendered', action='store_true',
+                            help="Add a solution_html column with the pre-rendered solution")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or (None if path == '-' else detect_format(path))
+        if fmt is None:
+            raise CommandError("Can't tell the file format; pass --format.")
+
+        lines = export_lines(
+            fmt, kind=options['kind'],
+            include_rendered=options['rendered'],
+            chunk_size=max(1, options['chunk_size']),
+            using=read_alias(),
+        )
+        count = -1 if fmt == 'csv' else 0  # Don't count the CSV header
+        try:
+            stream = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8', newline='')
+            try:
+                for line in lines:
+                    stream.write(line)
+                    count += 1
+            finally:
+                if stream is not sys.stdout:
+                    stream.close()
+        except OSError as e:
+            raise CommandError(str(e))
+
+        self.stderr.write(self.style.SUCCESS(f"Exported {count} {options['kind']}."))
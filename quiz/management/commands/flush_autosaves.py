@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.autosave import enabled, flush
+
+
+class Command(BaseCommand):
+    help = (
+        "Write autosaved answers from the cache to the database in bulk. Autosave "
+        "requests flush on their own every QUIZ_AUTOSAVE_FLUSH_INTERVAL seconds; run "
+        "this with --interval to flush on a fixed schedule as well."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help=f"Keep running and flush every N seconds (e.g. {settings.QUIZ_AUTOSAVE_FLUSH_INTERVAL}) instead of exiting",
+        )
+
+    def handle(self, *args, **options):
+        if not enabled():
+            # Autosaves go straight to the database, so there is nothing to flush
+            raise CommandError("Autosaves are only buffered in Redis or Memcached (QUIZ_CACHE_BACKEND).")
+        while True:
+            written = flush()
+            self.stdout.write(self.style.SUCCESS(f"Wrote {written} autosaved answers."))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,53 @@
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.synthetic import generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Add deterministic synthetic topics, users, questions, attempts, answers and "
+        "bookmarks for benchmarking. Run it against a scratch database, then "
+        "rebuild_search_index, render_latex, rebuild_mastery and rebuild_leaderboards "
+        "if the benchmark needs them"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--topics', type=int, default=200)
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--questions', type=int, default=1_000_000)
+        parser.add_argument('--attempts', type=int, default=500_000, help="Each with up to 10 answers")
+        parser.add_argument('--bookmarks', type=int, default=200_000, help="Roughly; spread unevenly over the users")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--password', help="Password for every generated user (default: none, so they cannot log in)")
+        parser.add_argument('--workers', type=int, default=1, help="Processes building rows in parallel")
+        parser.add_argument('--orm', action='store_true', help="Insert with bulk_create even on SQLite")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        last = {}
+
+        def progress(table, done, total):
+            # About ten lines per table
+            if done == total or done * 10 // total != last.get(table):
+                last[table] = done * 10 // total
+                self.stdout.write(f"{table}: chunk {done}/{total} ({time.perf_counter() - started:.1f}s)")
+
+        try:
+            added = generate(
+                topics=options['topics'], users=options['users'], questions=options['questions'],
+                attempts=options['attempts'], bookmarks=options['bookmarks'], seed=options['seed'],
+                password=make_password(options['password']) if options['password'] else '!',
+                workers=options['workers'], raw=False if options['orm'] else None, progress=progress,
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        elapsed = time.perf_counter() - started
+        total = sum(added.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Added {', '.join(f'{count} {table}' for table, count in added.items())} "
+            f"in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)"
+        ))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.grading import BATCH_SIZE, grade_attempts
+from quiz.models import Attempt
+
+
+class Command(BaseCommand):
+    help = "Grade (or regrade) finished attempts in bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test', type=int, help="Only attempts for this Test id")
+        parser.add_argument('--topic', type=int, help="Only attempts for this Topic id")
+        parser.add_argument('--all', action='store_true', help="Every finished attempt")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if not (options['test'] or options['topic'] or options['all']):
+            raise CommandError("Pass --test, --topic or --all.")
+
+        attempts = Attempt.objects.filter(finished_at__isnull=False)
+        if options['test']:
+            attempts = attempts.filter(test_id=options['test'])
+        if options['topic']:
+            attempts = attempts.filter(topic_id=options['topic'])
+
+        started = time.perf_counter()
+        scores = grade_attempts(attempts, batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Graded {len(scores)} attempts in {elapsed:.2f}s."
+        ))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.importer import BATCH_SIZE, FORMATS, detect_format, import_questions
+
+
+class Command(BaseCommand):
+    help = "Stream questions from a CSV or JSONL file into the bank"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--create-topics', action='store_true',
+                            help="Create topics that don't exist yet instead of rejecting the row")
+        parser.add_argument('--skip-render', action='store_true',
+                            help="Don't pre-render LaTeX while importing (run render_latex afterwards)")
+        parser.add_argument('--skip-duplicate-check', action='store_true',
+                            help="Don't flag near-duplicates while importing (run cluster_questions afterwards)")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'])
+        if fmt is None:
+            raise CommandError("Can't tell the file format; pass --format.")
+
+        def report_error(line, message):
+            self.stderr.write(f"line {line}: {message}")
+
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                result = import_questions(
+                    stream, fmt,
+                    batch_size=max(1, options['batch_size']),
+                    create_topics=options['create_topics'],
+                    render=not options['skip_render'],
+                    check_duplicates=not options['skip_duplicate_check'],
+                    on_error=report_error,
+                )
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for line, question_id, similar_id, score in result.duplicates:
+            self.stdout.write(f"line {line}: question {question_id} is {score:.0%} similar to {similar_id}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} questions, {result.error_count} rows rejected, "
+            f"{result.duplicate_count} flagged as near-duplicates, "
+            f"in {result.elapsed:.1f}s ({result.rows_per_second:.0f} rows/s)."
+        ))
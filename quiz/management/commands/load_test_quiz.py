@@ -0,0 +1,228 @@
+import asyncio
+import json
+import random
+import statistics
+import tempfile
+import threading
+import time
+import types
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+from django.urls import path
+from django.utils.crypto import get_random_string
+
+from quiz import api, async_views
+from quiz.models import Attempt, Question, Topic, User
+
+QUESTIONS_PER_ATTEMPT = 20
+ANSWERS_PER_SYNC = 5
+
+
+def _urlconf(views):
+    """A URLconf serving just the quiz API from the sync or async views"""
+    urls = types.ModuleType(f'load_test_urls_{views.__name__}')
+    urls.urlpatterns = [
+        path('api/attempts/<int:attempt_id>/', views.attempt_detail),
+        path('api/attempts/<int:attempt_id>/answers/', views.attempt_answers),
+    ]
+    return urls
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the quiz API in a throwaway database: concurrent students load "
+        "their quiz and sync answers against one WSGI worker (sync views) and one "
+        "ASGI worker (async views), and the capacity of each is reported"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', default='1,4,16,64', help="Comma-separated concurrent-user levels")
+        parser.add_argument('--journeys', type=int, default=3, help="Quiz loads per user (each followed by two answer syncs)")
+        parser.add_argument('--threads', type=int, default=1, help="Threads of the sync worker (gunicorn --threads)")
+        parser.add_argument('--db-latency', type=float, default=5.0,
+                            help="Milliseconds added to every query, as for a database across the network")
+        parser.add_argument('--budget', type=float, default=500.0, help="p95 latency (ms) a level must stay under")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        levels = sorted({int(level) for level in options['users'].split(',')})
+        self.latency = options['db_latency'] / 1000
+        self.rng = random.Random(options['seed'])
+
+        old_name = connection.settings_dict['NAME']
+        with tempfile.TemporaryDirectory() as directory:
+            if connection.vendor == 'sqlite':
+                # Worker threads need their own connections, which an in-memory database can't share
+                connection.settings_dict['TEST']['NAME'] = str(Path(directory) / 'load_test.sqlite3')
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            connection_created.connect(self.add_latency)
+            try:
+                self.seed(max(levels) * options['journeys'])
+                with override_settings(ALLOWED_HOSTS=['testserver'], DEBUG=False):
+                    self.run(levels, options)
+            finally:
+                connection_created.disconnect(self.add_latency)
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def delay(self, execute, sql, params, many, context):
+        time.sleep(self.latency)
+        return execute(sql, params, many, context)
+
+    def add_latency(self, sender, connection, **kwargs):
+        # A thread's connection object is reused when it reconnects; wrap it once
+        if self.latency and self.delay not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self.delay)
+
+    def seed(self, attempts):
+        self.topic = Topic.objects.create(name="Load test")
+        Question.objects.bulk_create([
+            Question(topic=self.topic, text=f"Load test question {i}", option_a="1", option_b="2",
+                     option_c="3", option_d="4", correct_option="A")
+            for i in range(200)
+        ])
+        question_ids = list(Question.objects.values_list('pk', flat=True))
+        User.objects.bulk_create([User(username=f"load{i}", password='!') for i in range(attempts)])
+
+        # One session per user, shared by both runs
+        self.students = []
+        token = get_random_string(32)
+        for user in User.objects.order_by('pk'):
+            client = Client()
+            client.force_login(user)
+            self.students.append({
+                'user': user,
+                'cookie': f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}; "
+                          f"{settings.CSRF_COOKIE_NAME}={token}",
+                'token': token,
+            })
+        self.question_ids = question_ids
+
+    def new_attempts(self, count, journeys):
+        """Fresh unfinished attempts, journeys per user for the first count users"""
+        attempts = Attempt.objects.bulk_create([
+            Attempt(user=student['user'], topic=self.topic, question_ids=self.rng.sample(self.question_ids, QUESTIONS_PER_ATTEMPT))
+            for student in self.students[:count] for _ in range(journeys)
+        ])
+        return [attempts[i * journeys:(i + 1) * journeys] for i in range(count)]
+
+    def journey(self, attempt):
+        """The requests one quiz makes: load it, then sync two batches of answers"""
+        base = f'/api/attempts/{attempt.pk}/'
+        requests = [('GET', base, b'')]
+        for _ in range(2):
+            answers = {str(pk): self.rng.choice("ABCD") for pk in self.rng.sample(attempt.question_ids, ANSWERS_PER_SYNC)}
+            requests.append(('POST', base + 'answers/', json.dumps({'answers': answers}).encode()))
+        return requests
+
+    def run(self, levels, options):
+        capacity = {}
+        self.stdout.write(f"{'mode':<6} {'users':>6} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+        for mode in ('sync', 'async'):
+            views = async_views if mode == 'async' else api
+            with override_settings(ROOT_URLCONF=_urlconf(views)):
+                for users in levels:
+                    plans = [
+                        (student, [request for attempt in attempts for request in self.journey(attempt)])
+                        for student, attempts in zip(self.students, self.new_attempts(users, options['journeys']))
+                    ]
+                    started = time.perf_counter()
+                    if mode == 'sync':
+                        timings = self.run_sync(plans, options['threads'])
+                    else:
+                        timings = asyncio.run(self.run_async(plans))
+                    elapsed = time.perf_counter() - started
+
+                    latencies = sorted(ms for ms, _ in timings)
+                    errors = sum(1 for _, status in timings if status >= 400)
+                    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+                    self.stdout.write(
+                        f"{mode:<6} {users:>6} {len(timings):>9} {len(timings) / elapsed:>8.1f} "
+                        f"{statistics.median(latencies):>8.1f} {p95:>8.1f} {errors:>7}"
+                    )
+                    if p95 <= options['budget'] and not errors:
+                        capacity[mode] = users
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Concurrent users per worker within a {options['budget']:.0f} ms p95: "
+            f"sync ({options['threads']} thread{'s' if options['threads'] != 1 else ''}) "
+            f"{capacity.get('sync', 0)}, async {capacity.get('async', 0)}"
+        ))
+
+    def run_sync(self, plans, threads):
+        """One WSGI worker: every user is a client thread, but only `threads` requests run at once"""
+        handler = WSGIHandler()
+        worker = threading.Semaphore(threads)
+        timings = []
+
+        def student(info, requests):
+            for method, url, body in requests:
+                environ = {
+                    'REQUEST_METHOD': method, 'PATH_INFO': url, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+                    'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'HTTP_HOST': 'testserver',
+                    'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(body),
+                    'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+                    'HTTP_COOKIE': info['cookie'], 'HTTP_X_CSRFTOKEN': info['token'],
+                }
+                status = []
+                started = time.perf_counter()
+                with worker:
+                    response = handler(environ, lambda code, headers, exc_info=None: status.append(int(code[:3])))
+                    b''.join(response)
+                    response.close()
+                timings.append(((time.perf_counter() - started) * 1000, status[0]))
+
+        clients = [threading.Thread(target=student, args=plan) for plan in plans]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        return timings
+
+    async def run_async(self, plans):
+        """One ASGI worker: every user is a task on the worker's event loop"""
+        handler = ASGIHandler()
+        timings = []
+
+        async def request(info, method, url, body):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+                'scheme': 'http', 'path': url, 'raw_path': url.encode(), 'query_string': b'', 'root_path': '',
+                'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+                'headers': [
+                    (b'host', b'testserver'), (b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode()),
+                    (b'cookie', info['cookie'].encode()), (b'x-csrftoken', info['token'].encode()),
+                ],
+            }
+            messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+            status = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # The handler listens for a disconnect until the response is sent, then cancels this
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            await handler(scope, receive, send)
+            return status[0]
+
+        async def student(info, requests):
+            for method, url, body in requests:
+                started = time.perf_counter()
+                status = await request(info, method, url, body)
+                timings.append(((time.perf_counter() - started) * 1000, status))
+
+        await asyncio.gather(*(student(*plan) for plan in plans))
+        return timings
@@ -0,0 +1,35 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired sessions so the session table does not grow without bound. "
+        "Run it from cron (e.g. hourly), or with --interval."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help="Keep running and prune again every N seconds instead of exiting",
+        )
+
+    def handle(self, *args, **options):
+        engine = import_module(settings.SESSION_ENGINE)
+        uses_table = settings.SESSION_ENGINE.endswith(('.db', '.cached_db'))
+        while True:
+            if uses_table:
+                expired = Session.objects.filter(expire_date__lt=timezone.now()).count()
+                engine.SessionStore.clear_expired()
+                self.stdout.write(self.style.SUCCESS(f"Pruned {expired} expired sessions."))
+            else:
+                # Cache and cookie sessions expire on their own
+                self.stdout.write(self.style.SUCCESS(f"Nothing to prune with {settings.SESSION_ENGINE}."))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,21 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.item_stats import CHUNK_SIZE, rebuild_item_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute QuestionStats (difficulty index, discrimination and MCQ option counts) "
+        "from every finished attempt. Needs NumPy"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Answers read per batch")
+
+    def handle(self, *args, **options):
+        try:
+            questions = rebuild_item_stats(chunk_size=options['chunk_size'])
+        except ImproperlyConfigured as exc:
+            raise CommandError(exc)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt item stats for {questions} questions with responses."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from quiz.leaderboard import rebuild
+from quiz.models import Attempt
+
+
+class Command(BaseCommand):
+    help = "Recompute the test and topic leaderboard entries from finished attempts (repairs drift)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test', type=int, help="Only the leaderboard of this Test id")
+        parser.add_argument('--topic', type=int, help="Only the leaderboard of this Topic id")
+
+    def handle(self, *args, **options):
+        if options['test'] or options['topic']:
+            boards = [(kind, options[kind]) for kind in ('test', 'topic') if options[kind]]
+        else:
+            finished = Attempt.objects.filter(finished_at__isnull=False)
+            boards = [
+                ('test', pk) for pk in finished.filter(test__isnull=False).values_list('test_id', flat=True).distinct()
+            ] + [
+                ('topic', pk) for pk in finished.filter(topic__isnull=False).values_list('topic_id', flat=True).distinct()
+            ]
+
+        for kind, object_id in boards:
+            students = rebuild(kind, object_id)
+            self.stdout.write(f"  {kind} {object_id}: {students} students")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(boards)} leaderboards."))
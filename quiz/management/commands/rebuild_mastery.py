@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from quiz.mastery import rebuild_mastery
+
+
+class Command(BaseCommand):
+    help = "Recompute the TopicMastery rollup from every finished attempt (repairs drift after regrades)"
+
+    def handle(self, *args, **options):
+        rows = rebuild_mastery()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} mastery rows."))
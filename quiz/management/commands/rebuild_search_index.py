@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.search import backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Refill the question full-text search index (FTS5 on SQLite, tsvector on PostgreSQL)"
+
+    def handle(self, *args, **options):
+        if not backend(write=True):
+            raise CommandError("This database has no full-text index; search falls back to icontains.")
+        started = time.perf_counter()
+        questions = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {questions} questions in {time.perf_counter() - started:.2f}s."
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from quiz.stats import rebuild_topic_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the TopicStats table from the question bank (repairs drift)"
+
+    def handle(self, *args, **options):
+        topics = rebuild_topic_stats()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {topics} topics with questions."))
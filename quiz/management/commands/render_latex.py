@@ -0,0 +1,60 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from quiz import pagecache, payloads
+from quiz.models import Question
+from quiz.rendering import RENDERED_FIELDS, latex_to_mathml, question_sources, render_many
+
+
+class Command(BaseCommand):
+    help = "Pre-render the LaTeX in every question (back-fills Question.rendered)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Number of rendering processes")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Questions loaded and saved per batch")
+
+    def handle(self, *args, **options):
+        if latex_to_mathml is None:
+            raise CommandError("latex2mathml is not installed; nothing to render.")
+
+        workers = max(1, options['workers'])
+        batch_size = max(1, options['batch_size'])
+        # Give every worker a few chunks per batch so slow chunks don't stall the pool
+        self.chunk_size = max(1, batch_size // (workers * 4))
+
+        questions = Question.objects.only('pk', 'topic_id', *RENDERED_FIELDS).order_by('pk')
+        total = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # The workers only convert strings; the cache (which may be the
+            # database) and the database stay with this process. Fork them
+            # now, with no connection open for them to inherit.
+            connections.close_all()
+            pool.submit(int).result()
+            batch = []
+            for question in questions.iterator(chunk_size=batch_size):
+                batch.append(question)
+                if len(batch) == batch_size:
+                    total += self.render_batch(pool, batch)
+                    batch = []
+            if batch:
+                total += self.render_batch(pool, batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered {total} questions."))
+
+    def render_batch(self, pool, batch):
+        def pool_map(func, sources):
+            return pool.map(func, sources, chunksize=self.chunk_size)
+
+        rendered = render_many({question.pk: question_sources(question) for question in batch}, pool_map)
+        for question in batch:
+            question.rendered = rendered[question.pk]
+        Question.objects.bulk_update(batch, ['rendered'])
+        # bulk_update skips the save signals, so drop the cached copies here
+        payloads.invalidate(*rendered)
+        pagecache.bump(*{question.topic_id for question in batch})
+        return len(batch)
@@ -0,0 +1,40 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.caching import is_shared
+from quiz.scheduler import VARIANTS, WARM_AHEAD, warm_upcoming_tests
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the question sets of tests starting soon and load them and their "
+        "questions into the cache. Run it from cron every few minutes, or with --interval."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead', type=int, default=int(WARM_AHEAD.total_seconds() // 60),
+            help="Warm tests starting within this many minutes (default %(default)s)",
+        )
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help="Keep running and warm again every N seconds instead of exiting",
+        )
+
+    def handle(self, *args, **options):
+        if not is_shared():
+            # It would only warm this process's own cache, which the web workers never see
+            raise CommandError("The cache is local to each process; configure a shared one (QUIZ_CACHE_BACKEND).")
+        ahead = timedelta(minutes=options['ahead'])
+        while True:
+            tests = warm_upcoming_tests(ahead)
+            for test in tests:
+                self.stdout.write(f"  {test.name} (starts {test.start_time:%Y-%m-%d %H:%M})")
+            self.stdout.write(self.style.SUCCESS(
+                f"Warmed {len(tests)} tests with {VARIANTS} question sets each."
+            ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,122 @@
+# quiz/mastery.py
+"""
+Per-student mastery rollup.
+
+TopicMastery holds, for each (user, topic, difficulty), how many questions
+the student has answered, how many were right, an exponentially weighted
+recent accuracy and when they last saw one. Submitting an attempt folds its
+answers into the affected rows with a single upsert, so the profile page
+reads a handful of rows instead of the student's whole answer history.
+rebuild_mastery() recomputes everything from the Answer table.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Answer, TopicMastery
+
+# Weight of the newest answer in recent_accuracy
+RECENT_WEIGHT = 0.2
+BATCH_SIZE = 2000
+UPDATE_FIELDS = ['attempts', 'correct', 'recent_accuracy', 'last_seen']
+
+
+def weighted_accuracy(previous, outcomes):
+    """Fold correct/incorrect outcomes into a running accuracy (None to start fresh)"""
+    for correct in outcomes:
+        value = 1.0 if correct else 0.0
+        previous = value if previous is None else previous + RECENT_WEIGHT * (value - previous)
+    return previous
+
+
+@transaction.atomic
+def record_results(user_id, results, seen_at):
+    """
+    Add (topic_id, difficulty, is_correct) results, in the order they were
+    answered, to the user's rollup rows.
+    """
+    grouped = defaultdict(list)
+    for topic_id, difficulty, correct in results:
+        grouped[(topic_id, difficulty)].append(correct)
+    if not grouped:
+        return
+
+    existing = {
+        (row.topic_id, row.difficulty): row
+        for row in TopicMastery.objects.select_for_update().filter(
+            user_id=user_id, topic_id__in={topic_id for topic_id, _ in grouped}
+        )
+    }
+    rows = []
+    for (topic_id, difficulty), outcomes in grouped.items():
+        old = existing.get((topic_id, difficulty))
+        rows.append(TopicMastery(
+            user_id=user_id,
+            topic_id=topic_id,
+            difficulty=difficulty,
+            attempts=(old.attempts if old else 0) + len(outcomes),
+            correct=(old.correct if old else 0) + sum(outcomes),
+            recent_accuracy=weighted_accuracy(old.recent_accuracy if old else None, outcomes),
+            last_seen=max(old.last_seen or seen_at, seen_at) if old else seen_at,
+        ))
+    TopicMastery.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['user', 'topic', 'difficulty'],
+        update_fields=UPDATE_FIELDS,
+    )
+
+
+def record_attempt(attempt, graded):
+    """
+    Fold a just-graded attempt's (question, answer) pairs into the rollup.
+    The upsert adds to the counts, so it must run once per attempt: only
+    the submit that claimed the attempt (engine.submit_attempt) calls it.
+    """
+    record_results(
+        attempt.user_id,
+        [(question.topic_id, question.difficulty, answer.is_correct) for question, answer in graded],
+        attempt.finished_at,
+    )
+
+
+def adjust_correct(deltas):
+    """
+    Apply {(user_id, topic_id, difficulty): change} to the correct counts after
+    a regrade. recent_accuracy is left alone; rebuild_mastery() recomputes it.
+    """
+    for (user_id, topic_id, difficulty), delta in deltas.items():
+        if delta:
+            TopicMastery.objects.filter(
+                user_id=user_id, topic_id=topic_id, difficulty=difficulty
+            ).update(correct=F('correct') + delta)
+
+
+@transaction.atomic
+def rebuild_mastery(batch_size=BATCH_SIZE):
+    """Recompute the whole rollup from finished attempts; returns the number of rows"""
+    rows = (
+        Answer.objects.filter(attempt__finished_at__isnull=False)
+        .order_by('attempt__finished_at', 'attempt_id', 'pk')
+        .values_list('attempt__user_id', 'question__topic_id', 'question__difficulty',
+                     'is_correct', 'attempt__finished_at')
+    )
+    attempts, correct, recent, last_seen = Counter(), Counter(), {}, {}
+    for user_id, topic_id, difficulty, is_correct, finished_at in rows.iterator(chunk_size=batch_size):
+        key = (user_id, topic_id, difficulty)
+        attempts[key] += 1
+        correct[key] += is_correct
+        recent[key] = weighted_accuracy(recent.get(key), [is_correct])
+        last_seen[key] = finished_at
+
+    TopicMastery.objects.all().delete()
+    TopicMastery.objects.bulk_create([
+        TopicMastery(
+            user_id=key[0], topic_id=key[1], difficulty=key[2],
+            attempts=attempts[key], correct=correct[key],
+            recent_accuracy=recent[key], last_seen=last_seen[key],
+        )
+        for key in attempts
+    ], batch_size=batch_size)
+    return len(attempts)
@@ -0,0 +1,246 @@
+# quiz/metrics.py
+"""
+Per-request performance metrics.
+
+metrics_middleware times every request and files it under its URL name with
+its SQL query count and time, template render time and response size.
+Queries are counted by a wrapper on every database connection, and template
+time by the DjangoTemplates backend below. Both report to the current
+request through a context variable, so async views, whose queries run in
+worker threads, are counted as well. Template time includes any queries run
+from the template.
+
+The numbers go into in-process histograms, served in the Prometheus text
+format by metrics_view at /metrics. Each worker process keeps its own, so
+scrape every worker (or sum them). Access needs a "Bearer
+QUIZ_METRICS_TOKEN" Authorization header, or, without a token, a staff
+user. INTERNAL_IPS are let in only with DEBUG on: behind a proxy every
+request comes from the proxy's address.
+
+With QUIZ_SLOW_REQUEST_MS set, requests taking longer are logged to the
+quiz.slow_requests logger together with their queries.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends import django as django_backend
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger('quiz.slow_requests')
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES = (1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000)
+# Queries listed per slow request
+SLOW_LOG_QUERIES = 100
+
+_current = ContextVar('quiz_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """What one request has used so far"""
+
+    def __init__(self, capture_sql=False):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        # (seconds, sql) for the slow-request log
+        self.statements = [] if capture_sql else None
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+# name: (help, buckets)
+HISTOGRAMS = {
+    'quiz_request_duration_seconds': ("Wall time of requests by URL name", SECONDS),
+    'quiz_request_sql_queries': ("SQL queries per request by URL name", QUERIES),
+    'quiz_request_sql_duration_seconds': ("Time spent in SQL per request by URL name", SECONDS),
+    'quiz_request_template_duration_seconds': ("Template render time per request by URL name", SECONDS),
+    'quiz_response_size_bytes': ("Response body size by URL name (streamed responses excluded)", BYTES),
+}
+
+_lock = threading.Lock()
+_histograms = {name: {} for name in HISTOGRAMS}  # name -> {view: Histogram}
+_requests = {}  # (view, status) -> count
+
+
+def _observe(view, status, values):
+    with _lock:
+        for name, value in values.items():
+            if value is None:
+                continue
+            series = _histograms[name]
+            if view not in series:
+                series[view] = Histogram(HISTOGRAMS[name][1])
+            series[view].observe(value)
+        _requests[view, status] = _requests.get((view, status), 0) + 1
+
+
+def reset():
+    with _lock:
+        for series in _histograms.values():
+            series.clear()
+        _requests.clear()
+
+
+def record_sql(execute, sql, params, many, context):
+    """Connection execute wrapper counting queries for the current request"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.queries += 1
+        metrics.sql_time += elapsed
+        if metrics.statements is not None:
+            metrics.statements.append((elapsed, sql))
+
+
+def install_sql_wrapper(sender, connection, **kwargs):
+    """connection_created receiver (connected in QuizConfig.ready)"""
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_sql)
+
+
+class Template:
+    """A backend template that adds its render time to the current request"""
+
+    def __init__(self, template):
+        self._wrapped = template
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return self._wrapped.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self._wrapped.render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The Django template backend with render timing (TEMPLATES BACKEND)"""
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name))
+
+
+def _start():
+    threshold = settings.QUIZ_SLOW_REQUEST_MS
+    metrics = RequestMetrics(capture_sql=bool(threshold))
+    return metrics, _current.set(metrics)
+
+
+def _finish(request, response, metrics):
+    elapsed = time.perf_counter() - metrics.started
+    match = request.resolver_match
+    view = match.view_name if match else 'unresolved'
+    _observe(view, response.status_code, {
+        'quiz_request_duration_seconds': elapsed,
+        'quiz_request_sql_queries': metrics.queries,
+        'quiz_request_sql_duration_seconds': metrics.sql_time,
+        'quiz_request_template_duration_seconds': metrics.template_time,
+        'quiz_response_size_bytes': None if response.streaming else len(response.content),
+    })
+
+    threshold = settings.QUIZ_SLOW_REQUEST_MS
+    if threshold and elapsed * 1000 >= threshold:
+        lines = [
+            f"{seconds * 1000:8.1f} ms  {sql}"
+            for seconds, sql in metrics.statements[:SLOW_LOG_QUERIES]
+        ]
+        if len(metrics.statements) > SLOW_LOG_QUERIES:
+            lines.append(f"... {len(metrics.statements) - SLOW_LOG_QUERIES} more")
+        logger.warning(
+            "Slow request %s %s (%s, %s): %.0f ms, %d queries in %.0f ms, templates %.0f ms\n%s",
+            request.method, request.get_full_path(), view, response.status_code, elapsed * 1000,
+            metrics.queries, metrics.sql_time * 1000, metrics.template_time * 1000, "\n".join(lines),
+        )
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """Record the request's metrics; put it first in MIDDLEWARE so the other middleware is timed too"""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            metrics, token = _start()
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            _finish(request, response, metrics)
+            return response
+    else:
+        def middleware(request):
+            metrics, token = _start()
+            try:
+                response = get_response(request)
+            finally:
+                _current.reset(token)
+            _finish(request, response, metrics)
+            return response
+    return middleware
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for view, histogram in sorted(_histograms[name].items()):
+                label = f'view="{_label(view)}"'
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{label}}} {histogram.sum}')
+                lines.append(f'{name}_count{{{label}}} {cumulative}')
+        lines += ["# HELP quiz_requests_total Requests by URL name and status", "# TYPE quiz_requests_total counter"]
+        for (view, status), count in sorted(_requests.items()):
+            lines.append(f'quiz_requests_total{{view="{_label(view)}",status="{status}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint"""
+    token = settings.QUIZ_METRICS_TOKEN
+    if token:
+        allowed = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    else:
+        internal = settings.DEBUG and request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS
+        allowed = internal or request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden("Metrics are not public.")
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
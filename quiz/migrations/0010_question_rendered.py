@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0009_topicnote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='rendered',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.15 on 2026-10-18 14:45
+
+import django.db.models.deletion
+from collections import Counter, defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count
+
+DIFFICULTY_FIELDS = {1: 'easy_count', 2: 'medium_count', 3: 'hard_count'}
+TYPE_FIELDS = {'MCQ': 'mcq_count', 'NUM': 'num_count', 'TF': 'tf_count'}
+
+
+def populate_topic_stats(apps, schema_editor):
+    Question = apps.get_model('quiz', 'Question')
+    Topic = apps.get_model('quiz', 'Topic')
+    TopicStats = apps.get_model('quiz', 'TopicStats')
+
+    per_topic = defaultdict(Counter)
+    rows = Question.objects.values('topic_id', 'difficulty', 'question_type').annotate(n=Count('id'))
+    for row in rows:
+        counts = per_topic[row['topic_id']]
+        counts['question_count'] += row['n']
+        counts[DIFFICULTY_FIELDS[row['difficulty']]] += row['n']
+        counts[TYPE_FIELDS[row['question_type']]] += row['n']
+
+    TopicStats.objects.bulk_create([
+        TopicStats(topic_id=topic_id, **per_topic.get(topic_id, {}))
+        for topic_id in Topic.objects.values_list('pk', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0011_attempt_questions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TopicStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_count', models.IntegerField(default=0)),
+                ('easy_count', models.IntegerField(default=0)),
+                ('medium_count', models.IntegerField(default=0)),
+                ('hard_count', models.IntegerField(default=0)),
+                ('mcq_count', models.IntegerField(default=0)),
+                ('num_count', models.IntegerField(default=0)),
+                ('tf_count', models.IntegerField(default=0)),
+                ('topic', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='quiz.topic')),
+            ],
+        ),
+        migrations.RunPython(populate_topic_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 14:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0013_hot_table_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attempt',
+            name='seed',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
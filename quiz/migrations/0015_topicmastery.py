@@ -0,0 +1,66 @@
+# Generated by Django 5.1.15 on 2026-10-18 14:55
+
+import django.db.models.deletion
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+
+RECENT_WEIGHT = 0.2
+
+
+def populate_topic_mastery(apps, schema_editor):
+    Answer = apps.get_model('quiz', 'Answer')
+    TopicMastery = apps.get_model('quiz', 'TopicMastery')
+
+    rows = (
+        Answer.objects.filter(attempt__finished_at__isnull=False)
+        .order_by('attempt__finished_at', 'attempt_id', 'pk')
+        .values_list('attempt__user_id', 'question__topic_id', 'question__difficulty',
+                     'is_correct', 'attempt__finished_at')
+    )
+    attempts, correct, recent, last_seen = Counter(), Counter(), {}, {}
+    for user_id, topic_id, difficulty, is_correct, finished_at in rows.iterator():
+        key = (user_id, topic_id, difficulty)
+        value = 1.0 if is_correct else 0.0
+        attempts[key] += 1
+        correct[key] += is_correct
+        recent[key] = value if key not in recent else recent[key] + RECENT_WEIGHT * (value - recent[key])
+        last_seen[key] = finished_at
+
+    TopicMastery.objects.bulk_create([
+        TopicMastery(
+            user_id=key[0], topic_id=key[1], difficulty=key[2],
+            attempts=attempts[key], correct=correct[key],
+            recent_accuracy=recent[key], last_seen=last_seen[key],
+        )
+        for key in attempts
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0014_attempt_seed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TopicMastery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('difficulty', models.IntegerField(choices=[(1, 'Easy'), (2, 'Medium'), (3, 'Hard')])),
+                ('attempts', models.IntegerField(default=0)),
+                ('correct', models.IntegerField(default=0)),
+                ('recent_accuracy', models.FloatField(default=0.0)),
+                ('last_seen', models.DateTimeField(blank=True, null=True)),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quiz.topic')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mastery', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'topic mastery',
+                'unique_together': {('user', 'topic', 'difficulty')},
+            },
+        ),
+        migrations.RunPython(populate_topic_mastery, migrations.RunPython.noop),
+    ]
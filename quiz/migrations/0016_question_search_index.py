@@ -0,0 +1,58 @@
+# Generated by Django 5.1.15 on 2026-10-18 14:58
+
+from django.db import migrations
+
+OPTIONS_SQL = (
+    "trim(coalesce(option_a, '') || ' ' || coalesce(option_b, '') || ' ' || "
+    "coalesce(option_c, '') || ' ' || coalesce(option_d, ''))"
+)
+PG_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(text, '')), 'A') || "
+    f"setweight(to_tsvector('english', {OPTIONS_SQL}), 'B') || "
+    "setweight(to_tsvector('english', coalesce(solution, '')), 'C')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE quiz_question_fts USING fts5("
+            "text, options, solution, tokenize = 'porter unicode61')"
+        )
+        schema_editor.execute(
+            "INSERT INTO quiz_question_fts (rowid, text, options, solution) "
+            f"SELECT id, coalesce(text, ''), {OPTIONS_SQL}, coalesce(solution, '') FROM quiz_question"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE quiz_question_search ("
+            "question_id bigint PRIMARY KEY REFERENCES quiz_question (id) ON DELETE CASCADE "
+            "DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX quiz_question_search_document ON quiz_question_search USING GIN (document)"
+        )
+        schema_editor.execute(
+            f"INSERT INTO quiz_question_search (question_id, document) SELECT id, {PG_DOCUMENT} FROM quiz_question"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS quiz_question_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE IF EXISTS quiz_question_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0015_topicmastery'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.15 on 2026-10-18 15:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0017_question_fingerprints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='item_stats', serialize=False, to='quiz.question')),
+                ('responses', models.IntegerField(default=0)),
+                ('difficulty_index', models.FloatField(blank=True, null=True)),
+                ('discrimination', models.FloatField(blank=True, null=True)),
+                ('option_a_count', models.IntegerField(default=0)),
+                ('option_b_count', models.IntegerField(default=0)),
+                ('option_c_count', models.IntegerField(default=0)),
+                ('option_d_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'question stats',
+            },
+        ),
+    ]
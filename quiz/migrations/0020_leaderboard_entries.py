@@ -0,0 +1,52 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_entries(apps, schema_editor):
+    # Each student's best finished attempt per test and per topic
+    Attempt = apps.get_model('quiz', 'Attempt')
+    LeaderboardEntry = apps.get_model('quiz', 'LeaderboardEntry')
+    rows = (
+        Attempt.objects.filter(finished_at__isnull=False)
+        .order_by('user_id', '-score', 'finished_at')
+        .values_list('user_id', 'test_id', 'topic_id', 'score', 'finished_at')
+    )
+    best = {}
+    for user_id, test_id, topic_id, score, finished_at in rows.iterator(chunk_size=2000):
+        for kind, object_id in (('test', test_id), ('topic', topic_id)):
+            if object_id:
+                best.setdefault((kind, object_id, user_id), (score, finished_at))
+    LeaderboardEntry.objects.bulk_create([
+        LeaderboardEntry(**{f'{kind}_id': object_id}, user_id=user_id, score=score, finished_at=finished_at)
+        for (kind, object_id, user_id), (score, finished_at) in best.items()
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0019_cache_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('finished_at', models.DateTimeField()),
+                ('test', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='quiz.test')),
+                ('topic', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='quiz.topic')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'leaderboard entries',
+                'indexes': [models.Index(fields=['test', '-score', 'finished_at'], name='leaderboard_test_rank'), models.Index(fields=['topic', '-score', 'finished_at'], name='leaderboard_topic_rank')],
+                'constraints': [models.UniqueConstraint(fields=('test', 'user'), name='leaderboard_test_user'), models.UniqueConstraint(fields=('topic', 'user'), name='leaderboard_topic_user')],
+            },
+        ),
+        migrations.RunPython(fill_entries, migrations.RunPython.noop),
+    ]
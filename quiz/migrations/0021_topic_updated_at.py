@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0020_leaderboard_entries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topic',
+            name='updated_at',
+            # Existing topics start a fresh version
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_scores(apps, schema_editor):
+    # Students per best score on every board
+    LeaderboardEntry = apps.get_model('quiz', 'LeaderboardEntry')
+    LeaderboardScore = apps.get_model('quiz', 'LeaderboardScore')
+    rows = LeaderboardEntry.objects.values('test_id', 'topic_id', 'score').annotate(students=Count('pk')).order_by()
+    LeaderboardScore.objects.bulk_create([LeaderboardScore(**row) for row in rows.iterator()], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0021_topic_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('students', models.PositiveIntegerField(default=0)),
+                ('test', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='quiz.test')),
+                ('topic', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='quiz.topic')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('test', 'score'), name='leaderboard_score_test'), models.UniqueConstraint(fields=('topic', 'score'), name='leaderboard_score_topic')],
+            },
+        ),
+        migrations.RunPython(fill_scores, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 
+from .rendering import render_question
+
 # ---------------------------
 # 1. Custom User Model
 # ---------------------------
@@ -18,6 +20,8 @@ class User(AbstractUser):
 # ---------------------------
 class Topic(models.Model):
     name = models.CharField(max_length=100, unique=True)
+    # Last change to the topic, its questions or its note; versions its cached pages (quiz/pagecache.py)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -69,9 +73,24 @@ class Question(models.Model):
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Pre-rendered HTML for the LaTeX fields, keyed by field name
+    rendered = models.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Practice pages: one topic, ordered/filtered by difficulty then age
+            models.Index(fields=['topic', 'difficulty', 'created_at'], name='question_topic_diff_created'),
+            # Question list across all topics, in the same key order
+            models.Index(fields=['difficulty', 'created_at'], name='question_diff_created'),
+        ]
+
     def __str__(self):
         return self.text[:50]
 
+    def save(self, *args, **kwargs):
+        render_question(self)
+        super().save(*args, **kwargs)
+
     def get_correct_answer_display(self):
         """Return a human-readable format of the correct answer"""
         if self.question_type == 'MCQ':
@@ -132,10 +151,21 @@ class Test(models.Model):
 class Attempt(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     test = models.ForeignKey(Test, on_delete=models.CASCADE, null=True, blank=True)
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE, null=True, blank=True)
+    # Ids of the questions served in this attempt, in display order
+    question_ids = models.JSONField(default=list, blank=True)
+    # Seed of the random draw that picked question_ids (see quiz.sampling)
+    seed = models.IntegerField(null=True, blank=True)
     started_at = models.DateTimeField(auto_now_add=True)
     finished_at = models.DateTimeField(null=True, blank=True)
     score = models.FloatField(default=0.0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'started_at'], name='attempt_user_started'),
+            models.Index(fields=['test', 'score'], name='attempt_test_score'),
+        ]
+
     def __str__(self):
         return f"Attempt by {self.user} on {self.test}"
 
@@ -151,6 +181,10 @@ class Answer(models.Model):
     is_correct = models.BooleanField(default=False)
     marks_awarded = models.FloatField(default=0.0)
 
+    class Meta:
+        # Also serves as the (attempt, question) lookup index
+        unique_together = ('attempt', 'question')
+
     def __str__(self):
         return f"Answer to {self.question} by {self.attempt.user}"
 
@@ -176,4 +210,172 @@ class TopicNote(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"Note for {self.topic.name}"
\ No newline at end of file
+        return f"Note for {self.topic.name}"
+
+class TopicStats(models.Model):
+    """Denormalized question counts per topic, kept current by quiz.signals"""
+    topic = models.OneToOneField(Topic, on_delete=models.CASCADE, related_name='stats')
+    question_count = models.IntegerField(default=0)
+
+    # Breakdown by Question.difficulty
+    easy_count = models.IntegerField(default=0)
+    medium_count = models.IntegerField(default=0)
+    hard_count = models.IntegerField(default=0)
+
+    # Breakdown by Question.question_type
+    mcq_count = models.IntegerField(default=0)
+    num_count = models.IntegerField(default=0)
+    tf_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Stats for {self.topic.name}"
+
+
+class TopicMastery(models.Model):
+    """
+    A student's running results per topic and difficulty, updated by
+    quiz.mastery whenever an attempt is graded.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='mastery')
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE)
+    difficulty = models.IntegerField(choices=Question.DIFFICULTY_LEVELS)
+    attempts = models.IntegerField(default=0)
+    correct = models.IntegerField(default=0)
+    # Exponentially weighted accuracy, so recent answers count the most
+    recent_accuracy = models.FloatField(default=0.0)
+    last_seen = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # Also serves as the per-user lookup index for the profile page
+        unique_together = ('user', 'topic', 'difficulty')
+        verbose_name_plural = 'topic mastery'
+
+    @property
+    def accuracy(self):
+        return self.correct / self.attempts * 100 if self.attempts else 0.0
+
+    @property
+    def recent_percent(self):
+        return self.recent_accuracy * 100
+
+    def __str__(self):
+        return f"{self.user} on {self.topic.name} ({self.get_difficulty_display()})"
+
+
+class QuestionFingerprint(models.Model):
+    """MinHash signature of a question's normalized text, maintained by quiz.dedupe"""
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='fingerprint')
+    signature = models.BinaryField()
+
+    def __str__(self):
+        return f"Fingerprint of question {self.question_id}"
+
+
+class QuestionBucket(models.Model):
+    """One LSH band of a question's signature; questions sharing a bucket are duplicate candidates"""
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='lsh_buckets')
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['bucket', 'question'], name='question_bucket_lookup')]
+
+
+class QuestionStats(models.Model):
+    """
+    Item statistics from finished attempts, recomputed by quiz.item_stats
+    (the rebuild_item_stats command) so pages never aggregate answers.
+    """
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='item_stats')
+    responses = models.IntegerField(default=0)
+    # Proportion of responses that were correct (the classical p-value)
+    difficulty_index = models.FloatField(null=True, blank=True)
+    # Point-biserial correlation between answering this question correctly
+    # and the score on the rest of the attempt
+    discrimination = models.FloatField(null=True, blank=True)
+
+    # How many responses picked each MCQ option
+    option_a_count = models.IntegerField(default=0)
+    option_b_count = models.IntegerField(default=0)
+    option_c_count = models.IntegerField(default=0)
+    option_d_count = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField()
+
+    # Below this many responses the indices are too noisy to act on
+    MIN_RESPONSES = 30
+    # Conventional difficulty-index bands for Easy and Hard
+    EASY_ABOVE = 0.7
+    HARD_BELOW = 0.3
+
+    class Meta:
+        verbose_name_plural = 'question stats'
+
+    @property
+    def suggested_difficulty(self):
+        """The Question.difficulty level the difficulty index points to, or None"""
+        if self.difficulty_index is None or self.responses < self.MIN_RESPONSES:
+            return None
+        if self.difficulty_index > self.EASY_ABOVE:
+            return 1
+        if self.difficulty_index < self.HARD_BELOW:
+            return 3
+        return 2
+
+    def get_suggested_difficulty_display(self):
+        return dict(Question.DIFFICULTY_LEVELS).get(self.suggested_difficulty, '')
+
+    @property
+    def percent_correct(self):
+        return self.difficulty_index * 100 if self.difficulty_index is not None else None
+
+    def option_percents(self):
+        """[(letter, percent of responses)] for the MCQ options"""
+        counts = [self.option_a_count, self.option_b_count, self.option_c_count, self.option_d_count]
+        return [(letter, count / self.responses * 100 if self.responses else 0.0)
+                for letter, count in zip('ABCD', counts)]
+
+    def __str__(self):
+        return f"Stats for question {self.question_id}"
+
+
+class LeaderboardEntry(models.Model):
+    """A student's best finished attempt on a test or a topic, kept by quiz.leaderboard"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Exactly one of test and topic is set: the board the entry belongs to
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, null=True, blank=True)
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE, null=True, blank=True)
+    score = models.FloatField()
+    finished_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['test', 'user'], name='leaderboard_test_user'),
+            models.UniqueConstraint(fields=['topic', 'user'], name='leaderboard_topic_user'),
+        ]
+        # Board order: a page of leaders is an index range, a rank a count over one
+        indexes = [
+            models.Index(fields=['test', '-score', 'finished_at'], name='leaderboard_test_rank'),
+            models.Index(fields=['topic', '-score', 'finished_at'], name='leaderboard_topic_rank'),
+        ]
+        verbose_name_plural = 'leaderboard entries'
+
+    def __str__(self):
+        return f"{self.user} on {self.test or self.topic}: {self.score}"
+
+
+class LeaderboardScore(models.Model):
+    """How many students have each best score on a board, kept by quiz.leaderboard for ranks"""
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, null=True, blank=True)
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE, null=True, blank=True)
+    score = models.FloatField()
+    students = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Also the index a rank reads: the scores above one on a board
+        constraints = [
+            models.UniqueConstraint(fields=['test', 'score'], name='leaderboard_score_test'),
+            models.UniqueConstraint(fields=['topic', 'score'], name='leaderboard_score_topic'),
+        ]
+
+    def __str__(self):
+        return f"{self.students} on {self.test or self.topic} with {self.score}"
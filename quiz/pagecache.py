@@ -0,0 +1,100 @@
+# quiz/pagecache.py
+"""
+Versioned caching for the practice and topic pages.
+
+A topic's pages are versioned by Topic.updated_at. Saving or deleting one
+of its questions, its note or the topic itself moves it forward in the same
+transaction (see quiz.signals), and the importer does so for the topics it
+adds to. Every worker reads the version from the database, so an edit
+shows everywhere at once whatever the cache backend. Nothing else needs to
+be invalidated:
+
+- topic_page() gives a view ETag and Last-Modified headers built from the
+  version, so a browser revalidating an unchanged page gets a 304 without
+  the view running.
+- Templates cache their expensive fragments with {% cache %}, varying on
+  `page_version` and validated request parameters only (never the raw query
+  string, which would let any URL add a cache entry). After an edit the
+  next request renders under the new version, and the old entries simply
+  expire.
+
+Views pass query results to those fragments as lazy() callables, which the
+template only calls on a cache miss.
+"""
+import functools
+
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from .models import Topic
+
+FRAGMENT_TIMEOUT = 24 * 60 * 60
+# Bump when the cached templates change so old fragments and ETags are ignored
+PAGE_CACHE_VERSION = 1
+
+
+def topic_version(topic_id):
+    """(version, time of the last change) for a topic's pages, or None if there is no such topic"""
+    changed = Topic.objects.filter(pk=topic_id).values_list('updated_at', flat=True).first()
+    if changed is None:
+        return None
+    return int(changed.timestamp() * 1_000_000), changed
+
+
+def bump(*topic_ids):
+    """Start a new version of these topics' pages; it is seen when the transaction commits"""
+    topic_ids = {topic_id for topic_id in topic_ids if topic_id is not None}
+    if topic_ids:
+        Topic.objects.filter(pk__in=topic_ids).update(updated_at=timezone.now())
+
+
+def _request_version(request, topic_id):
+    # The ETag, Last-Modified and template context share one cache read
+    versions = request.__dict__.setdefault('_topic_versions', {})
+    if topic_id not in versions:
+        versions[topic_id] = topic_version(topic_id)
+    return versions[topic_id]
+
+
+def page_context(request, topic_id):
+    """Template variables for {% cache fragment_timeout "name" page_version ... %}"""
+    version, _ = _request_version(request, topic_id)
+    return {'page_version': f'{PAGE_CACHE_VERSION}.{version}', 'fragment_timeout': FRAGMENT_TIMEOUT}
+
+
+def lazy(func):
+    """A zero-argument callable a template resolves on first use, so a cached fragment skips the query"""
+    return functools.cache(func)
+
+
+def topic_page(name, topic_of=lambda topic_id, **kwargs: topic_id):
+    """
+    Add ETag and Last-Modified headers to the view of a topic's page and
+    answer matching conditional GETs with 304. topic_of maps the URL kwargs
+    to the topic id (None lets the view run and 404). Browsers are told to
+    revalidate every time, so edits show up immediately.
+    """
+    def page_topic(request, kwargs):
+        # The ETag and Last-Modified functions both need it; look it up once
+        if '_page_topic' not in request.__dict__:
+            request._page_topic = topic_of(**kwargs)
+        return request._page_topic
+
+    def etag(request, **kwargs):
+        topic = page_topic(request, kwargs)
+        found = _request_version(request, topic) if topic is not None else None
+        if found is None:
+            return None
+        # The page shell shows who is logged in
+        return f'{name}-{PAGE_CACHE_VERSION}-{topic}-{found[0]}-{request.user.pk or 0}'
+
+    def last_modified(request, **kwargs):
+        topic = page_topic(request, kwargs)
+        found = _request_version(request, topic) if topic is not None else None
+        return found[1] if found is not None else None
+
+    def decorator(view):
+        view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+        return cache_control(private=True, no_cache=True)(view)
+    return decorator
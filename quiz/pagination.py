@@ -0,0 +1,105 @@
+# quiz/pagination.py
+"""
+Keyset (cursor) pagination.
+
+Instead of OFFSET, each page remembers the sort key of its first and last
+row and the next query starts from there with a WHERE on the key, so page
+1000 costs the same as page 1. Cursors are opaque URL-safe strings.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+QUESTION_ORDERING = ('difficulty', 'created_at', 'id')
+
+
+def encode_cursor(values):
+    # isoformat() keeps full microsecond precision, which the seek needs
+    raw = json.dumps(values, default=lambda value: value.isoformat()).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, length):
+    """Return the key values stored in cursor, or None if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != length:
+        return None
+    return values
+
+
+def clean_cursor(cursor, length=len(QUESTION_ORDERING)):
+    """The cursor re-encoded from its values, or None if it is missing or malformed"""
+    values = decode_cursor(cursor, length) if cursor else None
+    return encode_cursor(values) if values is not None else None
+
+
+def seek_filter(fields, values, lookup):
+    """(f1, f2, ...) > (v1, v2, ...) spelled out as OR-ed prefix matches"""
+    condition = Q()
+    for i, field in enumerate(fields):
+        term = Q(**{f'{field}__{lookup}': values[i]})
+        for prev_field, prev_value in zip(fields[:i], values[:i]):
+            term &= Q(**{prev_field: prev_value})
+        condition |= term
+    # The redundant bound on the leading field lets the database start an
+    # index range scan at the cursor instead of filtering from the top
+    inclusive = {'gt': 'gte', 'lt': 'lte'}[lookup]
+    return Q(**{f'{fields[0]}__{inclusive}': values[0]}) & condition
+
+
+class KeysetPage:
+    def __init__(self, items, ordering, has_next, has_previous):
+        self.object_list = items
+        self.has_next = has_next and bool(items)
+        self.has_previous = has_previous and bool(items)
+        self.next_cursor = self._cursor(items[-1], ordering) if self.has_next else None
+        self.previous_cursor = self._cursor(items[0], ordering) if self.has_previous else None
+
+    @staticmethod
+    def _cursor(item, ordering):
+        return encode_cursor([getattr(item, field) for field in ordering])
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+def keyset_paginate(queryset, per_page, after=None, before=None, ordering=QUESTION_ORDERING):
+    """
+    Return the KeysetPage that follows the `after` cursor, or precedes the
+    `before` cursor, or the first page when neither is given.
+    All fields in `ordering` are ascending and the last one must be unique.
+    """
+    after = decode_cursor(after, len(ordering)) if after else None
+    before = decode_cursor(before, len(ordering)) if before else None
+
+    try:
+        if before is not None:
+            descending = [f'-{field}' for field in ordering]
+            rows = list(queryset.filter(seek_filter(ordering, before, 'lt')).order_by(*descending)[:per_page + 1])
+            items = rows[:per_page][::-1]
+            return KeysetPage(items, ordering, has_next=True, has_previous=len(rows) > per_page)
+
+        if after is not None:
+            queryset = queryset.filter(seek_filter(ordering, after, 'gt'))
+    except (ValidationError, ValueError, TypeError):
+        # A tampered cursor whose values don't fit the fields: start over
+        after = None
+
+    rows = list(queryset.order_by(*ordering)[:per_page + 1])
+    items = rows[:per_page]
+    return KeysetPage(items, ordering, has_next=len(rows) > per_page, has_previous=after is not None)
@@ -0,0 +1,152 @@
+# quiz/payloads.py
+"""
+Cache of Question objects (with their pre-rendered markup) by id.
+
+Quiz pages read questions through get_questions(), so once a question set
+is warm, serving it does not touch the database. Entries are dropped when a
+question is saved or deleted. Grading does not use the cache: it reads the
+answer key from the database, so a change the cache missed can only show
+a stale question, never give the wrong marks.
+
+quiz_document() builds what the quiz API sends to the browser: every question
+of a set with its options but without answers or solutions. Documents are
+cached by question set, so students sharing a test variant share one entry,
+and keyed by a version that any question change bumps.
+
+Invalidation only reaches the cache of the process that saved the question.
+With a shared cache (settings.CACHES) that is every worker, and entries live
+for PAYLOAD_TIMEOUT. With a per-process cache the other workers go on
+serving the old question and documents until their entries expire, so they
+are kept for LOCAL_PAYLOAD_TIMEOUT only. In either case a page that loaded a
+question just before an edit committed can put the old one back; it lasts
+until the timeout.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .caching import is_shared
+from .models import Question
+from .rendering import markup
+
+PAYLOAD_TIMEOUT = 6 * 60 * 60
+# How stale a worker's question can get when edits can't reach its cache
+LOCAL_PAYLOAD_TIMEOUT = 5 * 60
+
+
+VERSION_KEY = 'quiz:question-version'
+TF_OPTIONS = [("True", "True"), ("False", "False")]
+
+
+def _key(question_id):
+    return f'quiz:question:{question_id}'
+
+
+def _timeout():
+    return PAYLOAD_TIMEOUT if is_shared() else LOCAL_PAYLOAD_TIMEOUT
+
+
+def get_questions(question_ids):
+    """{id: Question} for the given ids, loading any cache misses in one query"""
+    keys = {_key(pk): pk for pk in question_ids}
+    found = cache.get_many(keys.keys())
+    questions = {keys[key]: question for key, question in found.items()}
+
+    missing = [pk for pk in question_ids if pk not in questions]
+    if missing:
+        loaded = Question.objects.in_bulk(missing)
+        cache.set_many({_key(pk): question for pk, question in loaded.items()}, _timeout())
+        questions.update(loaded)
+    return questions
+
+
+async def aget_questions(question_ids):
+    keys = {_key(pk): pk for pk in question_ids}
+    found = await cache.aget_many(keys.keys())
+    questions = {keys[key]: question for key, question in found.items()}
+
+    missing = [pk for pk in question_ids if pk not in questions]
+    if missing:
+        loaded = await Question.objects.ain_bulk(missing)
+        await cache.aset_many({_key(pk): question for pk, question in loaded.items()}, _timeout())
+        questions.update(loaded)
+    return questions
+
+
+def get_question(question_id):
+    return get_questions([question_id]).get(question_id)
+
+
+def warm(question_ids):
+    """Load the questions into the cache ahead of time"""
+    loaded = Question.objects.in_bulk(list(question_ids))
+    cache.set_many({_key(pk): question for pk, question in loaded.items()}, _timeout())
+    return len(loaded)
+
+
+def _version():
+    return cache.get_or_set(VERSION_KEY, 1, None)
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def client_question(question):
+    """What the browser needs to show a question; never the correct option or solution"""
+    if question.question_type == "MCQ":
+        options = [
+            (letter, markup(question, f'option_{letter.lower()}'))
+            for letter in "ABCD"
+        ]
+    elif question.question_type == "TF":
+        options = TF_OPTIONS
+    else:
+        options = None
+    return {
+        "id": question.pk,
+        "type": question.question_type,
+        "text": markup(question, 'text'),
+        "options": [{"value": value, "label": label} for value, label in options] if options else None,
+    }
+
+
+def _document_key(question_ids, version):
+    digest = hashlib.sha1(",".join(map(str, question_ids)).encode()).hexdigest()
+    return f'quiz:document:{version}:{digest}'
+
+
+def _build_document(question_ids, questions):
+    return [client_question(questions[pk]) for pk in question_ids if pk in questions]
+
+
+def quiz_document(question_ids):
+    """[client_question(), ...] in quiz order for a question set, cached as one entry"""
+    key = _document_key(question_ids, _version())
+    document = cache.get(key)
+    if document is None:
+        document = _build_document(question_ids, get_questions(question_ids))
+        cache.set(key, document, _timeout())
+    return document
+
+
+async def aquiz_document(question_ids):
+    key = _document_key(question_ids, await cache.aget_or_set(VERSION_KEY, 1, None))
+    document = await cache.aget(key)
+    if document is None:
+        document = _build_document(question_ids, await aget_questions(question_ids))
+        await cache.aset(key, document, _timeout())
+    return document
+
+
+def invalidate(*question_ids):
+    keys = [_key(pk) for pk in question_ids]
+
+    def drop():
+        cache.delete_many(keys)
+        _bump_version()
+    transaction.on_commit(drop)
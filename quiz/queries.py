@@ -0,0 +1,64 @@
+# quiz/queries.py
+"""Shared read queries for the topic and question pages."""
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+
+from .models import Question, Topic, TopicNote
+
+
+def topic_summaries():
+    """
+    Topics with their note and question counts, fetched in a single query.
+    Counts come from TopicStats, so the question table is never scanned.
+    """
+    return (
+        Topic.objects
+        .annotate(question_count=Coalesce('stats__question_count', Value(0)))
+        .select_related('note', 'stats')
+        .order_by('pk')
+    )
+
+
+def topic_note(topic):
+    """The topic's note, or None (no query when loaded via topic_summaries)"""
+    try:
+        return topic.note
+    except TopicNote.DoesNotExist:
+        return None
+
+
+def topic_cards(topics):
+    """The {'topic', 'note', 'question_count'} dicts the home and topic pages render"""
+    return [
+        {
+            'topic': topic,
+            'note': topic_note(topic),
+            'question_count': topic.question_count,
+        }
+        for topic in topics
+    ]
+
+
+def filter_questions(queryset, params, fields=('topic', 'difficulty', 'type')):
+    """
+    Apply the topic/difficulty/type filters found in params (request.GET).
+    Returns the filtered queryset and the {name: value} filters that were valid.
+    """
+    filters = {}
+
+    topic = params.get('topic', '')
+    if 'topic' in fields and topic.isdigit():
+        queryset = queryset.filter(topic_id=int(topic))
+        filters['topic'] = topic
+
+    difficulty = params.get('difficulty', '')
+    if 'difficulty' in fields and difficulty.isdigit() and int(difficulty) in dict(Question.DIFFICULTY_LEVELS):
+        queryset = queryset.filter(difficulty=int(difficulty))
+        filters['difficulty'] = difficulty
+
+    question_type = params.get('type', '')
+    if 'type' in fields and question_type in dict(Question.QUESTION_TYPES):
+        queryset = queryset.filter(question_type=question_type)
+        filters['type'] = question_type
+
+    return queryset, filters
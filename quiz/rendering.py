@@ -0,0 +1,121 @@
+# quiz/rendering.py
+"""
+Server-side LaTeX rendering for question content.
+
+Math segments ($...$, $$...$$, \\(...\\), \\[...\\] and bare \\begin{...}
+environments) are converted to MathML so the browser can show them without
+typesetting them again on every page view.
+Rendered markup is cached by a hash of its source, so repeated strings
+(True/False options, common formulas) are only rendered once.
+
+Question fields are text, never HTML. Everything outside the MathML,
+including math the converter can't handle, is escaped, so markup() is
+always safe to insert into a page. A field without markup is shown escaped
+(MathJax then typesets it in the browser).
+"""
+import hashlib
+import re
+
+from django.core.cache import cache
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+try:
+    from latex2mathml.converter import convert as latex_to_mathml
+except ImportError:  # Without the renderer, MathJax typesets the raw source
+    latex_to_mathml = None
+
+# Question fields that may contain LaTeX
+RENDERED_FIELDS = ['text', 'option_a', 'option_b', 'option_c', 'option_d', 'solution']
+
+# Bump when the output format changes so stale cache entries are ignored
+RENDERER_VERSION = 2
+CACHE_PREFIX = f'latex:v{RENDERER_VERSION}:'
+
+MATH_PATTERN = re.compile(
+    r'\$\$(?P<display>.+?)\$\$'
+    r'|\\\[(?P<bracket>.+?)\\\]'
+    r'|\$(?P<inline>[^$]+?)\$'
+    r'|\\\((?P<paren>.+?)\\\)'
+    r'|(?P<environment>\\begin\{(?P<env>[a-z]+\*?)\}.+?\\end\{(?P=env)\})',
+    re.DOTALL,
+)
+
+
+def content_hash(source):
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def _render_match(match):
+    display = match.group('display') or match.group('bracket') or match.group('environment')
+    latex = display or match.group('inline') or match.group('paren')
+    try:
+        return latex_to_mathml(latex.strip(), display='block' if display else 'inline')
+    except Exception:
+        # Leave anything the converter can't handle to MathJax
+        return escape(match.group(0))
+
+
+def render_math(source):
+    """Convert the math segments of source to MathML and escape the rest"""
+    if latex_to_mathml is None:
+        return escape(source)
+    parts = []
+    end = 0
+    for match in MATH_PATTERN.finditer(source):
+        parts += [escape(source[end:match.start()]), _render_match(match)]
+        end = match.end()
+    parts.append(escape(source[end:]))
+    return ''.join(parts)
+
+
+def render_many(sources, map_func=map):
+    """
+    Render {id: {field: source}} and return {id: {field: markup}}. Empty
+    fields are skipped. Cached renders are reused by content hash with one
+    cache read for the lot; map_func(render_math, sources) renders the rest,
+    e.g. a process pool's map. Only the caller touches the cache.
+    """
+    if latex_to_mathml is None:
+        return {item: {} for item in sources}
+
+    keys = {
+        item: {field: CACHE_PREFIX + content_hash(source) for field, source in fields.items() if source}
+        for item, fields in sources.items()
+    }
+    markup = cache.get_many({key for fields in keys.values() for key in fields.values()})
+
+    missing = {}
+    for item, fields in keys.items():
+        for field, key in fields.items():
+            if key not in markup:
+                missing.setdefault(key, sources[item][field])
+    if missing:
+        fresh = dict(zip(missing, map_func(render_math, missing.values())))
+        cache.set_many(fresh, timeout=None)
+        markup.update(fresh)
+
+    return {item: {field: markup[key] for field, key in fields.items()} for item, fields in keys.items()}
+
+
+def render_sources(sources):
+    """Render a {field: source} dict and return {field: markup}"""
+    return render_many({None: sources})[None]
+
+
+def question_sources(question):
+    return {field: getattr(question, field) for field in RENDERED_FIELDS}
+
+
+def render_question(question):
+    """Store pre-rendered markup for every LaTeX field on the question"""
+    question.rendered = render_sources(question_sources(question))
+    return question.rendered
+
+
+def markup(question, field):
+    """Safe HTML for a question field: its pre-rendered markup, or its escaped source"""
+    rendered = (question.rendered or {}).get(field)
+    if rendered is None:
+        return escape(getattr(question, field) or '')
+    return mark_safe(rendered)
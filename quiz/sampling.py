@@ -0,0 +1,94 @@
+# quiz/sampling.py
+"""
+Random, difficulty-stratified question sampling.
+
+Each topic has a compact index of its question ids bucketed by difficulty.
+Every process keeps the indexes it has built in memory (the most recently
+used MAX_INDEXES topics), tagged with the topic's updated_at. Saving,
+deleting or importing a question moves that forward (pagecache.bump), so a
+draw costs one primary-key lookup to check the tag, and the index is only
+read from the database again after the topic changed. Nothing goes through
+the cache. A draw picks k ids from the buckets with random.sample, which is
+O(k), so starting a quiz does not get slower as topics grow.
+
+Draws are seeded. The same seed gives the same questions only while the
+topic's questions are unchanged: adding, deleting or re-levelling one
+changes the buckets, and with them what a seed draws.
+"""
+import random
+import secrets
+import threading
+from array import array
+from collections import OrderedDict
+
+from .models import Question, Topic
+
+# Questions drawn per difficulty level: 4 easy, 4 medium, 2 hard
+STRATA = {1: 4, 2: 4, 3: 2}
+MAX_INDEXES = 1000
+
+_indexes = OrderedDict()  # topic id -> (updated_at, index)
+_lock = threading.Lock()
+
+
+def question_index(topic_id):
+    """{difficulty: array of question ids} for the topic, from memory while the topic is unchanged"""
+    version = Topic.objects.filter(pk=topic_id).values_list('updated_at', flat=True).first()
+    with _lock:
+        cached = _indexes.get(topic_id)
+        if cached is not None and cached[0] == version:
+            _indexes.move_to_end(topic_id)
+            return cached[1]
+
+    index = {level: array('q') for level, _ in Question.DIFFICULTY_LEVELS}
+    rows = Question.objects.filter(topic_id=topic_id).order_by('pk').values_list('difficulty', 'pk')
+    for difficulty, pk in rows:
+        index.setdefault(difficulty, array('q')).append(pk)
+    with _lock:
+        _indexes[topic_id] = (version, index)
+        _indexes.move_to_end(topic_id)
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def new_seed():
+    return secrets.randbits(31)
+
+
+def strata_for(count):
+    """Split a question count over the levels in the STRATA proportions"""
+    total = sum(STRATA.values())
+    strata = {level: count * share // total for level, share in STRATA.items()}
+    # Hand the rounding remainder to the easier levels
+    for level in sorted(STRATA)[:count - sum(strata.values())]:
+        strata[level] += 1
+    return strata
+
+
+def draw(topic_id, seed, strata=STRATA):
+    """
+    Draw question ids for a topic, easiest first. Levels with too few
+    questions are topped up from the remaining ones, so the quiz is as long
+    as the topic allows.
+    """
+    rng = random.Random(seed)
+    index = question_index(topic_id)
+
+    chosen = {}
+    for level in sorted(index):
+        bucket = index[level]
+        chosen[level] = rng.sample(bucket, min(strata.get(level, 0), len(bucket)))
+
+    shortfall = sum(strata.values()) - sum(len(ids) for ids in chosen.values())
+    if shortfall > 0:
+        # Some level is short of questions: top up from everything not drawn yet
+        taken = {pk for ids in chosen.values() for pk in ids}
+        leftovers = [
+            (level, pk) for level in sorted(index)
+            for pk in index[level] if pk not in taken
+        ]
+        for level, pk in rng.sample(leftovers, min(shortfall, len(leftovers))):
+            chosen[level].append(pk)
+
+    return [pk for level in sorted(chosen) for pk in chosen[level]]
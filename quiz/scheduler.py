@@ -0,0 +1,116 @@
+# quiz/scheduler.py
+"""
+Question sets for scheduled Tests, built ahead of the start time.
+
+Every Test has VARIANTS question sets and each student is given one of
+them by user id, so neighbours rarely see the same paper. The sets are
+drawn from deterministic seeds, which means any worker can rebuild exactly
+the same sets if the cache has been cleared (as long as the topics'
+questions haven't changed; see quiz.sampling). Each seed is a hash of what
+it is for: (test, variant) for a set, and (set seed, topic) for each topic
+drawn, so no two tests, variants or topics share one.
+
+warm_upcoming_tests() runs shortly before start_time (see the warm_tests
+command): it stores the sets, the questions they use and the quiz document
+of each set in the cache, so the burst of students opening a test at once
+is served from the cache.
+That only helps with a cache the web workers share (settings.CACHES), so
+the command refuses to run on a per-process one.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import payloads, sampling
+from .models import Test
+
+VARIANTS = 8
+WARM_AHEAD = timedelta(minutes=15)
+# Keep sets around this long after the test ends, for late submissions
+KEEP_AFTER_END = timedelta(hours=1)
+
+
+def _sets_key(test_id):
+    return f'quiz:test-sets:{test_id}'
+
+
+def _seed(*parts):
+    """A 31-bit seed (it is stored in Attempt.seed) derived from the parts"""
+    digest = hashlib.sha256(repr(parts).encode()).digest()
+    return int.from_bytes(digest[:4], 'big') >> 1
+
+
+def variant_seed(test_id, variant):
+    return _seed('test', test_id, variant)
+
+
+def variant_for(user):
+    return user.pk % VARIANTS
+
+
+def draw_test_questions(topic_ids, num_questions, seed):
+    """Draw num_questions ids spread evenly over the topics, each topic stratified by difficulty"""
+    if not topic_ids or num_questions <= 0:
+        return []
+    per_topic, extra = divmod(num_questions, len(topic_ids))
+    question_ids = []
+    for position, topic_id in enumerate(sorted(topic_ids)):
+        count = per_topic + (1 if position < extra else 0)
+        if count:
+            question_ids += sampling.draw(topic_id, _seed(seed, topic_id), sampling.strata_for(count))
+    return question_ids
+
+
+def build_question_sets(test):
+    """[question ids] for every variant of the test"""
+    topic_ids = [topic.pk for topic in test.topics.all()]
+    return [
+        draw_test_questions(topic_ids, test.num_questions, variant_seed(test.pk, variant))
+        for variant in range(VARIANTS)
+    ]
+
+
+def _timeout(test):
+    remaining = test.end_time + KEEP_AFTER_END - timezone.now()
+    return max(60, int(remaining.total_seconds()))
+
+
+def warm_test(test):
+    """Build the test's question sets and load them, their questions and quiz documents into the cache"""
+    question_sets = build_question_sets(test)
+    cache.set(_sets_key(test.pk), question_sets, _timeout(test))
+    payloads.warm({pk for question_ids in question_sets for pk in question_ids})
+    for question_ids in question_sets:
+        payloads.quiz_document(question_ids)
+    return question_sets
+
+
+def question_set_for(test, user):
+    """(seed, question ids) of the variant this user takes"""
+    question_sets = cache.get(_sets_key(test.pk))
+    if question_sets is None:
+        # Not warmed (or evicted): the seeds are fixed, so this rebuilds the same sets
+        question_sets = build_question_sets(test)
+        cache.set(_sets_key(test.pk), question_sets, _timeout(test))
+    variant = variant_for(user)
+    return variant_seed(test.pk, variant), question_sets[variant]
+
+
+def warm_upcoming_tests(ahead=WARM_AHEAD, now=None):
+    """Warm every test starting within `ahead` or already running; returns the tests"""
+    now = now or timezone.now()
+    tests = list(
+        Test.objects.filter(start_time__lte=now + ahead, end_time__gt=now)
+        .prefetch_related('topics')
+    )
+    for test in tests:
+        warm_test(test)
+    return tests
+
+
+def invalidate(test_id):
+    """Drop the test's question sets once the current transaction commits"""
+    transaction.on_commit(lambda: cache.delete(_sets_key(test_id)))
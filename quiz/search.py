@@ -0,0 +1,276 @@
+# quiz/search.py
+"""
+Full-text search over question text, options and solutions.
+
+On SQLite the index is an FTS5 table (quiz_question_fts, rowid = question
+id) ranked with bm25(); on PostgreSQL it is a tsvector table
+(quiz_question_search) with a GIN index, ranked with ts_rank(). Both are
+created by migration 0016 and written by index_questions() and
+remove_questions(), which the Question signals and the importer call.
+rebuild_index() refills either one from the question table. Searches run on
+the alias the router picks for reading questions (the replica inside
+read_replica()), and index writes on the one it picks for writing them.
+
+Other databases fall back to icontains filters, which scan the table.
+"""
+import re
+
+from django.db import connections, router, transaction
+from django.db.models import Count, Q
+
+from .models import Question, Topic
+
+FTS_TABLE = 'quiz_question_fts'
+PG_TABLE = 'quiz_question_search'
+PER_PAGE = 25
+# Facets and totals count at most this many matches; broader queries show "N+"
+FACET_LIMIT = 10000
+
+# Relative weight of a match in the text, the options and the solution
+SQLITE_WEIGHTS = (10.0, 4.0, 1.0)
+PG_DOCUMENT = (
+    "setweight(to_tsvector('english', {text}), 'A') || "
+    "setweight(to_tsvector('english', {options}), 'B') || "
+    "setweight(to_tsvector('english', {solution}), 'C')"
+)
+OPTIONS_SQL = "trim(coalesce(option_a, '') || ' ' || coalesce(option_b, '') || ' ' || " \
+              "coalesce(option_c, '') || ' ' || coalesce(option_d, ''))"
+
+
+def _database(write=False):
+    """The connection that question reads (or writes) are routed to"""
+    return connections[router.db_for_write(Question) if write else router.db_for_read(Question)]
+
+
+def backend(write=False):
+    """'sqlite', 'postgresql' or None when the database has no index"""
+    vendor = _database(write).vendor
+    return vendor if vendor in ('sqlite', 'postgresql') else None
+
+
+def _document(question):
+    options = " ".join(filter(None, [question.option_a, question.option_b, question.option_c, question.option_d]))
+    return question.pk, question.text or "", options, question.solution or ""
+
+
+def index_questions(questions):
+    """Add or replace the index entries of saved questions"""
+    rows = [_document(question) for question in questions]
+    if not rows or not backend(write=True):
+        return
+    with _database(write=True).cursor() as cursor:
+        if backend(write=True) == 'sqlite':
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, text, options, solution) VALUES (%s, %s, %s, %s)", rows
+            )
+        else:
+            document = PG_DOCUMENT.format(text='%s', options='%s', solution='%s')
+            cursor.executemany(
+                f"INSERT INTO {PG_TABLE} (question_id, document) VALUES (%s, {document}) "
+                f"ON CONFLICT (question_id) DO UPDATE SET document = EXCLUDED.document",
+                rows,
+            )
+
+
+def remove_questions(question_ids):
+    if not question_ids or not backend(write=True):
+        return
+    with _database(write=True).cursor() as cursor:
+        if backend(write=True) == 'sqlite':
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in question_ids])
+        else:
+            cursor.execute(f"DELETE FROM {PG_TABLE} WHERE question_id = ANY(%s)", [list(question_ids)])
+
+
+def rebuild_index():
+    """Refill the index from the question table in one statement; returns the number of questions"""
+    table = Question._meta.db_table
+    database = _database(write=True)
+    with transaction.atomic(using=database.alias), database.cursor() as cursor:
+        if backend(write=True) == 'sqlite':
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, text, options, solution) "
+                f"SELECT id, coalesce(text, ''), {OPTIONS_SQL}, coalesce(solution, '') FROM {table}"
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        elif backend(write=True) == 'postgresql':
+            document = PG_DOCUMENT.format(text="coalesce(text, '')", options=OPTIONS_SQL, solution="coalesce(solution, '')")
+            cursor.execute(f"TRUNCATE {PG_TABLE}")
+            cursor.execute(f"INSERT INTO {PG_TABLE} (question_id, document) SELECT id, {document} FROM {table}")
+        return Question.objects.using(database.alias).count()
+
+
+def match_expression(query):
+    """
+    The backend's query string matching all the words in query, or None.
+    Words are stemmed by both backends, so "derivatives" finds "derivative".
+    """
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return None
+    if backend() == 'sqlite':
+        return " ".join(f'"{term}"' for term in terms)
+    return " & ".join(terms)
+
+
+class SearchPage:
+    """One page of ranked results plus topic and difficulty facet counts"""
+
+    def __init__(self, object_list, total, number, per_page, facets, capped=False):
+        self.object_list = object_list
+        self.total = total
+        # True when total stopped at FACET_LIMIT
+        self.capped = capped
+        self.number = number
+        self.per_page = per_page
+        self.facets = facets
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.number * self.per_page < self.total
+
+    @property
+    def has_previous(self):
+        return self.number > 1
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_page_number(self):
+        return self.number + 1
+
+    @property
+    def previous_page_number(self):
+        return self.number - 1
+
+
+def _index_sql(match):
+    """FROM/WHERE clause joining the index to the question table, its params and the rank ordering"""
+    table = Question._meta.db_table
+    if backend() == 'sqlite':
+        weights = ", ".join(str(weight) for weight in SQLITE_WEIGHTS)
+        return (
+            f"FROM {FTS_TABLE} JOIN {table} q ON q.id = {FTS_TABLE}.rowid WHERE {FTS_TABLE} MATCH %s",
+            [match],
+            f"bm25({FTS_TABLE}, {weights}), q.id",
+            [],
+        )
+    return (
+        f"FROM {PG_TABLE} s JOIN {table} q ON q.id = s.question_id "
+        f"WHERE s.document @@ to_tsquery('english', %s)",
+        [match],
+        "ts_rank(s.document, to_tsquery('english', %s)) DESC, q.id",
+        [match],
+    )
+
+
+def _filter_sql(filters, fields):
+    sql, params = "", []
+    columns = {'topic': 'q.topic_id', 'difficulty': 'q.difficulty', 'type': 'q.question_type'}
+    for name in fields:
+        if filters.get(name):
+            sql += f" AND {columns[name]} = %s"
+            params.append(filters[name])
+    return sql, params
+
+
+def _build_facets(groups, filters):
+    """
+    Topic counts honour the difficulty filter and difficulty counts honour the
+    topic filter, so each facet shows what picking one of its values would give.
+    """
+    topic, difficulty = filters.get('topic'), filters.get('difficulty')
+    topic_counts, difficulty_counts, total = {}, {}, 0
+    for topic_id, level, count in groups:
+        if not difficulty or str(level) == difficulty:
+            topic_counts[topic_id] = topic_counts.get(topic_id, 0) + count
+        if not topic or str(topic_id) == topic:
+            difficulty_counts[level] = difficulty_counts.get(level, 0) + count
+            if not difficulty or str(level) == difficulty:
+                total += count
+
+    names = dict(Topic.objects.filter(pk__in=topic_counts).values_list('pk', 'name'))
+    return total, {
+        'topics': sorted(
+            ((topic_id, names.get(topic_id, ""), count) for topic_id, count in topic_counts.items()),
+            key=lambda facet: (-facet[2], facet[1]),
+        ),
+        'difficulty': [
+            (level, label, difficulty_counts[level])
+            for level, label in Question.DIFFICULTY_LEVELS if level in difficulty_counts
+        ],
+    }
+
+
+def search_questions(query, filters=None, page=1, per_page=PER_PAGE):
+    """
+    Rank questions matching query, narrowed by the topic/difficulty/type
+    filters from queries.filter_questions(). Returns a SearchPage.
+    """
+    filters = filters or {}
+    try:
+        page = max(1, int(page or 1))
+    except (TypeError, ValueError):
+        page = 1
+
+    match = match_expression(query)
+    if match is None:
+        return SearchPage([], 0, page, per_page, {'topics': [], 'difficulty': []})
+    if not backend():
+        return _fallback_search(query, filters, page, per_page)
+
+    from_sql, match_params, order_sql, order_params = _index_sql(match)
+    type_sql, type_params = _filter_sql(filters, ['type'])
+    filter_sql, filter_params = _filter_sql(filters, ['topic', 'difficulty', 'type'])
+
+    with _database().cursor() as cursor:
+        cursor.execute(
+            f"SELECT topic_id, difficulty, COUNT(*) FROM "
+            f"(SELECT q.topic_id, q.difficulty {from_sql}{type_sql} LIMIT %s) matches "
+            f"GROUP BY topic_id, difficulty",
+            match_params + type_params + [FACET_LIMIT],
+        )
+        groups = cursor.fetchall()
+        capped = sum(count for _, _, count in groups) >= FACET_LIMIT
+        total, facets = _build_facets(groups, filters)
+
+        cursor.execute(
+            f"SELECT q.id {from_sql}{filter_sql} ORDER BY {order_sql} LIMIT %s OFFSET %s",
+            match_params + filter_params + order_params + [per_page, (page - 1) * per_page],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+
+    found = Question.objects.select_related('topic', 'item_stats').in_bulk(ids)
+    return SearchPage([found[pk] for pk in ids if pk in found], total, page, per_page, facets, capped)
+
+
+def _fallback_search(query, filters, page, per_page):
+    condition = Q()
+    for term in re.findall(r'\w+', query):
+        condition &= (
+            Q(text__icontains=term) | Q(solution__icontains=term) | Q(option_a__icontains=term)
+            | Q(option_b__icontains=term) | Q(option_c__icontains=term) | Q(option_d__icontains=term)
+        )
+    matches = Question.objects.filter(condition)
+    if filters.get('type'):
+        matches = matches.filter(question_type=filters['type'])
+
+    groups = matches.values_list('topic_id', 'difficulty').annotate(n=Count('id')).order_by()
+    total, facets = _build_facets(groups, filters)
+
+    if filters.get('topic'):
+        matches = matches.filter(topic_id=filters['topic'])
+    if filters.get('difficulty'):
+        matches = matches.filter(difficulty=filters['difficulty'])
+    start = (page - 1) * per_page
+    object_list = list(matches.select_related('topic', 'item_stats').order_by('pk')[start:start + per_page])
+    return SearchPage(object_list, total, page, per_page, facets)
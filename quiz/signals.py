@@ -0,0 +1,71 @@
+# quiz/signals.py
+from collections import Counter
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import dedupe, pagecache, payloads, scheduler, search
+from .models import Question, Test, Topic, TopicNote
+from .stats import apply_deltas, stats_key
+
+
+@receiver(pre_save, sender=Question)
+def remember_question_stats_key(sender, instance, raw=False, **kwargs):
+    """Note the stored topic/difficulty/type so an edit can move the counts"""
+    instance._old_stats_key = None
+    if instance.pk and not raw:
+        old = Question.objects.filter(pk=instance.pk).values_list(
+            'topic_id', 'difficulty', 'question_type'
+        ).first()
+        instance._old_stats_key = old
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = Counter()
+    old_key = getattr(instance, '_old_stats_key', None)
+    if old_key:
+        deltas[old_key] -= 1
+    deltas[stats_key(instance)] += 1
+    apply_deltas(deltas)
+    pagecache.bump(instance.topic_id, old_key[0] if old_key else None)
+    payloads.invalidate(instance.pk)
+    search.index_questions([instance])
+    dedupe.index_questions([instance])
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    apply_deltas({stats_key(instance): -1})
+    pagecache.bump(instance.topic_id)
+    payloads.invalidate(instance.pk)
+    search.remove_questions([instance.pk])
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def topic_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        pagecache.bump(instance.pk)
+
+
+@receiver(post_save, sender=TopicNote)
+@receiver(post_delete, sender=TopicNote)
+def topic_note_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        pagecache.bump(instance.topic_id)
+
+
+@receiver(post_save, sender=Test)
+def test_saved(sender, instance, raw=False, **kwargs):
+    """The question sets depend on the topics and num_questions; rebuild them on next use"""
+    if not raw:
+        scheduler.invalidate(instance.pk)
+
+
+@receiver(m2m_changed, sender=Test.topics.through)
+def test_topics_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, Test):
+        scheduler.invalidate(instance.pk)
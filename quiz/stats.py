@@ -0,0 +1,71 @@
+# quiz/stats.py
+"""
+Maintenance of the TopicStats table.
+
+Question changes are expressed as deltas keyed by (topic_id, difficulty,
+question_type) and applied with F() updates, so keeping the counts current
+never has to scan the question table. rebuild_topic_stats() recomputes
+everything from scratch to repair drift.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Question, Topic, TopicStats
+
+DIFFICULTY_FIELDS = {1: 'easy_count', 2: 'medium_count', 3: 'hard_count'}
+TYPE_FIELDS = {'MCQ': 'mcq_count', 'NUM': 'num_count', 'TF': 'tf_count'}
+
+
+def stats_key(question):
+    return (question.topic_id, int(question.difficulty), question.question_type)
+
+
+def _field_deltas(deltas):
+    """Turn {(topic_id, difficulty, type): n} into {topic_id: {field: n}}"""
+    per_topic = defaultdict(Counter)
+    for (topic_id, difficulty, question_type), n in deltas.items():
+        if not n:
+            continue
+        counts = per_topic[topic_id]
+        counts['question_count'] += n
+        counts[DIFFICULTY_FIELDS[difficulty]] += n
+        counts[TYPE_FIELDS[question_type]] += n
+    return per_topic
+
+
+@transaction.atomic
+def apply_deltas(deltas):
+    """Add the given per-key question count deltas to TopicStats"""
+    per_topic = _field_deltas(deltas)
+
+    # Rows only need creating for topics that gain questions; a decrement on
+    # a missing row (e.g. while its topic is being deleted) is a no-op
+    growing = [topic_id for topic_id, counts in per_topic.items() if counts['question_count'] > 0]
+    if growing:
+        TopicStats.objects.bulk_create(
+            [TopicStats(topic_id=topic_id) for topic_id in growing],
+            ignore_conflicts=True,
+        )
+
+    for topic_id, counts in per_topic.items():
+        changes = {field: F(field) + n for field, n in counts.items() if n}
+        if changes:
+            TopicStats.objects.filter(topic_id=topic_id).update(**changes)
+
+
+@transaction.atomic
+def rebuild_topic_stats():
+    """Recompute every TopicStats row from the question table"""
+    rows = Question.objects.values('topic_id', 'difficulty', 'question_type').annotate(n=Count('id'))
+    per_topic = _field_deltas({
+        (row['topic_id'], row['difficulty'], row['question_type']): row['n'] for row in rows
+    })
+
+    TopicStats.objects.all().delete()
+    TopicStats.objects.bulk_create([
+        TopicStats(topic_id=topic_id, **per_topic.get(topic_id, {}))
+        for topic_id in Topic.objects.values_list('pk', flat=True)
+    ])
+    return len(per_topic)
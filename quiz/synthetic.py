@@ -0,0 +1,438 @@
+# quiz/synthetic.py
+"""
+Deterministic synthetic data for benchmarks at production scale.
+
+generate() adds topics, users, questions, attempts with their answers, and
+bookmarks, shaped like real usage:
+
+- topic sizes and popularity follow a Zipf curve, so a few topics hold most
+  of the questions and get most of the quizzes;
+- questions mix MCQ, TF and NUM with LaTeX in the text and options, and a
+  known correct answer;
+- every student has an ability, and answers are right as often as their
+  ability and the question's difficulty allow, so scores, accuracies and
+  item statistics look real.
+
+Rows are built in fixed-size chunks, each from its own generator seeded by
+(seed, table, chunk). The same seed therefore gives the same rows however
+many worker processes built them; only the timestamps move, as they end at
+the time of generation. Workers (forked, where the platform allows) only
+build rows. The calling process inserts them chunk by chunk in order, with
+bulk_create or, on SQLite, a raw executemany that skips model instances
+entirely. Topics, users, questions and attempts get explicit ids after the
+current maximum, so attempts can refer to questions without reading them
+back.
+
+Signals do not fire for bulk inserts: TopicStats is rebuilt at the end, and
+the search index, rendered LaTeX, mastery and leaderboards are left to
+their rebuild commands.
+"""
+import json
+import multiprocessing
+import random
+from array import array
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import timedelta, timezone as dt_timezone
+from itertools import accumulate
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Answer, Attempt, Bookmark, Question, Topic, User
+from .stats import rebuild_topic_stats
+
+# Rows per chunk: the unit of determinism, parallelism and transactions
+CHUNK_SIZES = {'users': 10_000, 'questions': 10_000, 'attempts': 5_000, 'bookmarks': 500}
+BATCH_SIZE = 10_000
+SQLITE_CACHE_KB = 256 * 1024
+
+QUESTION_TYPES = ('MCQ', 'TF', 'NUM')
+TYPE_WEIGHTS = (70, 15, 15)
+DIFFICULTY_WEIGHTS = (45, 35, 20)
+# Chance of a right answer relative to the student's ability, by difficulty
+DIFFICULTY_FACTOR = {1: 1.0, 2: 0.8, 3: 0.55}
+QUESTIONS_PER_ATTEMPT = 10
+# Share of attempts still running, and of questions left blank
+UNFINISHED = 0.03
+SKIPPED = 0.04
+HISTORY_DAYS = 180
+
+FIRST_NAMES = ('Aarav', 'Ananya', 'Diya', 'Ishaan', 'Kavya', 'Meera', 'Nikhil', 'Priya', 'Rahul', 'Sneha', 'Vivek', 'Zara')
+LAST_NAMES = ('Iyer', 'Khan', 'Menon', 'Nair', 'Patel', 'Rao', 'Sharma', 'Singh', 'Thomas', 'Varma')
+MCQ_LETTERS = 'ABCD'
+
+# The plan of the current generate() call, inherited by forked workers
+_plan = None
+
+
+class Plan:
+    """Everything a worker needs to build any chunk"""
+
+    def __init__(self, seed, counts, starts, topic_sizes, now, password):
+        self.seed = seed
+        self.counts = counts
+        self.starts = starts
+        self.now = now
+        self.password = password
+        self.topic_sizes = topic_sizes
+        # Question index where each topic's block begins, and cumulative weights to pick popular topics
+        self.topic_offsets = [0] + list(accumulate(topic_sizes))[:-1]
+        self.topic_weights = list(accumulate(topic_sizes))
+        # Per question: type index, difficulty and correct-answer code, filled in after the questions
+        self.kinds = array('b')
+        self.difficulties = array('b')
+        self.corrects = array('i')
+
+    def rng(self, table, chunk):
+        return random.Random(f'{self.seed}:{table}:{chunk}')
+
+    def _chunked(self, table):
+        # Bookmarks are built per user
+        return self.counts['users' if table == 'bookmarks' else table]
+
+    def chunks(self, table):
+        size = CHUNK_SIZES[table]
+        return range((self._chunked(table) + size - 1) // size)
+
+    def chunk_range(self, table, chunk):
+        size = CHUNK_SIZES[table]
+        return range(chunk * size, min((chunk + 1) * size, self._chunked(table)))
+
+
+def zipf_sizes(total, buckets, exponent=1.0):
+    """Split total into buckets sized like a Zipf distribution, largest first"""
+    if not buckets:
+        return []
+    weights = [1 / rank ** exponent for rank in range(1, buckets + 1)]
+    scale = total / sum(weights)
+    sizes = [int(weight * scale) for weight in weights]
+    sizes[0] += total - sum(sizes)
+    return sizes
+
+
+def ability(user_index):
+    """A student's chance (0.35-0.95) of answering an easy question right"""
+    return 0.35 + 0.6 * ((user_index * 2654435761) % 1000) / 1000
+
+
+def correct_text(kind, code):
+    if kind == 'MCQ':
+        return MCQ_LETTERS[code]
+    if kind == 'TF':
+        return 'True' if code else 'False'
+    return str(code)
+
+
+def student_answer(rng, kind, correct, chance):
+    """A typed answer that is right with the given chance, otherwise a plausible wrong one"""
+    if rng.random() < chance:
+        return correct
+    if kind == 'MCQ':
+        return rng.choice([letter for letter in MCQ_LETTERS if letter != correct])
+    if kind == 'TF':
+        return 'False' if correct == 'True' else 'True'
+    return str(int(correct) + rng.choice((-2, -1, 1, 2, 10)))
+
+
+# Question templates: each returns (text, options or None, correct-answer code, solution)
+
+def _integral(rng):
+    upper, power = rng.randint(2, 9), rng.randint(1, 6)
+    right = f"$\\frac{{{upper}^{{{power + 1}}}}}{{{power + 1}}}$"
+    wrong = [
+        f"$\\frac{{{upper}^{{{power}}}}}{{{power}}}$",
+        f"${upper}^{{{power + 1}}}$",
+        f"$\\frac{{{upper}^{{{power + 2}}}}}{{{power + 2}}}$",
+    ]
+    text = f"Evaluate $\\displaystyle\\int_{{0}}^{{{upper}}} x^{{{power}}}\\,dx$."
+    solution = f"$\\int_0^{{{upper}}} x^{{{power}}}\\,dx = \\left[\\frac{{x^{{{power + 1}}}}}{{{power + 1}}}\\right]_0^{{{upper}}}$"
+    return _shuffled(rng, text, right, wrong, solution)
+
+
+def _derivative(rng):
+    a, b = rng.randint(2, 9), rng.randint(2, 9)
+    right = f"${a}\\cos({a}x)e^{{{b}x}} + {b}\\sin({a}x)e^{{{b}x}}$"
+    wrong = [
+        f"${a}\\cos({a}x)e^{{{b}x}}$",
+        f"$-{a}\\cos({a}x)e^{{{b}x}} + {b}\\sin({a}x)e^{{{b}x}}$",
+        f"${a * b}\\cos({a}x)e^{{{b}x}}$",
+    ]
+    text = f"Find $\\frac{{d}}{{dx}}\\left(\\sin({a}x)\\,e^{{{b}x}}\\right)$."
+    return _shuffled(rng, text, right, wrong, "Apply the product rule, then the chain rule to each factor.")
+
+
+def _limit(rng):
+    a, n = rng.randint(1, 6), rng.randint(2, 5)
+    right = f"${n * a ** (n - 1)}$"
+    wrong = [f"${a ** n}$", f"${n * a ** n}$", f"${(n - 1) * a ** (n - 1)}$"]
+    text = f"Compute $\\lim_{{x \\to {a}}} \\frac{{x^{{{n}}} - {a ** n}}}{{x - {a}}}$."
+    return _shuffled(rng, text, right, wrong, f"This is the derivative of $x^{{{n}}}$ at $x = {a}$.")
+
+
+def _shuffled(rng, text, right, wrong, solution):
+    options = wrong[:]
+    code = rng.randrange(4)
+    options.insert(code, right)
+    return text, options, code, solution
+
+
+def _prime(rng):
+    n = rng.randint(2, 200)
+    is_prime = all(n % d for d in range(2, int(n ** 0.5) + 1))
+    return f"True or false: ${n}$ is a prime number.", None, int(is_prime), None
+
+
+def _root(rng):
+    n = rng.randint(2, 150)
+    rational = int(n ** 0.5) ** 2 == n
+    return f"True or false: $\\sqrt{{{n}}} \\in \\mathbb{{Q}}$.", None, int(rational), None
+
+
+def _determinant(rng):
+    a, b, c, d = (rng.randint(-9, 9) for _ in range(4))
+    text = f"Let $A = \\begin{{pmatrix}} {a} & {b} \\\\ {c} & {d} \\end{{pmatrix}}$. Find $\\det A$."
+    return text, None, a * d - b * c, f"$\\det A = ({a})({d}) - ({b})({c})$"
+
+
+def _series(rng):
+    n = rng.randint(5, 60)
+    text = f"Compute $\\displaystyle\\sum_{{k=1}}^{{{n}}} k$."
+    return text, None, n * (n + 1) // 2, f"$\\sum_{{k=1}}^{{n}} k = \\frac{{n(n+1)}}{{2}}$"
+
+
+TEMPLATES = {'MCQ': (_integral, _derivative, _limit), 'TF': (_prime, _root), 'NUM': (_determinant, _series)}
+
+
+def _past(rng, plan, days=HISTORY_DAYS):
+    return plan.now - timedelta(seconds=rng.random() * days * 86400)
+
+
+def user_rows(chunk):
+    plan = _plan
+    rng = plan.rng('users', chunk)
+    rows = []
+    for i in plan.chunk_range('users', chunk):
+        pk = plan.starts['users'] + i
+        username = f"synthetic{pk}"
+        rows.append((
+            pk, plan.password, None, False, username, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+            f"{username}@example.com", False, True, _past(rng, plan, 365), False, True,
+        ))
+    return rows, None
+
+
+def question_rows(chunk):
+    plan = _plan
+    rng = plan.rng('questions', chunk)
+    rows = []
+    kinds, difficulties, corrects = array('b'), array('b'), array('i')
+    for i in plan.chunk_range('questions', chunk):
+        topic = bisect_right(plan.topic_offsets, i) - 1
+        kind = rng.choices(QUESTION_TYPES, weights=TYPE_WEIGHTS)[0]
+        difficulty = rng.choices((1, 2, 3), weights=DIFFICULTY_WEIGHTS)[0]
+        text, options, code, solution = rng.choice(TEMPLATES[kind])(rng)
+        options = options or [None] * 4
+        rows.append((
+            plan.starts['questions'] + i, plan.starts['topics'] + topic, text, kind, difficulty, 1.0,
+            *options, correct_text(kind, code), solution, None, _past(rng, plan, 2 * HISTORY_DAYS), {},
+        ))
+        kinds.append(QUESTION_TYPES.index(kind))
+        difficulties.append(difficulty)
+        corrects.append(code)
+    return rows, (kinds, difficulties, corrects)
+
+
+def attempt_rows(chunk):
+    """Attempts of this chunk, and their answers"""
+    plan = _plan
+    rng = plan.rng('attempts', chunk)
+    attempts, answers = [], []
+    users, questions = plan.counts['users'], plan.starts['questions']
+    for i in plan.chunk_range('attempts', chunk):
+        pk = plan.starts['attempts'] + i
+        # Some students take far more quizzes than others
+        user = int(users * rng.random() ** 2)
+        topic = rng.choices(range(len(plan.topic_sizes)), cum_weights=plan.topic_weights)[0]
+        offset, size = plan.topic_offsets[topic], plan.topic_sizes[topic]
+        drawn = rng.sample(range(offset, offset + size), min(QUESTIONS_PER_ATTEMPT, size))
+        started = _past(rng, plan)
+        finished = rng.random() >= UNFINISHED
+        answered = drawn if finished else drawn[:rng.randrange(len(drawn) + 1)]
+
+        score = 0.0
+        for index in answered:
+            if rng.random() < SKIPPED:
+                continue
+            kind, difficulty = QUESTION_TYPES[plan.kinds[index]], plan.difficulties[index]
+            correct = correct_text(kind, plan.corrects[index])
+            typed = student_answer(rng, kind, correct, ability(user) * DIFFICULTY_FACTOR[difficulty])
+            right = finished and typed == correct
+            score += right
+            answers.append((pk, questions + index, None, typed, right, float(right)))
+        attempts.append((
+            pk, plan.starts['users'] + user, None, plan.starts['topics'] + topic,
+            [questions + index for index in drawn], rng.randrange(2 ** 31), started,
+            started + timedelta(minutes=rng.uniform(3, 40)) if finished else None, score,
+        ))
+    return attempts, answers
+
+
+def bookmark_rows(chunk):
+    plan = _plan
+    rng = plan.rng('bookmarks', chunk)
+    rows = []
+    mean = plan.counts['bookmarks'] / max(plan.counts['users'], 1)
+    for i in plan.chunk_range('bookmarks', chunk):
+        count = min(int(rng.expovariate(1 / mean)) if mean else 0, plan.counts['questions'])
+        for index in rng.sample(range(plan.counts['questions']), count):
+            rows.append((plan.starts['users'] + i, plan.starts['questions'] + index, _past(rng, plan)))
+    return rows, None
+
+
+def _sqlite_datetime(value):
+    # As the SQLite backend stores them: naive UTC
+    return None if value is None else str(value.astimezone(dt_timezone.utc).replace(tzinfo=None))
+
+
+def _sqlite_json(value):
+    return json.dumps(value)
+
+
+@contextmanager
+def _given_timestamps(model):
+    """Let bulk_create keep generated values in the model's auto_now_add fields"""
+    fields = [field for field in model._meta.concrete_fields if getattr(field, 'auto_now_add', False)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Writer:
+    """Inserts row tuples (concrete fields in order, the id optional) into one model's table"""
+
+    def __init__(self, model, with_pk=True, raw=False):
+        self.model = model
+        self.with_pk = with_pk
+        self.raw = raw
+        fields = model._meta.concrete_fields if with_pk else [f for f in model._meta.concrete_fields if not f.primary_key]
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        self.sql = (
+            f"INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) "
+            f"VALUES ({', '.join(['%s'] * len(fields))})"
+        )
+        # Columns whose Python values need converting for SQLite; done here rather than
+        # through the fields, which costs more than the insert itself
+        converters = {'DateTimeField': _sqlite_datetime, 'JSONField': _sqlite_json}
+        self.converters = [
+            (n, converters[field.get_internal_type()])
+            for n, field in enumerate(fields)
+            if field.get_internal_type() in converters
+        ]
+
+    def write(self, rows):
+        if not rows:
+            return
+        if self.raw and connection.vendor == 'sqlite' and not connection.in_atomic_block:
+            with connection.cursor() as cursor:
+                # Durability is pointless for data that can be regenerated, and a big page cache
+                # keeps the indexes in memory; both last for this connection only
+                cursor.execute('PRAGMA synchronous = OFF')
+                cursor.execute(f'PRAGMA cache_size = -{SQLITE_CACHE_KB}')
+        with transaction.atomic():
+            if self.raw:
+                with connection.cursor() as cursor:
+                    cursor.executemany(self.sql, [self.prepare(row) for row in rows])
+            else:
+                objs = [self.model(*row) if self.with_pk else self.model(None, *row) for row in rows]
+                with _given_timestamps(self.model):
+                    self.model.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+
+    def prepare(self, row):
+        row = list(row)
+        for n, convert in self.converters:
+            row[n] = convert(row[n])
+        return row
+
+
+def _next_id(model):
+    return (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+
+def _build(func, chunks, workers):
+    """Yield func(chunk) for every chunk, in order, from worker processes when asked"""
+    if workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        # Workers only build rows; they inherit the plan and never touch the database
+        connection.close()
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            yield from pool.imap(func, chunks)
+    else:
+        yield from map(func, chunks)
+
+
+def generate(topics=200, users=5000, questions=1_000_000, attempts=500_000, bookmarks=200_000,
+             seed=42, password='!', workers=1, raw=None, progress=None):
+    """
+    Add synthetic rows to the database and return {table: rows added}.
+    password is the stored hash of every user ('!' cannot log in). On
+    SQLite rows go in through the raw fast path unless raw is False. progress(table, done, total) is
+    called after each chunk.
+    """
+    global _plan
+    if attempts and not (users and questions):
+        raise ValueError("Attempts need users and questions")
+    if bookmarks and not (users and questions):
+        raise ValueError("Bookmarks need users and questions")
+    raw = connection.vendor == 'sqlite' and raw is not False
+
+    counts = {'topics': topics, 'users': users, 'questions': questions, 'attempts': attempts, 'bookmarks': bookmarks}
+    starts = {
+        'topics': _next_id(Topic), 'users': _next_id(User),
+        'questions': _next_id(Question), 'attempts': _next_id(Attempt),
+    }
+    _plan = plan = Plan(seed, counts, starts, zipf_sizes(questions, topics), timezone.now(), password)
+    added = dict.fromkeys([*counts, 'answers'], 0)
+    progress = progress or (lambda table, done, total: None)
+
+    Writer(Topic, raw=raw).write([
+        (starts['topics'] + i, f"Synthetic topic {starts['topics'] + i}", plan.now) for i in range(topics)
+    ])
+    added['topics'] = topics
+
+    writers = {
+        'users': [Writer(User, raw=raw)],
+        'questions': [Writer(Question, raw=raw)],
+        'attempts': [Writer(Attempt, raw=raw), Writer(Answer, with_pk=False, raw=raw)],
+        'bookmarks': [Writer(Bookmark, with_pk=False, raw=raw)],
+    }
+    builders = {'users': user_rows, 'questions': question_rows, 'attempts': attempt_rows, 'bookmarks': bookmark_rows}
+    try:
+        for table in ('users', 'questions', 'attempts', 'bookmarks'):
+            chunks = plan.chunks(table)
+            for done, (rows, extra) in enumerate(_build(builders[table], chunks, workers), 1):
+                writers[table][0].write(rows)
+                added[table] += len(rows)
+                if table == 'questions':
+                    kinds, difficulties, corrects = extra
+                    plan.kinds.extend(kinds)
+                    plan.difficulties.extend(difficulties)
+                    plan.corrects.extend(corrects)
+                elif table == 'attempts':
+                    writers[table][1].write(extra)
+                    added['answers'] += len(extra)
+                progress(table, done, len(chunks))
+    finally:
+        _plan = None
+
+    # Explicit ids leave sequences behind on PostgreSQL and Oracle
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Topic, User, Question, Attempt]):
+            cursor.execute(sql)
+    rebuild_topic_stats()
+    return added
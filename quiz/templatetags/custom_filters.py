@@ -1,7 +1,14 @@
 from django import template
 
+from quiz.rendering import markup
+
 register = template.Library()
 
 @register.filter
 def get_item(dictionary, key):
-    return dictionary.get(key)
\ No newline at end of file
+    return dictionary.get(key)
+
+@register.filter
+def rendered(question, field):
+    """Pre-rendered markup for a question field, or its escaped source if there is none"""
+    return markup(question, field)
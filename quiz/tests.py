@@ -1,3 +1,944 @@
-from django.test import TestCase
+import csv
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count
+from django.template import Context, Template
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    async_views, dedupe, grading, item_stats, leaderboard, mastery, payloads, rendering, sampling, scheduler, search,
+    stats, synthetic,
+)
+from .database import ReplicaRouter, read_replica
+from .engine import RESULTS_SESSION_KEY, attempt_results, submit_attempt
+from .forms import QuestionForm
+from .importer import NOT_UTF8
+from .management.commands import benchmark_journey, cluster_questions
+from .pagination import encode_cursor, keyset_paginate
+from .models import (
+    Answer, Attempt, Question, QuestionFingerprint, Test, Topic, TopicMastery, TopicNote, TopicStats, User,
+)
+
+
+class QuizTestCase(TestCase):
+    """A student and a topic of MCQs whose correct option is A"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='secret')
+        cls.topic = Topic.objects.create(name='Algebra')
+        cls.questions = [
+            Question.objects.create(
+                topic=cls.topic, text=f'Question {n}', question_type='MCQ', difficulty=n % 3 + 1,
+                option_a='1', option_b='2', option_c='3', option_d='4', correct_option='A',
+            )
+            for n in range(6)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.student)
+
+    def start_quiz(self):
+        self.client.get(reverse('take_quiz', args=[self.topic.pk]))
+        return Attempt.objects.get(user=self.student, finished_at__isnull=True)
+
+    def post_json(self, name, attempt, answers=None):
+        return self.client.post(
+            reverse(name, args=[attempt.pk]),
+            json.dumps({'answers': {str(pk): value for pk, value in (answers or {}).items()}}),
+            content_type='application/json',
+        )
+
+    def submit(self, attempt, answers=None):
+        return self.post_json('api_attempt_submit', attempt, answers)
+
+
+class SubmitGradingTests(QuizTestCase):
+    def test_submit_grades_every_answer(self):
+        attempt = self.start_quiz()
+        first, second, *rest = attempt.question_ids
+        response = self.submit(attempt, {first: 'A', second: 'b'})
+
+        self.assertEqual(response.json(), {'redirect': reverse('quiz_results')})
+        attempt.refresh_from_db()
+        self.assertIsNotNone(attempt.finished_at)
+        self.assertEqual(attempt.score, 1.0)
+        graded = dict(Answer.objects.filter(attempt=attempt).values_list('question_id', 'is_correct'))
+        self.assertEqual(graded, {first: True, second: False, **{pk: False for pk in rest}})
+
+    def test_answer_key_is_read_from_the_database(self):
+        attempt = self.start_quiz()
+        first = attempt.question_ids[0]
+        payloads.warm(attempt.question_ids)
+        # A bulk update does not drop the cached questions
+        Question.objects.filter(pk=first).update(correct_option='B')
+
+        self.submit(attempt, {first: 'B'})
+        self.assertTrue(Answer.objects.get(attempt=attempt, question_id=first).is_correct)
+
+    def test_per_process_cache_keeps_questions_briefly(self):
+        self.assertEqual(payloads._timeout(), payloads.PAYLOAD_TIMEOUT)
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            # Other workers never hear of an edit, so their copies must expire soon
+            self.assertEqual(payloads._timeout(), payloads.LOCAL_PAYLOAD_TIMEOUT)
+
+
+class RegradeTests(QuizTestCase):
+    def test_regrade_after_an_answer_key_change(self):
+        rival = User.objects.create_user('rival')
+        leaderboard.record_attempt(Attempt.objects.create(
+            user=rival, topic=self.topic, score=2.0, finished_at=timezone.now(),
+        ))
+        attempt = self.start_quiz()
+        first, second, third = attempt.question_ids[:3]
+        self.submit(attempt, {first: 'B', second: 'B', third: 'A'})
+        board = leaderboard.get_board('topic', self.topic.pk)
+        self.assertEqual(board.rank(self.student.pk), (2, 1.0))
+
+        # A bulk update, as a fix to the key would be applied
+        Question.objects.filter(pk__in=[first, second]).update(correct_option='B')
+        grading.grade_attempts(Attempt.objects.filter(pk=attempt.pk))
+
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.score, 3.0)
+        graded = dict(Answer.objects.filter(attempt=attempt).values_list('question_id', 'is_correct'))
+        self.assertTrue(graded[first] and graded[second] and graded[third])
+        self.assertEqual(board.rank(self.student.pk), (1, 3.0))
+        self.assertEqual(board.rank(rival.pk), (2, 2.0))
+
+        def correct_counts():
+            return sorted(TopicMastery.objects.filter(user=self.student).values_list('difficulty', 'attempts', 'correct'))
+
+        regraded = correct_counts()
+        self.assertEqual(sum(correct for _, _, correct in regraded), 3)
+        mastery.rebuild_mastery()
+        self.assertEqual(correct_counts(), regraded)
+
+
+class ResultsPageTests(QuizTestCase):
+    def test_results_are_read_from_the_attempt_in_one_query(self):
+        attempt = self.start_quiz()
+        first, second = attempt.question_ids[:2]
+        self.submit(attempt, {first: 'A', second: 'C'})
+        session = self.client.session
+        self.assertEqual(session[RESULTS_SESSION_KEY], attempt.pk)
+        self.assertNotIn('quiz_results', session)
+
+        with self.assertNumQueries(1):
+            data = attempt_results(attempt.pk, self.student)
+        self.assertEqual((data['score'], data['total'], data['topic_name']), (1, len(attempt.question_ids), 'Algebra'))
+        texts = dict(Question.objects.values_list('pk', 'text'))
+        self.assertEqual([row['question_text'] for row in data['results']], [texts[pk] for pk in attempt.question_ids])
+        self.assertEqual([row['user_answer'] for row in data['results'][:3]], ['A', 'C', 'No answer'])
+
+        response = self.client.get(reverse('quiz_results'))
+        self.assertContains(response, texts[first])
+        self.assertIsNone(attempt_results(attempt.pk, User.objects.create_user('someone')))
+
+    def test_unfinished_attempts_have_no_results(self):
+        attempt = self.start_quiz()
+        self.assertIsNone(attempt_results(attempt.pk, self.student))
+        self.assertRedirects(self.client.get(reverse('quiz_results')), reverse('select_topic'))
+
+
+class AnswerLengthTests(QuizTestCase):
+    def test_api_rejects_answers_longer_than_the_column(self):
+        attempt = self.start_quiz()
+        first = attempt.question_ids[0]
+        response = self.post_json('api_attempt_answers', attempt, {first: 'x' * 256})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Answer.objects.filter(attempt=attempt).exists())
+        self.assertEqual(self.post_json('api_attempt_answers', attempt, {first: 'x' * 255}).json(), {'saved': 1})
+
+    def test_quiz_form_cuts_long_answers(self):
+        attempt = self.start_quiz()
+        url = reverse('take_quiz', args=[self.topic.pk])
+        self.assertContains(self.client.get(url), 'maxlength="255"')
+        self.client.post(url, {'action': 'next', 'answer': 'x' * 300})
+        self.assertEqual(Answer.objects.get(attempt=attempt).typed_answer, 'x' * 255)
+
+
+class DoubleSubmitTests(QuizTestCase):
+    def test_second_submit_returns_the_first_grading(self):
+        attempt = self.start_quiz()
+        first = attempt.question_ids[0]
+        self.post_json('api_attempt_answers', attempt, {first: 'A'})
+        # Both requests loaded the attempt before either finished it
+        stale = Attempt.objects.get(pk=attempt.pk)
+
+        graded = submit_attempt(attempt)
+        finished_at = Attempt.objects.get(pk=attempt.pk).finished_at
+        Answer.objects.filter(attempt=attempt, question_id=first).update(typed_answer='B')
+        again = submit_attempt(stale)
+
+        self.assertEqual([q.pk for q, _ in again], [q.pk for q, _ in graded])
+        self.assertEqual(stale.finished_at, finished_at)
+        self.assertEqual(stale.score, 1.0)
+        # Not regraded
+        self.assertTrue(Answer.objects.get(attempt=attempt, question_id=first).is_correct)
+
+    def test_mastery_counts_an_attempt_once(self):
+        attempt = self.start_quiz()
+        stale = Attempt.objects.get(pk=attempt.pk)
+        submit_attempt(attempt)
+        submit_attempt(stale)
+
+        rows = TopicMastery.objects.filter(user=self.student, topic=self.topic)
+        self.assertEqual(sum(row.attempts for row in rows), len(attempt.question_ids))
+
+    def test_repeated_form_submit_shows_the_results(self):
+        attempt = self.start_quiz()
+        url = reverse('take_quiz', args=[self.topic.pk])
+        self.client.post(url, {'action': 'submit', 'answer': 'A'})
+        response = self.client.post(url, {'action': 'submit', 'answer': 'A'})
+
+        self.assertRedirects(response, reverse('quiz_results'))
+        self.assertEqual(Attempt.objects.filter(user=self.student).count(), 1)
+        attempt.refresh_from_db()
+        self.assertIsNotNone(attempt.finished_at)
+
+
+class AutosaveTests(QuizTestCase):
+    # LocMemCache's add and incr are atomic within this one process, which stands in for Redis
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                           'LOCATION': 'autosave-buffer'}})
+    @mock.patch('quiz.autosave.has_atomic_counters', return_value=True)
+    def test_buffered_answers_are_graded_on_submit(self, atomic):
+        attempt = self.start_quiz()
+        first, second = attempt.question_ids[:2]
+        response = self.post_json('api_attempt_autosave', attempt, {first: 'A', second: 'C'})
+        self.assertEqual(response.json(), {'buffered': 2})
+        self.post_json('api_attempt_autosave', attempt, {second: 'A'})
+
+        self.submit(attempt)
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.score, 2.0)
+        # Attempt ids are reused after the test's rollback; the buffer must not outlive it
+        cache.clear()
+        graded = dict(Answer.objects.filter(attempt=attempt, question_id__in=[first, second])
+                      .values_list('question_id', 'typed_answer'))
+        self.assertEqual(graded, {first: 'A', second: 'A'})
+
+    def test_database_cache_writes_through_at_the_cost_of_a_direct_save(self):
+        attempt = self.start_quiz()
+        first, second = attempt.question_ids[:2]
+        self.post_json('api_attempt_answers', attempt, {first: 'B'})
+        self.post_json('api_attempt_autosave', attempt, {second: 'B'})
+
+        with self.assertNumQueries(5):
+            self.post_json('api_attempt_answers', attempt, {first: 'A'})
+        with self.assertNumQueries(5):
+            response = self.post_json('api_attempt_autosave', attempt, {second: 'A'})
+        self.assertEqual(response.json(), {'saved': 1})
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_per_process_cache_writes_answers_through(self):
+        attempt = self.start_quiz()
+        first = attempt.question_ids[0]
+        response = self.post_json('api_attempt_autosave', attempt, {first: 'A'})
+
+        self.assertEqual(response.json(), {'saved': 1})
+        self.assertEqual(Answer.objects.get(attempt=attempt, question_id=first).typed_answer, 'A')
+        self.submit(attempt)
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.score, 1.0)
+
+
+class KeysetCursorTests(QuizTestCase):
+    def page(self, **cursors):
+        return keyset_paginate(Question.objects.filter(topic=self.topic), 4, **cursors)
+
+    def test_cursors_walk_the_pages(self):
+        first = self.page()
+        second = self.page(after=first.next_cursor)
+        self.assertEqual(len(second), 2)
+        self.assertFalse(second.has_next)
+        self.assertEqual(list(self.page(before=second.previous_cursor)), list(first))
+
+    def test_tampered_cursors_start_from_the_first_page(self):
+        first = [question.pk for question in self.page()]
+        tampered = [
+            'not base64!', encode_cursor({'id': 1}), encode_cursor([1, 2]),
+            encode_cursor(['hard', 'yesterday', 'me']), encode_cursor([[1], None, {}]),
+        ]
+        for cursor in tampered:
+            for direction in ('after', 'before'):
+                page = self.page(**{direction: cursor})
+                self.assertEqual([question.pk for question in page], first, (direction, cursor))
+                self.assertFalse(page.has_previous)
+
+    def test_practice_page_survives_a_tampered_cursor(self):
+        url = reverse('practice_questions', args=[self.topic.pk])
+        response = self.client.get(url, {'after': encode_cursor(['hard', 'yesterday', 'me'])})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.questions[0].text)
+
+
+class LeaderboardTests(QuizTestCase):
+    def finish(self, user, score, minutes_ago=0):
+        attempt = Attempt.objects.create(
+            user=user, topic=self.topic, score=score,
+            finished_at=timezone.now() - timedelta(minutes=minutes_ago),
+        )
+        leaderboard.record_attempt(attempt)
+        return attempt
+
+    def test_best_attempt_ranks_with_shared_ranks_for_ties(self):
+        alice, bob, carol = (User.objects.create_user(name) for name in ('alice', 'bob', 'carol'))
+        self.finish(alice, 3)
+        self.finish(alice, 5)
+        self.finish(alice, 4)
+        self.finish(bob, 5, minutes_ago=10)
+        self.finish(carol, 2)
+
+        board = leaderboard.get_board('topic', self.topic.pk)
+        self.assertEqual(len(board), 3)
+        self.assertEqual(
+            [(row['rank'], row['username'], row['score']) for row in board.top()],
+            # Equal scores share a rank; the earlier finish is listed first
+            [(1, 'bob', 5), (1, 'alice', 5), (3, 'carol', 2)],
+        )
+        self.assertEqual(board.rank(carol.pk), (3, 2))
+        self.assertIsNone(board.rank(self.student.pk))
+
+    def test_rebuild_matches_incremental_updates(self):
+        users = [User.objects.create_user(f'user{n}') for n in range(4)]
+        for n, user in enumerate(users):
+            for score in (n, 7 - n, 2):
+                self.finish(user, score, minutes_ago=n)
+        board = leaderboard.get_board('topic', self.topic.pk)
+        before = board.top()
+
+        counts = sorted(board.scores.values_list('score', 'students'))
+        ranks = [board.rank(user.pk) for user in users]
+
+        self.assertEqual(leaderboard.rebuild('topic', self.topic.pk), 4)
+        self.assertEqual(board.top(), before)
+        self.assertEqual(sorted(board.scores.filter(students__gt=0).values_list('score', 'students')),
+                         [row for row in counts if row[1]])
+        self.assertEqual([board.rank(user.pk) for user in users], ranks)
+
+    def test_rank_is_a_sum_over_score_counts(self):
+        users = [User.objects.create_user(f'user{n}') for n in range(30)]
+        for n, user in enumerate(users):
+            self.finish(user, n % 5)
+        self.finish(users[0], 9)
+        board = leaderboard.get_board('topic', self.topic.pk)
+
+        self.assertEqual(len(board), 30)
+        self.assertEqual(board.rank(users[0].pk), (1, 9))
+        # Six students on each of 4, 3, 2 and 1 (one of the 0s moved up to 9)
+        self.assertEqual(board.rank(users[5].pk), (1 + 1 + 6 * 4, 0))
+        with self.assertNumQueries(2):
+            board.rank(users[5].pk)
+
+    def test_submit_updates_the_board(self):
+        attempt = self.start_quiz()
+        self.submit(attempt, {pk: 'A' for pk in attempt.question_ids})
+
+        response = self.client.get(reverse('leaderboard', args=['topic', self.topic.pk]))
+        self.assertEqual(response.context['my_rank'], (1, len(attempt.question_ids)))
+
+
+class ImportTests(QuizTestCase):
+    header = 'topic,text,question_type,difficulty,option_a,option_b,option_c,option_d,correct_option\n'
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('teacher', is_staff=True))
+
+    def upload(self, name, content):
+        return self.client.post(reverse('question_import'), {
+            'file': SimpleUploadedFile(name, content), 'create_topics': 'on',
+        })
+
+    def test_students_cannot_import(self):
+        self.client.force_login(self.student)
+        response = self.upload('bank.csv', (self.header + 'Algebra,Sneaky,MCQ,1,1,2,3,4,A\n').encode())
+
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Question.objects.filter(text='Sneaky').exists())
+
+    def test_bad_rows_are_reported_and_the_rest_imported(self):
+        response = self.upload('bank.csv', (
+            self.header
+            + 'Algebra,What is 1+1?,MCQ,1,1,2,3,4,B\n'
+            + 'Algebra,,MCQ,1,1,2,3,4,B\n'
+            + 'Algebra,Hard one,MCQ,5,1,2,3,4,B\n'
+        ).encode())
+
+        result = response.context['result']
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.errors, [(3, 'text is required.'), (4, 'difficulty must be 1, 2 or 3.')])
+        self.assertTrue(Question.objects.filter(text='What is 1+1?').exists())
+
+    def test_values_longer_than_their_columns(self):
+        response = self.upload('bank.csv', (
+            self.header
+            + 'Algebra,Big number,NUM,1,,,,,' + '9' * 51 + '\n'
+            + 'T' * 101 + ',Long topic,NUM,1,,,,,1\n'
+            + 'Algebra,Fits,NUM,1,,,,,' + '9' * 50 + '\n'
+        ).encode())
+
+        result = response.context['result']
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.errors, [
+            (2, 'correct_option is longer than 50 characters.'), (3, 'topic is longer than 100 characters.'),
+        ])
+
+    def test_file_that_is_not_utf8(self):
+        response = self.upload('bank.csv', (
+            self.header
+            + 'Algebra,Plain ASCII,MCQ,1,1,2,3,4,A\n'
+            + 'Algebra,Caf\xe9 prices,MCQ,1,1,2,3,4,A\n'
+        ).encode('latin-1'))
+
+        self.assertEqual(response.status_code, 200)
+        result = response.context['result']
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.errors, [(3, NOT_UTF8)])
+
+    def test_malformed_csv(self):
+        response = self.upload('bank.csv', (
+            self.header
+            + 'Algebra,' + 'x' * (csv.field_size_limit() + 1) + ',MCQ,1,1,2,3,4,A\n'
+            + 'Algebra,Fine,MCQ,1,1,2,3,4,A\n'
+        ).encode())
+
+        self.assertEqual(response.status_code, 200)
+        result = response.context['result']
+        self.assertEqual(result.created, 1)
+        self.assertEqual(len(result.errors), 1)
+        self.assertTrue(result.errors[0][1].startswith('Malformed CSV:'))
+
+    def test_invalid_json_lines(self):
+        row = {'topic': 'Algebra', 'text': 'Fine', 'question_type': 'MCQ', 'difficulty': 1,
+               'option_a': '1', 'option_b': '2', 'option_c': '3', 'option_d': '4', 'correct_option': 'A'}
+        response = self.upload('bank.jsonl', b'\n'.join([
+            json.dumps(row).encode(), b'{"text": ', '{"text": "Caf\xe9"}'.encode('latin-1'), b'[1, 2]',
+        ]))
+
+        result = response.context['result']
+        self.assertEqual(result.created, 1)
+        self.assertEqual([line for line, _ in result.errors], [2, 3, 4])
+        self.assertTrue(result.errors[0][1].startswith('Invalid JSON:'))
+        self.assertEqual(result.errors[1][1], NOT_UTF8)
+        self.assertEqual(result.errors[2][1], 'Row is not an object.')
+
+
+class ExportTests(QuizTestCase):
+    url = reverse('question_export')
+
+    def test_anonymous_users_are_sent_to_log_in(self):
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertRedirects(response, f"{reverse('login')}?next={self.url}", fetch_redirect_response=False)
+
+    def test_students_cannot_export(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(response.streaming)
+
+    def test_staff_export_the_bank(self):
+        self.client.force_login(User.objects.create_user('teacher', is_staff=True))
+        response = self.client.get(self.url, {'format': 'jsonl'})
+
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), len(self.questions))
+        self.assertEqual({row['correct_option'] for row in rows}, {'A'})
+
+
+class PracticePageTests(QuizTestCase):
+    def url(self):
+        return reverse('practice_questions', args=[self.topic.pk])
+
+    def test_unchanged_page_revalidates_with_304(self):
+        etag = self.client.get(self.url())['ETag']
+        response = self.client.get(self.url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_editing_a_question_changes_the_page(self):
+        etag = self.client.get(self.url())['ETag']
+        question = self.questions[0]
+        question.text = 'Rewritten question'
+        question.save()
+
+        response = self.client.get(self.url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Rewritten question')
+
+    def test_revalidating_an_unchanged_page_renders_nothing(self):
+        # The session, the user and the topic's version, plus the question's topic from the cache
+        pages = [
+            (self.url(), 3),
+            (reverse('practice_question_detail', args=[self.questions[0].pk]), 4),
+            (reverse('topic_note_view', args=[self.topic.pk]), 3),
+        ]
+        for url, queries in pages:
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200, url)
+            with self.assertNumQueries(queries):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(
+                self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304, url
+            )
+
+    def test_etag_changes_with_the_topic_and_the_user(self):
+        url = reverse('topic_note_view', args=[self.topic.pk])
+        etag = self.client.get(url)['ETag']
+        TopicNote.objects.create(topic=self.topic, content='Factor first')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Factor first')
+
+        etag = response['ETag']
+        self.client.force_login(User.objects.create_user('other'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_fragment_key_ignores_unknown_and_malformed_parameters(self):
+        key = self.client.get(self.url()).context['page_key']
+        for params in ({'utm_source': 'mail'}, {'after': 'not a cursor'}, {'difficulty': '9', 'x': '1'}):
+            self.assertEqual(self.client.get(self.url(), params).context['page_key'], key)
+        self.assertNotEqual(self.client.get(self.url(), {'difficulty': '1'}).context['page_key'], key)
+
+
+class SyntheticDataTests(TestCase):
+    def test_generate_fills_every_table(self):
+        for raw in (True, False):
+            added = synthetic.generate(topics=2, users=3, questions=20, attempts=4, bookmarks=2, raw=raw)
+            self.assertEqual({table: added[table] for table in ('topics', 'users', 'questions', 'attempts')},
+                             {'topics': 2, 'users': 3, 'questions': 20, 'attempts': 4})
+        self.assertEqual(Topic.objects.count(), 4)
+
+    def snapshot(self):
+        attempts = Attempt.objects.order_by('pk').values_list('score', 'finished_at')
+        return (
+            list(Question.objects.order_by('pk').values_list('text', 'question_type', 'difficulty', 'correct_option')),
+            [(score, finished is None) for score, finished in attempts],
+            list(Answer.objects.order_by('pk').values_list('question__text', 'typed_answer', 'is_correct')),
+        )
+
+    def test_same_seed_same_data_on_both_write_paths(self):
+        sizes = dict(topics=4, users=6, questions=60, attempts=12, bookmarks=0)
+        synthetic.generate(seed=7, raw=True, **sizes)
+        first = self.snapshot()
+        Topic.objects.all().delete()
+        User.objects.all().delete()
+
+        synthetic.generate(seed=7, raw=False, **sizes)
+        self.assertEqual(self.snapshot(), first)
+
+        questions = first[0]
+        self.assertEqual({question_type for _, question_type, _, _ in questions}, {'MCQ', 'TF', 'NUM'})
+        # Topic sizes are skewed
+        per_topic = sorted(Question.objects.values('topic').annotate(n=Count('pk')).values_list('n', flat=True))
+        self.assertGreater(per_topic[-1], 2 * per_topic[0])
+
+        Topic.objects.all().delete()
+        User.objects.all().delete()
+        synthetic.generate(seed=8, **sizes)
+        self.assertNotEqual(self.snapshot(), first)
+
+
+class BenchmarkGateTests(SimpleTestCase):
+    def test_run_without_completed_quizzes_fails_against_any_baseline(self):
+        # The same numbers as the baseline, which was itself a failing run
+        run = {'options': {}, 'errors': 46, 'throughput': 81.4, 'quizzes': 0, 'quizzes_per_second': 0.0, 'views': {}}
+        with self.assertRaisesMessage(CommandError, 'no quiz was completed'):
+            benchmark_journey.Command().compare(run, dict(run), {'tolerance': 0.5, 'query_slack': 0.5})
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def test_only_question_bank_reads_go_to_the_replica(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Question), 'default')
+        with read_replica():
+            self.assertEqual(router.db_for_read(Question), 'replica')
+            self.assertEqual(router.db_for_read(User), 'default')
+            self.assertEqual(router.db_for_read(DatabaseCache('quiz_cache', {}).cache_model_class), 'default')
+        self.assertEqual(router.db_for_write(Question), 'default')
+
+
+class MetricsAccessTests(QuizTestCase):
+    url = reverse('metrics')
+
+    def test_internal_address_is_not_enough_without_debug(self):
+        self.client.logout()
+        # The test client's REMOTE_ADDR is 127.0.0.1, as behind a local proxy
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_staff_only_without_a_token(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_login(User.objects.create_user('teacher', is_staff=True))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    @override_settings(QUIZ_METRICS_TOKEN='s3cret')
+    def test_token(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+
+
+class RenderingTests(QuizTestCase):
+    def show(self, question, field='text'):
+        return Template('{% load custom_filters %}{{ question|rendered:field }}').render(
+            Context({'question': question, 'field': field})
+        )
+
+    def test_math_is_converted_and_the_rest_escaped(self):
+        markup = rendering.render_sources({'text': 'Is <b>$x^2$</b> & $y$ positive?', 'solution': ''})
+
+        self.assertEqual(list(markup), ['text'])
+        self.assertEqual(markup['text'].count('<math'), 2)
+        self.assertIn('Is &lt;b&gt;', markup['text'])
+        self.assertNotIn('<b>', markup['text'])
+
+    def test_math_the_converter_rejects_is_escaped_for_mathjax(self):
+        with mock.patch.object(rendering, 'latex_to_mathml', side_effect=ValueError):
+            markup = rendering.render_sources({'text': '$a<b$'})
+        self.assertEqual(markup, {'text': '$a&lt;b$'})
+
+    def test_cached_renders_are_reused(self):
+        first = rendering.render_sources({'text': 'Find $x+1$'})
+        with mock.patch.object(rendering, 'render_math', side_effect=AssertionError):
+            self.assertEqual(rendering.render_sources({'option_a': 'Find $x+1$'}), {'option_a': first['text']})
+
+    def test_filter_and_quiz_api_escape_alike(self):
+        question = self.questions[0]
+        question.text = '<script>alert(1)</script> $x$'
+        question.rendered = {}
+        self.assertEqual(self.show(question), '&lt;script&gt;alert(1)&lt;/script&gt; $x$')
+        self.assertEqual(payloads.client_question(question)['text'], self.show(question))
+
+        rendering.render_question(question)
+        self.assertIn('&lt;script&gt;', self.show(question))
+        self.assertIn('<math', self.show(question))
+        self.assertEqual(payloads.client_question(question)['text'], self.show(question))
+
+    def test_render_latex_fills_every_question(self):
+        Question.objects.update(rendered={})
+        call_command('render_latex', workers=2, batch_size=4, stdout=StringIO())
+
+        for question in Question.objects.all():
+            self.assertEqual(question.rendered, rendering.render_sources(rendering.question_sources(question)))
+            self.assertTrue(question.rendered)
+
+
+class SamplingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.topic = Topic.objects.create(name='Geometry')
+        # 6 easy, 5 medium, 3 hard
+        for n, difficulty in enumerate([1] * 6 + [2] * 5 + [3] * 3):
+            Question.objects.create(topic=cls.topic, text=f'Q{n}', question_type='NUM', difficulty=difficulty,
+                                    correct_option='1')
+
+    def levels(self, question_ids):
+        levels = dict(Question.objects.filter(pk__in=question_ids).values_list('pk', 'difficulty'))
+        return [levels[pk] for pk in question_ids]
+
+    def test_draw_takes_each_stratum_easiest_first(self):
+        ids = sampling.draw(self.topic.pk, 7)
+        self.assertEqual(len(set(ids)), 10)
+        self.assertEqual(self.levels(ids), [1] * 4 + [2] * 4 + [3] * 2)
+
+    def test_short_levels_are_topped_up(self):
+        ids = sampling.draw(self.topic.pk, 7, {1: 2, 2: 2, 3: 6})
+        self.assertEqual(len(set(ids)), 10)
+        self.assertEqual(self.levels(ids).count(3), 3)
+
+    def test_same_seed_same_questions_while_the_bank_is_unchanged(self):
+        first = sampling.draw(self.topic.pk, 1234)
+        self.assertEqual(sampling.draw(self.topic.pk, 1234), first)
+        self.assertNotEqual({tuple(sampling.draw(self.topic.pk, seed)) for seed in range(5)}, {tuple(first)})
+
+    def test_edits_rebuild_the_index_and_reads_stay_cheap(self):
+        sampling.draw(self.topic.pk, 1)
+        with self.assertNumQueries(1):
+            sampling.draw(self.topic.pk, 1)
+
+        added = Question.objects.create(topic=self.topic, text='New', question_type='NUM', difficulty=3,
+                                        correct_option='1')
+        self.assertIn(added.pk, sampling.question_index(self.topic.pk)[3])
+        added.delete()
+        self.assertNotIn(added.pk, sampling.question_index(self.topic.pk)[3])
+
+
+class SchedulerTests(QuizTestCase):
+    def make_test(self):
+        now = timezone.now()
+        test = Test.objects.create(name='Midterm', start_time=now, end_time=now + timedelta(hours=1), num_questions=4)
+        test.topics.add(self.topic)
+        return test
+
+    def test_variant_for_spreads_users_over_the_variants(self):
+        users = [User(pk=pk) for pk in range(1, 2 * scheduler.VARIANTS + 1)]
+        self.assertEqual({scheduler.variant_for(user) for user in users}, set(range(scheduler.VARIANTS)))
+        self.assertEqual(scheduler.variant_for(users[0]), scheduler.variant_for(users[scheduler.VARIANTS]))
+
+    def test_seeds_are_stable_and_never_shared(self):
+        seeds = {
+            (test_id, variant): scheduler.variant_seed(test_id, variant)
+            for test_id in range(1, 50) for variant in range(scheduler.VARIANTS)
+        }
+        self.assertEqual(len(set(seeds.values())), len(seeds))
+        self.assertEqual(scheduler.variant_seed(3, 7), seeds[3, 7])
+        self.assertTrue(all(0 <= seed < 2 ** 31 for seed in seeds.values()))
+
+        test = self.make_test()
+        self.assertEqual(scheduler.build_question_sets(test), scheduler.build_question_sets(test))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                           'LOCATION': 'scheduler'}})
+    def test_warm_test_caches_sets_questions_and_documents(self):
+        test = self.make_test()
+        question_sets = scheduler.warm_test(test)
+        try:
+            for question_ids in question_sets:
+                self.assertIsNotNone(cache.get(payloads._document_key(question_ids, payloads._version())))
+            with self.assertNumQueries(0):
+                seed, question_ids = scheduler.question_set_for(test, self.student)
+                document = payloads.quiz_document(question_ids)
+            self.assertEqual(question_ids, question_sets[scheduler.variant_for(self.student)])
+            self.assertEqual([question['id'] for question in document], question_ids)
+            self.assertEqual(seed, scheduler.variant_seed(test.pk, scheduler.variant_for(self.student)))
+        finally:
+            cache.clear()
+
+
+@skipIf(item_stats.np is None, "Item statistics need NumPy")
+class ItemStatsTests(QuizTestCase):
+    def test_matches_a_direct_correlation_with_sparse_ids(self):
+        far = Question.objects.create(
+            pk=10 ** 9, topic=self.topic, text='Far', question_type='MCQ',
+            option_a='1', option_b='2', option_c='3', option_d='4', correct_option='B',
+        )
+        questions = self.questions + [far]
+        for s in range(8):
+            user = User.objects.create_user(f'taker{s}')
+            attempt = Attempt.objects.create(user=user, topic=self.topic, finished_at=timezone.now())
+            for q, question in enumerate(questions):
+                correct = (s * (q + 2) + q) % 5 < 3
+                Answer.objects.create(
+                    attempt=attempt, question=question, typed_answer='ABCD'[(s + q) % 4],
+                    is_correct=correct, marks_awarded=float(correct) * (1 + q % 2),
+                )
+            attempt.score = sum(attempt.answers.values_list('marks_awarded', flat=True))
+            attempt.save()
+
+        # A chunk smaller than an attempt, so ids are merged across chunks
+        ids, responses, difficulty, discrimination, options = item_stats.compute_item_stats(chunk_size=5)
+        self.assertEqual(ids.tolist(), [question.pk for question in questions])
+        self.assertEqual(len(responses), len(questions))
+        np = item_stats.np
+        for column, question in enumerate(questions):
+            rows = list(Answer.objects.filter(question=question).values_list(
+                'is_correct', 'marks_awarded', 'attempt__score', 'typed_answer'))
+            x = np.array([row[0] for row in rows], dtype=float)
+            y = np.array([row[2] - row[1] for row in rows])
+            self.assertEqual(responses[column], len(rows))
+            self.assertAlmostEqual(difficulty[column], x.mean())
+            if x.std() and y.std():
+                self.assertAlmostEqual(discrimination[column], np.corrcoef(x, y)[0, 1])
+            else:
+                self.assertTrue(np.isnan(discrimination[column]))
+            self.assertEqual(options[:, column].tolist(),
+                             [sum(row[3] == letter for row in rows) for letter in 'ABCD'])
+
+
+class DedupeTests(QuizTestCase):
+    TEXT = 'A train travels 120 km in 2 hours. What is its average speed in km per hour?'
+
+    def form_data(self, question, **changes):
+        data = {field: getattr(question, field) for field in QuestionForm.Meta.fields if field != 'topic'}
+        data['topic'] = question.topic_id
+        data.update(changes)
+        return data
+
+    def test_find_similar_ignores_numbers_and_excludes_the_question(self):
+        question = Question.objects.create(
+            topic=self.topic, text=self.TEXT, question_type='NUM', correct_option='60',
+        )
+        variant = 'A train travels 300 km in 5 hours. What is its average speed in km per hour?'
+        self.assertEqual([pk for pk, _ in dedupe.find_similar(variant)], [question.pk])
+        self.assertEqual(dedupe.find_similar(variant, exclude=question.pk), [])
+        self.assertEqual(dedupe.find_similar('Name the capital city of France and its river'), [])
+
+    def test_editing_a_question_does_not_flag_itself(self):
+        question = Question.objects.create(
+            topic=self.topic, text=self.TEXT, question_type='NUM', correct_option='60',
+        )
+        edit = QuestionForm(self.form_data(question, correct_option='60.0'), instance=question)
+        self.assertTrue(edit.is_valid(), edit.errors)
+
+        copy = QuestionForm(self.form_data(question))
+        self.assertFalse(copy.is_valid())
+        self.assertEqual([similar.pk for similar, _ in copy.similar_questions], [question.pk])
+
+    def test_failed_rebuild_keeps_the_old_index(self):
+        before = QuestionFingerprint.objects.count()
+        self.assertEqual(before, len(self.questions))
+        with mock.patch.object(cluster_questions.Command, 'fingerprint_batch', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                call_command('cluster_questions', workers=1, stdout=StringIO())
+        self.assertEqual(QuestionFingerprint.objects.count(), before)
+        self.assertEqual(dedupe.find_similar('Question 9', threshold=1.0)[0][1], 1.0)
+
+
+class TopicStatsTests(QuizTestCase):
+    """The counts kept by the Question signals must equal a rebuild from scratch"""
+
+    COUNTS = ['question_count', 'easy_count', 'medium_count', 'hard_count', 'mcq_count', 'num_count', 'tf_count']
+
+    def counts(self):
+        # A rebuild also writes zero rows for topics without questions
+        return {
+            row[0]: row[1:] for row in TopicStats.objects.values_list('topic_id', *self.COUNTS) if any(row[1:])
+        }
+
+    def assertMatchesRebuild(self):
+        incremental = self.counts()
+        stats.rebuild_topic_stats()
+        self.assertEqual(self.counts(), incremental)
+
+    def test_moving_a_question_between_topics(self):
+        geometry = Topic.objects.create(name='Geometry')
+        question = self.questions[0]
+        question.topic = geometry
+        question.save()
+        self.assertEqual(TopicStats.objects.get(topic=geometry).question_count, 1)
+        self.assertEqual(TopicStats.objects.get(topic=self.topic).question_count, len(self.questions) - 1)
+        self.assertMatchesRebuild()
+
+    def test_changing_difficulty_and_type(self):
+        question = self.questions[1]
+        question.difficulty = 3 if question.difficulty != 3 else 1
+        question.save()
+        question.question_type, question.correct_option = 'TF', 'True'
+        question.save()
+        self.assertEqual(TopicStats.objects.get(topic=self.topic).tf_count, 1)
+        self.assertMatchesRebuild()
+
+    def test_deleting_questions_and_topics(self):
+        self.questions[2].delete()
+        self.assertEqual(TopicStats.objects.get(topic=self.topic).question_count, len(self.questions) - 1)
+        self.assertMatchesRebuild()
+
+        self.topic.delete()
+        self.assertEqual(self.counts(), {})
+        self.assertMatchesRebuild()
+
+
+class SearchTests(QuizTestCase):
+    def found(self, query, **filters):
+        return [question.pk for question in search.search_questions(query, filters)]
+
+    def test_edits_reindex_and_deletes_remove(self):
+        question = Question.objects.create(
+            topic=self.topic, text='State the Pythagoras theorem', question_type='NUM', correct_option='1',
+            solution='The squares of the legs add up',
+        )
+        self.assertEqual(self.found('pythagoras'), [question.pk])
+        self.assertEqual(self.found('squares'), [question.pk])
+
+        question.text = 'Compute the discriminant'
+        question.save()
+        self.assertEqual(self.found('pythagoras'), [])
+        # Stemmed, so the plural finds the singular
+        self.assertEqual(self.found('discriminants'), [question.pk])
+
+        question.delete()
+        self.assertEqual(self.found('discriminant'), [])
+
+    def test_ranks_the_text_above_options_and_facets_by_topic(self):
+        geometry = Topic.objects.create(name='Geometry')
+        in_text = Question.objects.create(topic=geometry, text='Area of a circle', question_type='NUM',
+                                          correct_option='3', difficulty=3)
+        in_option = Question.objects.create(
+            topic=self.topic, text='Which shape is round?', question_type='MCQ', correct_option='A',
+            option_a='circle', option_b='square', option_c='line', option_d='cube',
+        )
+        page = search.search_questions('circle')
+        self.assertEqual([question.pk for question in page], [in_text.pk, in_option.pk])
+        self.assertEqual(page.total, 2)
+        self.assertEqual({topic_id: count for topic_id, _, count in page.facets['topics']},
+                         {geometry.pk: 1, self.topic.pk: 1})
+        self.assertEqual(self.found('circle', topic=str(geometry.pk)), [in_text.pk])
+        self.assertEqual(self.found('circle', difficulty='3'), [in_text.pk])
+
+
+class AsyncViewTests(QuizTestCase):
+    """The async API and results page (QUIZ_ASYNC_VIEWS) behave like the sync ones"""
+
+    def setUp(self):
+        super().setUp()
+        self.session = self.client.session
+
+    def call(self, view, *args, answers=None, user=None):
+        factory = AsyncRequestFactory()
+        if answers is None:
+            request = factory.get('/')
+        else:
+            request = factory.post('/', json.dumps({'answers': {str(pk): value for pk, value in answers.items()}}),
+                                   content_type='application/json')
+        request.user = user or self.student
+        request.session = self.session
+        request._messages = FallbackStorage(request)
+
+        async def auser():
+            return request.user
+        request.auser = auser
+        return async_to_sync(view)(request, *args)
+
+    def test_quiz_flow_matches_the_sync_api(self):
+        attempt = self.start_quiz()
+        first, second = attempt.question_ids[:2]
+        detail = self.call(async_views.attempt_detail, attempt.pk)
+        self.assertEqual(json.loads(detail.content), self.client.get(reverse('api_attempt', args=[attempt.pk])).json())
+
+        saved = self.call(async_views.attempt_answers, attempt.pk, answers={first: 'A'})
+        self.assertEqual(json.loads(saved.content), {'saved': 1})
+        self.assertEqual(json.loads(self.call(async_views.attempt_detail, attempt.pk).content)['answers'],
+                         {str(first): 'A'})
+
+        submitted = self.call(async_views.attempt_submit, attempt.pk, answers={second: 'B'})
+        self.assertEqual(json.loads(submitted.content), {'redirect': reverse('quiz_results')})
+        attempt.refresh_from_db()
+        self.assertIsNotNone(attempt.finished_at)
+        self.assertEqual(attempt.score, 1.0)
+        self.assertEqual(self.session[RESULTS_SESSION_KEY], attempt.pk)
+
+        results = self.call(async_views.quiz_results)
+        self.assertEqual(results.status_code, 200)
+        self.assertContains(results, Question.objects.get(pk=first).text)
+
+    def test_refuses_what_the_sync_api_refuses(self):
+        attempt = self.start_quiz()
+        stranger = User.objects.create_user('stranger')
+        refused = self.call(async_views.attempt_detail, attempt.pk, user=stranger)
+        self.client.force_login(stranger)
+        self.assertEqual(refused.status_code, self.client.get(reverse('api_attempt', args=[attempt.pk])).status_code)
+        self.assertGreaterEqual(refused.status_code, 400)
+
+        self.call(async_views.attempt_submit, attempt.pk, answers={})
+        again = self.call(async_views.attempt_answers, attempt.pk, answers={attempt.question_ids[0]: 'A'})
+        self.client.force_login(self.student)
+        self.assertEqual(again.status_code, self.post_json('api_attempt_answers', attempt, {}).status_code)
+        self.assertGreaterEqual(again.status_code, 400)
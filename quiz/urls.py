@@ -1,8 +1,13 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, metrics, views
 from django.contrib.auth import views as auth_views
 from .views import signup_view
 
+# The quiz API and results page have async versions for ASGI deployments
+quiz_api = async_views if settings.QUIZ_ASYNC_VIEWS else api
+quiz_results = async_views.quiz_results if settings.QUIZ_ASYNC_VIEWS else views.quiz_results
+
 urlpatterns = [
     path("", views.home, name="home"),
     # Topic URLs
@@ -18,12 +23,22 @@ urlpatterns = [
     # Question URLs
     path("questions/", views.question_list, name="question_list"),
     path("questions/add/", views.question_create, name="question_create"),
+    path("questions/import/", views.question_import, name="question_import"),
+    path("questions/export/", views.question_export, name="question_export"),
     path("questions/<int:pk>/edit/", views.question_edit, name="question_edit"),
     path("questions/<int:pk>/delete/", views.question_delete, name="question_delete"),
 
     path("select-topic/", views.select_topic, name="select_topic"),
     path('quiz/<int:topic_id>/', views.take_quiz, name='take_quiz'),
-    path('quiz/results/', views.quiz_results, name='quiz_results'),
+    path('quiz/results/', quiz_results, name='quiz_results'),
+    path('test/<int:test_id>/', views.take_test, name='take_test'),
+    path('leaderboard/<str:kind>/<int:object_id>/', views.leaderboard_view, name='leaderboard'),
+
+    # Quiz API used by the quiz page
+    path('api/attempts/<int:attempt_id>/', quiz_api.attempt_detail, name='api_attempt'),
+    path('api/attempts/<int:attempt_id>/answers/', quiz_api.attempt_answers, name='api_attempt_answers'),
+    path('api/attempts/<int:attempt_id>/autosave/', quiz_api.attempt_autosave, name='api_attempt_autosave'),
+    path('api/attempts/<int:attempt_id>/submit/', quiz_api.attempt_submit, name='api_attempt_submit'),
 
     path("practice/", views.practice_select_topic, name="practice_select_topic"),
     path("practice/<int:topic_id>/", views.practice_questions, name="practice_questions"),  
@@ -34,4 +49,6 @@ urlpatterns = [
     path('logout/', auth_views.LogoutView.as_view(next_page='home'), name='logout'),
     path("profile/", views.profile_view, name="profile"), 
     path("redirect-after-login/", views.redirect_after_login, name="redirect_after_login"),
+
+    path("metrics", metrics.metrics_view, name="metrics"),
 ]
@@ -1,43 +1,39 @@
 # quiz/views.py
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Count
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import urlencode
 # from django.contrib.auth.decorators import login_required  # Commented out temporarily
-from .models import Question, Topic,TopicNote
-from .forms import QuestionForm, TopicForm
+from .models import Attempt, Question, Test, Topic, TopicMastery, TopicNote
+from .forms import QuestionForm, QuestionImportForm, TopicForm
+from .importer import FORMATS, detect_format, import_questions
+from .exporter import CONTENT_TYPES, KINDS, export_lines
+from .queries import filter_questions, topic_cards, topic_note, topic_summaries
+from .pagination import clean_cursor, keyset_paginate
+from .payloads import get_question
+from .pagecache import lazy, page_context, topic_page
+from .database import read_alias, read_replica
+from .leaderboard import get_board
+from .search import search_questions
+from .engine import (
+    ANSWER_MAX_LENGTH, RESULTS_SESSION_KEY, SESSION_KEY, attempt_results, get_active_attempt, get_saved_answers, save_answer,
+    start_attempt, submit_attempt,
+)
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 
+@read_replica()
 @login_required(login_url='login')
 def home(request):
-    # Get all topics with their notes and question counts
-    topics_with_notes = []
-    topics = Topic.objects.all()
-    
-    for topic in topics:
-        try:
-            note = topic.note  # Related name from OneToOneField
-        except TopicNote.DoesNotExist:
-            note = None
-            
-        topic_data = {
-            'topic': topic,
-            'note': note,
-            'question_count': topic.questions.count()
-        }
-        topics_with_notes.append(topic_data)
-    
+    # Topics with their notes and question counts in one query
     context = {
-        'topics_with_notes': topics_with_notes,
+        'topics_with_notes': topic_cards(topic_summaries()),
     }
     return render(request, 'home.html', context)
 
 # Topic Views
-# @login_required  # Commented out temporarily
-def topic_list(request):
-    topics = Topic.objects.all()
-    return render(request, 'topic_list.html', {'topics': topics})
-
 # @login_required  # Commented out temporarily
 def topic_create(request):
     if request.method == 'POST':
@@ -75,8 +71,24 @@ def topic_delete(request, pk):
 # Question Views
 # @login_required  # Commented out temporarily
 def question_list(request):
-    questions = Question.objects.all().select_related('topic')
-    return render(request, 'question_list.html', {'questions': questions})
+    questions_list, filters = filter_questions(Question.objects.select_related('topic', 'item_stats'), request.GET)
+    query = request.GET.get('q', '').strip()
+    if query:
+        # Ranked full-text search, paged by number
+        questions = search_questions(query, filters, page=request.GET.get('page'), per_page=25)
+    else:
+        questions = keyset_paginate(
+            questions_list, 25, after=request.GET.get('after'), before=request.GET.get('before')
+        )
+    return render(request, 'question_list.html', {
+        'questions': questions,
+        'query': query,
+        'topics': Topic.objects.order_by('name'),
+        'difficulty_levels': Question.DIFFICULTY_LEVELS,
+        'question_types': Question.QUESTION_TYPES,
+        'filters': filters,
+        'filter_query': urlencode({**filters, 'q': query} if query else filters),
+    })
 
 # @login_required  # Commented out temporarily
 def question_create(request):
@@ -138,11 +150,56 @@ def question_delete(request, pk):
         return redirect('question_list')
     return render(request, 'question_confirm_delete.html', {'question': question})
 
+@staff_member_required(login_url='login')
+def question_import(request):
+    result = None
+    if request.method == 'POST':
+        form = QuestionImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            fmt = detect_format(upload.name)
+            if fmt is None:
+                form.add_error('file', 'Upload a .csv or .jsonl file.')
+            else:
+                result = import_questions(
+                    upload.file, fmt,
+                    create_topics=form.cleaned_data['create_topics'],
+                    created_by=request.user,
+                )
+                if result.created:
+                    messages.success(request, f'Imported {result.created} questions.')
+                if result.error_count:
+                    messages.error(request, f'{result.error_count} rows were rejected.')
+    else:
+        form = QuestionImportForm()
+
+    return render(request, 'question_import.html', {'form': form, 'result': result})
+
+@staff_member_required(login_url='login')
+def question_export(request):
+    """Stream the question bank (or topics with notes) as CSV or JSONL; staff only, as it includes the answers"""
+    fmt = request.GET.get('format', 'csv')
+    kind = request.GET.get('kind', 'questions')
+    if fmt not in FORMATS or kind not in KINDS:
+        messages.error(request, 'Unsupported export.')
+        return redirect('question_list')
+
+    response = StreamingHttpResponse(
+        # Streamed after the view returns, so the export names its database itself
+        export_lines(fmt, kind=kind, include_rendered=request.GET.get('rendered') == '1', using=read_alias()),
+        content_type=CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+    return response
+
 # Quiz functionality
 # @login_required  # Commented out temporarily
+@read_replica()
 def select_topic(request):
-    topics = Topic.objects.all()
-    return render(request, 'select_topic.html', {'topics': topics})
+    topics = topic_summaries()
+    now = timezone.now()
+    tests = Test.objects.filter(end_time__gt=now).order_by('start_time')
+    return render(request, 'select_topic.html', {'topics': topics, 'tests': tests, 'now': now})
 
 # @login_required  # Commented out temporarily
 # Add this to your quiz/views.py file
@@ -159,161 +216,202 @@ from django.urls import reverse
 from django.contrib import messages
 from .models import Topic, Question
 
+@login_required(login_url='login')
 def take_quiz(request, topic_id):
     topic = get_object_or_404(Topic, pk=topic_id)
-    questions = list(Question.objects.filter(topic=topic)[:10])
-    total_questions = len(questions)
+
+    # Resume the running attempt, or start a new one with a fixed question set
+    attempt = get_active_attempt(request, topic=topic)
+    if attempt is None and request.method == "POST":
+        # A repeated submit of a quiz that has just been finished
+        return redirect('quiz_results')
+    if attempt is None:
+        attempt = start_attempt(request, topic=topic)
+
+    if not attempt.question_ids:
+        messages.error(request, "This topic has no questions yet.")
+        return redirect('select_topic')
+
+    return run_quiz(request, attempt, reverse('take_quiz', args=[topic.id]), topic.name)
+
+
+@login_required(login_url='login')
+def take_test(request, test_id):
+    """Take a scheduled test; the question sets are pre-built by warm_tests"""
+    test = get_object_or_404(Test, pk=test_id)
+    now = timezone.now()
+    if not test.start_time <= now < test.end_time:
+        messages.error(request, f"{test.name} is open from {test.start_time:%d %b %H:%M} to {test.end_time:%d %b %H:%M}.")
+        return redirect('select_topic')
+
+    attempt = get_active_attempt(request, test=test)
+    if attempt is None and request.method == "POST":
+        return redirect('quiz_results')
+    if attempt is None:
+        if Attempt.objects.filter(user=request.user, test=test, finished_at__isnull=False).exists():
+            messages.error(request, f"You have already taken {test.name}.")
+            return redirect('select_topic')
+        attempt = start_attempt(request, test=test)
+
+    if not attempt.question_ids:
+        messages.error(request, "This test has no questions yet.")
+        return redirect('select_topic')
+
+    return run_quiz(request, attempt, reverse('take_test', args=[test.id]), test.name)
+
+
+def run_quiz(request, attempt, quiz_url, title):
+    """Show, save and submit the questions of an attempt; shared by topic quizzes and tests"""
+    question_ids = attempt.question_ids
+    total_questions = len(question_ids)
 
     # Current question index from query params
     current_index = int(request.GET.get("q", 0))
     current_index = max(0, min(current_index, total_questions - 1))
-
-    # Initialize session answers
-    if "quiz_answers" not in request.session:
-        request.session["quiz_answers"] = {}
-    answers = request.session["quiz_answers"]
+    question_id = question_ids[current_index]
 
     if request.method == "POST":
         action = request.POST.get("action")
-        current_question = questions[current_index]
-        question_id = str(current_question.id)
-        user_answer = request.POST.get("answer", "").strip()
+        # The text box has a maxlength; cut anything longer the same way
+        user_answer = request.POST.get("answer", "").strip()[:ANSWER_MAX_LENGTH]
 
         # Save the answer even if numeric "0"
-        answers[question_id] = user_answer
-        request.session["quiz_answers"] = answers
+        save_answer(attempt, question_id, user_answer)
 
         # Navigation
         if action == "next" and current_index < total_questions - 1:
-            return redirect(f"{reverse('take_quiz', args=[topic.id])}?q={current_index + 1}")
+            return redirect(f"{quiz_url}?q={current_index + 1}")
         elif action == "prev" and current_index > 0:
-            return redirect(f"{reverse('take_quiz', args=[topic.id])}?q={current_index - 1}")
+            return redirect(f"{quiz_url}?q={current_index - 1}")
         elif action == "submit":
-            # Prepare results
-            score = 0
-            results = []
-            for q in questions:
-                q_id = str(q.id)
-                user_ans = answers.get(q_id, "").strip()
-                correct = (q.correct_option or "").strip()
-
-                if q.question_type in ["MCQ", "TF"]:
-                    is_correct = user_ans.upper() == correct.upper() if user_ans else False
-                else:  # Numeric
-                    is_correct = user_ans == correct
-
-                if is_correct:
-                    score += 1
-
-                results.append({
-                    "question_text": q.text,
-                    "user_answer": user_ans if user_ans else "No answer",
-                    "correct_answer": correct,
-                    "is_correct": is_correct,
-                    "question_type": q.question_type,
-                    "options": {
-                        "A": q.option_a,
-                        "B": q.option_b,
-                        "C": q.option_c,
-                        "D": q.option_d
-                    } if q.question_type == "MCQ" else None
-                })
-
-            percentage = (score / total_questions * 100) if total_questions else 0
-
-            # Store only JSON-serializable data in session
-            request.session["quiz_results"] = {
-                "topic_id": topic.id,
-                "topic_name": topic.name,
-                "score": score,
-                "total": total_questions,
-                "percentage": round(percentage, 1),
-                "results": results
-            }
-
-            # Clear quiz answers
-            del request.session["quiz_answers"]
+            submit_attempt(attempt)
+
+            # The attempt is finished; the next visit starts a new one. The
+            # results page reads the graded answers back from the database.
+            request.session.pop(SESSION_KEY, None)
+            request.session[RESULTS_SESSION_KEY] = attempt.pk
 
             return redirect('quiz_results')
 
-    current_question = questions[current_index]
-    question_id = str(current_question.id)
+    # Served from the question cache, which warm_tests fills before a test starts
+    current_question = get_question(question_id)
+    if current_question is None:
+        raise Http404("Question not found.")
+    answers = get_saved_answers(attempt)
     saved_answer = answers.get(question_id, "")
 
     return render(request, "take_quiz.html", {
-        "topic": topic,
+        "attempt": attempt,
+        "title": title,
         "question": current_question,
         "current_index": current_index,
         "total_questions": total_questions,
         "saved_answer": saved_answer,
         "answered_count": len(answers),
-        "unanswered_count": total_questions - len(answers)
+        "unanswered_count": total_questions - len(answers),
+        "answer_save_interval": settings.QUIZ_ANSWER_SAVE_INTERVAL,
+        "answer_max_length": ANSWER_MAX_LENGTH,
     })
 
 
 def quiz_results(request):
-    results_data = request.session.get("quiz_results")
+    # Sessions written before results moved to the database carry the whole payload
+    request.session.pop("quiz_results", None)
+
+    attempt_id = request.session.get(RESULTS_SESSION_KEY)
+    results_data = attempt_results(attempt_id, request.user) if attempt_id and request.user.is_authenticated else None
     if not results_data:
         messages.error(request, "No quiz results found.")
         return redirect('select_topic')
 
-    # Do NOT delete session yet if template needs topic_id
     return render(request, "quiz_results.html", {"results": results_data})
 
 
+@read_replica()
+@login_required(login_url='login')
+def leaderboard_view(request, kind, object_id):
+    """Top students and the current user's rank for a test or topic"""
+    model = {'test': Test, 'topic': Topic}.get(kind)
+    if model is None:
+        raise Http404("Unknown leaderboard.")
+    subject = get_object_or_404(model, pk=object_id)
+    board = get_board(kind, subject.pk)
+    return render(request, 'leaderboard.html', {
+        'kind': kind,
+        'subject': subject,
+        'leaders': board.top(),
+        'my_rank': board.rank(request.user.pk),
+        'participants': len(board),
+    })
+
+
 # Optional: Add this view to retake quiz
 def retake_quiz(request, topic_id):
     # Clear any existing results
-    if 'quiz_results' in request.session:
-        del request.session['quiz_results']
+    request.session.pop(RESULTS_SESSION_KEY, None)
     return redirect('take_quiz', topic_id=topic_id)
 
 # NEW PRACTICE SECTION VIEWS
 # @login_required  # Commented out temporarily
+@read_replica()
 def practice_select_topic(request):
     """Select topic for practice session"""
-    topics = Topic.objects.annotate(
-        question_count=Count('questions')
-    ).filter(question_count__gt=0)  # Only show topics with questions
+    topics = topic_summaries().filter(question_count__gt=0)  # Only show topics with questions
     return render(request, 'practice_select_topic.html', {'topics': topics})
 
 # @login_required  # Commented out temporarily
+@read_replica()
+@topic_page('practice_questions')
 def practice_questions(request, topic_id):
     """Display practice questions with solutions for a topic"""
     topic = get_object_or_404(Topic, pk=topic_id)
     
-    # Get all questions for this topic
-    questions_list = Question.objects.filter(topic=topic).order_by('difficulty', 'created_at')
-    
-    # Add pagination
-    paginator = Paginator(questions_list, 5)  # Show 5 questions per page
-    page_number = request.GET.get('page')
-    questions = paginator.get_page(page_number)
-    
-    # Get difficulty filter if provided
-    difficulty_filter = request.GET.get('difficulty')
-    if difficulty_filter:
-        questions_list = questions_list.filter(difficulty=difficulty_filter)
-        questions = paginator.get_page(page_number)
-    
+    # Filter first, then page through the matching questions by key
+    questions_list, filters = filter_questions(
+        Question.objects.filter(topic=topic), request.GET, fields=('difficulty', 'type')
+    )
+    query = request.GET.get('q', '').strip()
+    if query:
+        questions = lazy(lambda: search_questions(
+            query, {**filters, 'topic': str(topic.pk)}, page=request.GET.get('page'), per_page=5
+        ))
+        page_key = None
+    else:
+        after, before = clean_cursor(request.GET.get('after')), clean_cursor(request.GET.get('before'))
+        questions = lazy(lambda: keyset_paginate(questions_list, 5, after=after, before=before))
+        # The fragment varies on the parameters that were understood, not the raw query string
+        page_key = urlencode({**filters, 'after': after or '', 'before': before or ''})
+
+    # The question list is a cached fragment; the queries only run when it is rendered
     return render(request, 'practice_questions.html', {
+        **page_context(request, topic.pk),
+        'page_key': page_key,
         'topic': topic,
         'questions': questions,
+        'query': query,
         'difficulty_levels': Question.DIFFICULTY_LEVELS,
-        'current_difficulty': difficulty_filter
+        'question_types': Question.QUESTION_TYPES,
+        'current_difficulty': filters.get('difficulty'),
+        'current_type': filters.get('type'),
+        'filter_query': urlencode({**filters, 'q': query} if query else filters),
     })
 
 # @login_required  # Commented out temporarily  
+@read_replica()
+@topic_page('practice_question_detail', lambda question_id: getattr(get_question(question_id), 'topic_id', None))
 def practice_question_detail(request, question_id):
     """Display a single practice question with detailed solution"""
-    question = get_object_or_404(Question, pk=question_id)
+    question = get_question(question_id)
+    if question is None:
+        raise Http404("Question not found.")
     
     # Get related questions from the same topic (for navigation)
     related_questions = Question.objects.filter(
-        topic=question.topic
+        topic_id=question.topic_id
     ).exclude(pk=question.pk)[:5]
     
     return render(request, 'practice_question_detail.html', {
+        **page_context(request, question.topic_id),
         'question': question,
         'related_questions': related_questions
     })
@@ -350,45 +448,32 @@ def topic_note_delete(request, topic_id):
     return redirect('topic_list')
 
 # Update your topic_list view to include notes
+@read_replica()
 def topic_list(request):
-    topics = Topic.objects.all()
-    # Get all existing notes
-    notes = {note.topic_id: note for note in TopicNote.objects.all()}
-    
-    topics_data = []
-    for topic in topics:
-        topics_data.append({
-            'topic': topic,
-            'note': notes.get(topic.id),
-            'question_count': topic.questions.count()
-        })
-    
+    topics = topic_summaries()
+
     return render(request, 'topic_list.html', {
-        'topics_data': topics_data,
+        'topics_data': topic_cards(topics),
         'topics': topics  # Keep for compatibility
     })
 
+@read_replica()
+@topic_page('topic_note_view')
 def topic_note_view(request, topic_id):
     """Display detailed view of a topic with its notes"""
-    topic = get_object_or_404(Topic, pk=topic_id)
-    
-    # Get the note if it exists
-    try:
-        note = topic.note
-    except TopicNote.DoesNotExist:
-        note = None
-    
-    # Get question count and sample questions
-    questions = Question.objects.filter(topic=topic)
-    question_count = questions.count()
-    
+    topic = get_object_or_404(topic_summaries(), pk=topic_id)
+
+    # Question count and a few sample questions (a cached fragment)
+    questions = lazy(lambda: list(Question.objects.filter(topic=topic)[:3]))
+
     context = {
+        **page_context(request, topic.pk),
         'topic': topic,
-        'note': note,
+        'note': topic_note(topic),
         'questions': questions,
-        'question_count': question_count,
+        'question_count': topic.question_count,
     }
-    
+
     return render(request, 'topic_note_view.html', context)
 
 from django.shortcuts import render, redirect
@@ -409,7 +494,13 @@ def signup_view(request):
 
 @login_required
 def profile_view(request):
-    return render(request, 'profile.html')
+    # The rollup is keyed by user, so this is one indexed lookup however long the history
+    mastery = (
+        TopicMastery.objects.filter(user=request.user)
+        .select_related('topic')
+        .order_by('topic__name', 'difficulty')
+    )
+    return render(request, 'profile.html', {'mastery': mastery})
 
 from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required